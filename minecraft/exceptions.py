@@ -76,6 +76,12 @@ class InvalidState(ConnectionFailure):
     """
 
 
+class OutgoingQueueFull(Exception):
+    """Raised by 'minecraft.networking.Connection.write_packet' when the queue
+       of outgoing packets is full and its overflow policy is 'raise'.
+    """
+
+
 class IgnorePacket(Exception):
     """This exception may be raised from within a packet handler, such as
        `PacketReactor.react' or a packet listener added with
@@ -0,0 +1,310 @@
+"""Contains 'AsyncConnection', an alternative to 'Connection' which runs on an
+   asyncio event loop instead of a dedicated networking thread.
+"""
+import asyncio
+import sys
+
+from .connection import (
+    Connection, PlayingStatusReactor, StatusReactor, STATE_STATUS,
+)
+from .framing import FrameReader, FrameWriter
+from . import encryption
+from .packets import serverbound
+from .. import PROTOCOL_VERSION_INDICES
+from ..exceptions import InvalidState
+
+
+class AsyncConnection(Connection):
+    """A connection to a Minecraft server driven by an asyncio event loop, so
+    that many connections may be handled by a single thread.
+
+    Packets are read, and the default responses to them (such as keep-alive
+    replies) are made, only while the connection is iterated over with
+    'async for', which yields each incoming packet after any packet listeners
+    have been called::
+
+        connection = AsyncConnection(address, port, username=username)
+        await connection.connect()
+        async for packet in connection:
+            ...
+
+    The same reactors, packet classes and packet listeners are used as with
+    'Connection', but instead of being passed to exception handlers,
+    exceptions are raised from the iteration, after closing the connection.
+
+    If 'pool_packets' is given, each packet yielded from the iteration may be
+    reused when the next packet is requested, unless it is retained.
+
+    Except for the coroutines, the methods of this class may only be called
+    from the thread running the event loop.
+    """
+
+    # The maximum number of bytes to read from the stream at once.
+    read_size = 65536
+
+    def __init__(
+        self,
+        address,
+        port=25565,
+        auth_token=None,
+        username=None,
+        initial_version=None,
+        allowed_versions=None,
+        max_batch_bytes=65536,
+        max_batch_packets=300,
+        max_decompressed_size=8388608,
+        compression_level=-1,
+        lazy_decoding=False,
+        compact_packets=False,
+        pool_packets=False,
+        collect_stats=False,
+    ):
+        """Sets up an instance of this object to be able to connect to a
+        Minecraft server, with the same parameters as 'Connection', except
+        for those which do not apply to an asyncio event loop: no exception
+        or exit handlers, multiplexer, compression executor or version cache
+        may be given, and outgoing packets are not queued, so there are no
+        queue options.
+        """
+        super(AsyncConnection, self).__init__(
+            address, port=port, auth_token=auth_token, username=username,
+            initial_version=initial_version,
+            allowed_versions=allowed_versions,
+            max_batch_bytes=max_batch_bytes,
+            max_batch_packets=max_batch_packets,
+            max_decompressed_size=max_decompressed_size,
+            compression_level=compression_level,
+            lazy_decoding=lazy_decoding, compact_packets=compact_packets,
+            pool_packets=pool_packets, collect_stats=collect_stats)
+        self.socket = None
+        self._reader = None
+        self._writer = None
+        # The stream writer closed by the last call to 'disconnect', until
+        # 'wait_closed' is called.
+        self._closing = None
+        self._decryptor = None
+        self._last_packet = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._last_packet is not None:
+            self._recycle(self._last_packet)
+            self._last_packet = None
+        if not self.connected:
+            await self.wait_closed()
+            raise StopAsyncIteration
+        try:
+            packet = await self._read_packet()
+            self._react(packet)
+            await self.drain()
+        except Exception as exc:
+            self.disconnect(immediate=True)
+            await self.wait_closed()
+            if self.reactor.handle_exception(exc, sys.exc_info()):
+                raise StopAsyncIteration
+            raise
+        self._last_packet = packet
+        return packet
+
+    async def connect(self):
+        """Open a connection to the server, determining its protocol version
+        first if more than one version is allowed, and begin logging in.
+        The rest of the login process takes place while the connection is
+        iterated over.
+        """
+        self._check_connection()
+        self.spawned = False
+        self.context.protocol_version \
+            = max(self.allowed_proto_versions,
+                  key=PROTOCOL_VERSION_INDICES.get)
+
+        if len(self.allowed_proto_versions) > 1:
+            await self._open()
+            self._handshake(next_state=STATE_STATUS)
+            self.write_packet(serverbound.status.RequestPacket())
+            self.reactor = _AsyncPlayingStatusReactor(self)
+            await self._run_until(
+                lambda: len(self.allowed_proto_versions) == 1)
+            self.disconnect(immediate=True)
+            await self.wait_closed()
+            # The status reactor will have chosen a single protocol version.
+            self.context.protocol_version = \
+                next(iter(self.allowed_proto_versions))
+
+        await self._open()
+        self._start_login()
+        await self.drain()
+
+    async def status(self, handle_status=None, handle_ping=False):
+        """Issue a status request to the server and then disconnect, with the
+        same parameters as 'Connection.status', returning when finished.
+        """
+        self._check_connection()
+        await self._open()
+        self._handshake(next_state=STATE_STATUS)
+
+        self.reactor = StatusReactor(self, do_ping=handle_ping is not False)
+        if handle_status is False:
+            self.reactor.handle_status = lambda *args, **kwds: None
+        elif handle_status is not None:
+            self.reactor.handle_status = handle_status
+        if handle_ping is False:
+            self.reactor.handle_ping = lambda *args, **kwds: None
+        elif handle_ping is not None:
+            self.reactor.handle_ping = handle_ping
+
+        self.write_packet(serverbound.status.RequestPacket())
+        await self._run_until(lambda: False)
+
+    def write_packet(self, packet, force=False):
+        """Writes a packet to the current outgoing batch, which is passed to
+        the underlying transport when it is full, when 'drain' is called, or
+        immediately if 'force' is True. The transport buffers the data if
+        necessary: 'drain' or 'write' should be awaited in order to avoid
+        exceeding the limits of this buffer.
+        """
+        packet.context = self.context
+        self._write_packet(packet)
+        if force:
+            self._flush()
+
+    async def write(self, packet):
+        """Writes a packet to the server, then waits until it is appropriate
+        to resume writing, as in 'drain'.
+        """
+        self.write_packet(packet)
+        await self.drain()
+
+    async def drain(self):
+        """Passes the current outgoing batch to the transport, then waits
+        until the transport's write buffer has been flushed down to its
+        low-water mark, or returns immediately if this is already so.
+        """
+        if self._writer is not None:
+            self._flush()
+            await self._writer.drain()
+
+    def disconnect(self, immediate=False):
+        """Terminate the existing server connection, if there is one.
+           If 'immediate' is True, any packets that have been written but not
+           yet sent to the network are discarded. The connection is closed in
+           the background: 'wait_closed' may be awaited afterwards to wait for
+           this to finish. (The iteration, 'connect' and 'status' do so.)
+        """
+        self.connected = False
+        if self._writer is not None:
+            if immediate:
+                self._writer.transport.abort()
+            else:
+                self._flush()
+                self._writer.close()
+            self._closing = self._writer
+            self._reader = self._writer = self.socket = None
+
+    async def wait_closed(self):
+        """Waits until the connection closed by 'disconnect', if any, has
+        been closed, so that no transport is left open.
+        """
+        writer, self._closing = self._closing, None
+        if writer is None:
+            return
+        try:
+            if hasattr(writer, 'wait_closed'):
+                await writer.wait_closed()
+            else:
+                # Before Python 3.7, the transport is closed by a callback
+                # scheduled by 'close'.
+                await asyncio.sleep(0)
+        except OSError:
+            # An error ending the connection does not matter once it is over.
+            pass
+
+    def register_exception_handler(self, handler_func, *exc_types, **kwds):
+        raise NotImplementedError(
+            'Exceptions are raised from the iteration of an AsyncConnection.')
+
+    def _check_connection(self):
+        if self.connected:
+            raise InvalidState('There is an existing connection.')
+
+    def _start_network_thread(self):
+        raise InvalidState('An AsyncConnection has no networking thread.')
+
+    async def _open(self):
+        await self.wait_closed()
+        self._reader, self._writer = await asyncio.open_connection(
+            self.options.address, self.options.port)
+        self.socket = _StreamWriterSocket(self._writer)
+        self._frame_reader = FrameReader()
+        self._frame_writer = FrameWriter(
+            max_bytes=self.options.max_batch_bytes,
+            max_packets=self.options.max_batch_packets)
+        self._decryptor = None
+        self.options.compression_enabled = False
+        self.options.compression_threshold = -1
+        self.connected = True
+
+    def _enable_encryption(self, encryptor, decryptor):
+        self._flush()
+        self.socket = encryption.EncryptedSocketWrapper(
+            self.socket, encryptor, decryptor)
+        self._decryptor = decryptor
+        self._frame_reader.transform_pending(decryptor.update)
+
+    async def _read_packet(self):
+        frame = self._frame_reader.next_frame()
+        while frame is None:
+            # Send any packets written so far, as they may be what the server
+            # is waiting for before it sends anything more.
+            self._flush()
+            if self.stats is None:
+                data = await self._reader.read(self.read_size)
+            else:
+                start = self.stats.clock()
+                data = await self._reader.read(self.read_size)
+                self.stats.wait_time += self.stats.clock() - start
+            if not data:
+                raise EOFError('Unexpected end of message.')
+            if self._decryptor is not None:
+                data = self._decryptor.update(data)
+            self._frame_reader.feed(data)
+            frame = self._frame_reader.next_frame()
+        return self.reactor.parse_packet(frame)
+
+    async def _run_until(self, condition):
+        # Read and react to packets until 'condition()' becomes true or the
+        # connection is closed.
+        async for _packet in self:
+            if condition():
+                break
+
+
+class _StreamWriterSocket(object):
+    # Presents an 'asyncio.StreamWriter' with the socket-like interface used
+    # by 'Packet.write' and 'EncryptedSocketWrapper'.
+    __slots__ = 'writer',
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def send(self, data):
+        self.writer.write(data)
+        return len(data)
+
+    def sendall(self, data):
+        self.writer.write(data)
+
+
+class _AsyncPlayingStatusReactor(PlayingStatusReactor):
+    # As 'PlayingStatusReactor', except that, instead of reconnecting
+    # immediately, the choice of protocol version is recorded and the
+    # reconnection is left to 'AsyncConnection.connect'.
+    def handle_proto_version(self, proto_version):
+        self.connection.allowed_proto_versions = {proto_version}
+
+    def handle_exception(self, exc, exc_info):
+        if isinstance(exc, EOFError):
+            self.handle_failure()
+            return True
@@ -4,7 +4,6 @@ import zlib
 import threading
 import socket
 import timeit
-import select
 import sys
 import json
 import re
@@ -12,6 +11,11 @@ import re
 from .types import VarInt
 from .packets import clientbound, serverbound
 from . import packets, encryption
+from .framing import FrameReader, FrameBuffer, FrameWriter
+from .stats import ConnectionStats
+from .waker import Waker
+from .outgoing import OutgoingQueue, OVERFLOW_POLICIES
+from .packet_queue import PacketQueue
 from .. import (
     utility, KNOWN_MINECRAFT_VERSIONS, SUPPORTED_MINECRAFT_VERSIONS,
     SUPPORTED_PROTOCOL_VERSIONS, PROTOCOL_VERSION_INDICES
@@ -63,11 +67,49 @@ class ConnectionContext(object):
 
 class _ConnectionOptions(object):
     def __init__(self, address=None, port=None, compression_threshold=-1,
-                 compression_enabled=False):
+                 compression_enabled=False, max_batch_bytes=65536,
+                 max_batch_packets=300, lazy_decoding=False,
+                 max_decompressed_size=8388608, compression_level=-1,
+                 compression_executor=None, compression_offload_size=65536,
+                 compact_packets=False, pool_packets=False,
+                 collect_stats=False, max_queue_size=None,
+                 queue_overflow='block', prioritize_packets=False):
         self.address = address
         self.port = port
         self.compression_threshold = compression_threshold
         self.compression_enabled = compression_enabled
+        # Outgoing packets are written to the network in batches, each of
+        # which is sent as soon as it reaches either of these sizes, or
+        # otherwise at the end of each iteration of the networking loop.
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_packets = max_batch_packets
+        self.lazy_decoding = lazy_decoding
+        # Compressed packets declaring a larger size than this are rejected.
+        self.max_decompressed_size = max_decompressed_size
+        # The zlib compression level of outgoing packets, from 0 to 9, or -1
+        # for the default level. If 'compression_executor' is not None, it
+        # is a 'concurrent.futures.Executor' (such as a ThreadPoolExecutor)
+        # used to compress outgoing packets whose payloads are larger than
+        # 'compression_offload_size', without delaying other packets.
+        self.compression_level = compression_level
+        self.compression_executor = compression_executor
+        self.compression_offload_size = compression_offload_size
+        # If True, incoming packets are instances of the classes given by
+        # 'Packet.compact_class', rather than of the packet classes themselves.
+        self.compact_packets = compact_packets
+        # If True, instances of packet classes whose 'poolable' attribute is
+        # True are reused for later incoming packets once they have been
+        # passed to all packet listeners, unless they are retained.
+        self.pool_packets = pool_packets
+        # If True, the connection's 'stats' attribute is a 'ConnectionStats'
+        # which is updated with each packet received and sent.
+        self.collect_stats = collect_stats
+        # If 'max_queue_size' is not None or 'prioritize_packets' is True,
+        # outgoing packets are queued in an 'OutgoingQueue' with these
+        # settings, rather than in an unbounded deque.
+        self.max_queue_size = max_queue_size
+        self.queue_overflow = queue_overflow
+        self.prioritize_packets = prioritize_packets
 
 
 class Connection(object):
@@ -85,6 +127,21 @@ class Connection(object):
         allowed_versions=None,
         handle_exception=None,
         handle_exit=None,
+        multiplexer=None,
+        max_batch_bytes=65536,
+        max_batch_packets=300,
+        max_decompressed_size=8388608,
+        compression_level=-1,
+        compression_executor=None,
+        compression_offload_size=65536,
+        lazy_decoding=False,
+        compact_packets=False,
+        pool_packets=False,
+        collect_stats=False,
+        max_queue_size=None,
+        queue_overflow='block',
+        prioritize_packets=False,
+        version_cache=None,
     ):
         """Sets up an instance of this object to be able to connect to a
         minecraft server.
@@ -127,6 +184,86 @@ class Connection(object):
                             and not with the intention to automatically
                             reconnect. Exceptions raised from this function
                             will be handled by any matching exception handlers.
+        :param multiplexer: A :class:`minecraft.networking.multiplexer.Multiplexer`
+                            which is to perform the networking of this
+                            connection, or None to start a new networking
+                            thread for each connection to a server.
+        :param max_batch_bytes: Outgoing packets are sent to the server in
+                                batches, each of which is sent once it holds
+                                this many bytes (or None for no limit), or
+                                otherwise when the networking thread has no
+                                more packets to write.
+        :param max_batch_packets: The number of packets (or None for no limit)
+                                  at which a batch of outgoing packets is sent,
+                                  as for 'max_batch_bytes'.
+        :param max_decompressed_size: The greatest uncompressed size, in
+                                      bytes, of an incoming compressed packet.
+                                      A packet declaring a larger size causes
+                                      a ValueError to be raised in the
+                                      networking thread, so that a server
+                                      cannot exhaust the client's memory.
+        :param compression_level: The zlib compression level, from 0 to 9, or
+                                  -1 for zlib's default, of outgoing packets
+                                  when the server enables compression.
+        :param compression_executor: If not None, a
+                                     'concurrent.futures.Executor' (such as a
+                                     ThreadPoolExecutor) which compresses
+                                     outgoing packets larger than
+                                     'compression_offload_size', so that the
+                                     networking thread is not delayed. Packets
+                                     are still sent in the order written.
+        :param compression_offload_size: The payload size, in bytes, above
+                                         which packets are compressed by the
+                                         'compression_executor', if any.
+        :param lazy_decoding: If True, the fields of each incoming packet are
+                              read when they are first accessed, unless the
+                              packet is needed by the current reactor or by
+                              any non-outgoing packet listener, in which case
+                              they are read as soon as it is received. This
+                              avoids reading packets that are not used, but
+                              any error in their data is raised when they are
+                              accessed, rather than in the networking thread.
+        :param compact_packets: If True, each incoming packet is an instance of
+                                a subclass of its usual class, created by
+                                'Packet.compact_class', which keeps the
+                                packet's fields in '__slots__', so that it
+                                uses less memory.
+        :param pool_packets: If True, incoming packets of the most frequent
+                             types (those whose class has 'poolable' set) are
+                             reused once all packet listeners have been called
+                             with them. A listener which keeps such a packet
+                             must call its 'retain' or 'copy' method.
+        :param collect_stats: If True, the 'stats' attribute is a
+                              :class:`minecraft.networking.stats.ConnectionStats`
+                              counting the packets and bytes received and sent
+                              and the time spent handling them; otherwise, it
+                              is None.
+        :param max_queue_size: If not None, the greatest number of packets that
+                               may wait to be sent by the networking thread,
+                               after being written with 'write_packet'.
+        :param queue_overflow: What 'write_packet' does with a packet when
+                               'max_queue_size' packets are already waiting:
+                               'block' waits until there is room (except in
+                               the networking thread, where the packet is
+                               queued anyway), 'drop_oldest' discards the
+                               oldest of the lowest-priority packets, and
+                               'raise' raises
+                               :class:`minecraft.exceptions.OutgoingQueueFull`.
+        :param prioritize_packets: If True, queued packets are sent in
+                                   decreasing order of their classes'
+                                   'priority' attribute, so that keep-alive
+                                   responses and teleport confirmations are
+                                   sent first, and a packet whose
+                                   'coalescing_key' is not None, such as a
+                                   position and look update, replaces any
+                                   queued packet with the same key.
+        :param version_cache: If not None, a
+                              :class:`minecraft.networking.version_cache.ProtocolVersionCache`
+                              (such as 'version_cache.default_cache', which
+                              may be shared by all connections) remembering
+                              the protocol versions of servers, so that the
+                              status query made before logging in when more
+                              than one version is allowed may be skipped.
         """  # NOQA
 
         # This lock is re-entrant because it may be acquired in a re-entrant
@@ -135,10 +272,12 @@ class Connection(object):
 
         self.networking_thread = None
         self.new_networking_thread = None
-        self.packet_listeners = []
-        self.early_packet_listeners = []
-        self.outgoing_packet_listeners = []
-        self.early_outgoing_packet_listeners = []
+        self.multiplexer = multiplexer
+        self.version_cache = version_cache
+        self.packet_listeners = packets.PacketListenerList()
+        self.early_packet_listeners = packets.PacketListenerList()
+        self.outgoing_packet_listeners = packets.PacketListenerList()
+        self.early_outgoing_packet_listeners = packets.PacketListenerList()
         self._exception_handlers = []
 
         def proto_version(version):
@@ -168,7 +307,22 @@ class Connection(object):
 
         self.context = ConnectionContext(protocol_version=latest_allowed_proto)
 
-        self.options = _ConnectionOptions()
+        self.options = _ConnectionOptions(
+            max_batch_bytes=max_batch_bytes,
+            max_batch_packets=max_batch_packets,
+            max_decompressed_size=max_decompressed_size,
+            compression_level=compression_level,
+            compression_executor=compression_executor,
+            compression_offload_size=compression_offload_size,
+            lazy_decoding=lazy_decoding, compact_packets=compact_packets,
+            pool_packets=pool_packets, collect_stats=collect_stats,
+            max_queue_size=max_queue_size, queue_overflow=queue_overflow,
+            prioritize_packets=prioritize_packets)
+        if queue_overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown queue overflow policy: %r.'
+                             % (queue_overflow,))
+        self._packet_pool = packets.PacketPool() if pool_packets else None
+        self.stats = ConnectionStats() if collect_stats else None
         self.options.address = address
         self.options.port = port
         self.auth_token = auth_token
@@ -189,6 +343,10 @@ class Connection(object):
                not self.networking_thread.interrupt or \
                self.new_networking_thread is not None:
                 raise InvalidState('A networking thread is already running.')
+            elif self.multiplexer is not None:
+                # The multiplexer will remove any previous networking task,
+                # which has been interrupted, before servicing this one.
+                self.networking_thread = self.multiplexer._register(self)
             elif self.networking_thread is None:
                 self.networking_thread = NetworkingThread(self)
                 self.networking_thread.start()
@@ -204,10 +362,14 @@ class Connection(object):
         """Writes a packet to the server.
 
         If force is set to true, the method attempts to acquire the write lock
-        and write the packet out immediately, and as such may block.
+        and write the packet out immediately, along with any other packets
+        waiting in the current batch, and as such may block.
 
         If force is false then the packet will be added to the end of the
-        packet writing queue to be sent 'as soon as possible'
+        packet writing queue to be sent 'as soon as possible', waking the
+        networking thread if it is waiting for incoming packets. If the queue
+        is full (see 'max_queue_size'), this may block, discard a packet or
+        raise :class:`minecraft.exceptions.OutgoingQueueFull`.
 
         :param packet: The :class:`network.packets.Packet` to write
         :param force(bool): Specifies if the packet write should be immediate
@@ -216,8 +378,13 @@ class Connection(object):
         if force:
             with self._write_lock:
                 self._write_packet(packet)
+                self._flush()
         else:
             self._outgoing_packet_queue.append(packet)
+            if self.stats is not None:
+                self.stats.record_queue_length(
+                    len(self._outgoing_packet_queue))
+            self._wake()
 
     def listener(self, *packet_types, **kwds):
         """
@@ -233,6 +400,28 @@ class Connection(object):
 
         return listener_decorator
 
+    def packets(self, *packet_types, **kwds):
+        """
+        Returns a :class:`minecraft.networking.packet_queue.PacketQueue` which
+        receives incoming packets of the given types (or of all types, if none
+        are given), and may be iterated over, from any thread, to consume
+        them. It stops receiving packets when it is closed, or when the
+        connection terminates.
+
+        :param packet_types: Packet types to receive.
+        :param maxsize: The greatest number of packets kept in the queue
+                        (default 1024), or None for no limit.
+        :param overflow: What happens to packets arriving when the queue is
+                         full: 'drop_oldest' (the default), 'drop_newest' or
+                         'block'.
+        :param timeout: The greatest time to wait for each packet when
+                        iterating over the queue, or None (the default) to
+                        wait indefinitely.
+        """
+        queue = PacketQueue(self, *packet_types, **kwds)
+        self.packet_listeners.append(queue)
+        return queue
+
     def exception_handler(self, *exc_types, **kwds):
         """
         Shorthand decorator to register a function as an exception handler.
@@ -259,21 +448,44 @@ class Connection(object):
         :param method: The method which will be called back with the packet
         :param packet_types: The packets to listen for
         :param outgoing: If 'True', this listener will be called on outgoing
-                         packets just after they are sent to the server, rather
-                         than on incoming packets.
+                         packets just after they are added to the batch of
+                         packets to be sent to the server (see
+                         'max_batch_bytes'), rather than on incoming packets.
+                         The packet may not yet have reached the network.
         :param early: If 'True', this listener will be called before any
                       built-in default action is carried out, and before any
                       listeners with 'early=False' are called. If
                       'outgoing=True', the listener will be called before the
                       packet is written to the network, rather than afterwards.
-        """
+        :param executor: If not None, a 'concurrent.futures.Executor' (such as
+                         a ThreadPoolExecutor) which calls this listener, so
+                         that it does not delay the networking thread. The
+                         listener is called with one packet at a time, in the
+                         order they were received, and raising 'IgnorePacket'
+                         from it has no effect. See
+                         :class:`minecraft.networking.packets.ExecutorPacketListener`.
+                         Early listeners may not have an executor.
+        :param max_pending: If 'executor' is given, the greatest number of
+                            packets that may wait for this listener (default
+                            1024) before the networking thread waits for it.
+        """  # NOQA
         outgoing = kwds.pop('outgoing', False)
         early = kwds.pop('early', False)
+        executor = kwds.pop('executor', None)
         target = self.packet_listeners if not early and not outgoing \
             else self.early_packet_listeners if early and not outgoing \
             else self.outgoing_packet_listeners if not early \
             else self.early_outgoing_packet_listeners
-        target.append(packets.PacketListener(method, *packet_types, **kwds))
+        if executor is not None:
+            if early:
+                raise ValueError('Early packet listeners run in the '
+                                 'networking thread, and may not have an '
+                                 'executor.')
+            target.append(packets.ExecutorPacketListener(
+                method, executor, *packet_types, **kwds))
+        else:
+            target.append(packets.PacketListener(method, *packet_types,
+                                                 **kwds))
 
     def register_exception_handler(self, handler_func, *exc_types, **kwds):
         """
@@ -329,22 +541,51 @@ class Connection(object):
             return True
 
     def _write_packet(self, packet):
-        # Immediately writes the given packet to the network. The caller must
-        # have the write lock acquired before calling this method.
+        # Immediately writes the given packet to the current outgoing batch,
+        # which is sent to the network if it is full. The caller must have the
+        # write lock acquired before calling this method.
         try:
-            for listener in self.early_outgoing_packet_listeners:
-                listener.call_packet(packet)
-
+            packet_type = type(packet)
+            for callback in self.early_outgoing_packet_listeners.callbacks(
+                    packet_type):
+                callback(packet)
+
+            stats = self.stats
+            if stats is not None:
+                start, offset = stats.clock(), len(self._frame_writer)
             if self.options.compression_enabled:
-                packet.write(self.socket, self.options.compression_threshold)
+                self._frame_writer.append(
+                    packet, self.options.compression_threshold,
+                    self.options.compression_level)
             else:
-                packet.write(self.socket)
-
-            for listener in self.outgoing_packet_listeners:
-                listener.call_packet(packet)
+                self._frame_writer.append(packet)
+            if stats is not None:
+                # If the packet is being compressed by the executor, its
+                # frame is not in the buffer, which will have been replaced.
+                buffer = self._frame_writer.buffer
+                stats.record_out(
+                    packet_type, buffer if len(buffer) > offset else None,
+                    offset, self.options.compression_enabled,
+                    stats.clock() - start)
+            if self._frame_writer.full:
+                # Do not wait for any packets being compressed by the
+                # executor, as this may be the networking thread.
+                self._flush(block=False)
+
+            for callback in self.outgoing_packet_listeners.callbacks(
+                    packet_type):
+                callback(packet)
         except IgnorePacket:
             pass
 
+    def _flush(self, block=True):
+        # Sends the current outgoing batch, if any, to the network. If 'block'
+        # is False, packets still being compressed by the executor, and those
+        # following them, are left to be sent by a later call. The caller must
+        # have the write lock acquired before calling this method.
+        if self.socket is not None:
+            self._frame_writer.flush(self.socket, block=block)
+
     def status(self, handle_status=None, handle_ping=False):
         """Issue a status request to the server and then disconnect.
 
@@ -378,7 +619,7 @@ class Connection(object):
                 self.reactor.handle_ping = handle_ping
 
             request_packet = serverbound.status.RequestPacket()
-            self.write_packet(request_packet)
+            self.write_packet(request_packet, force=True)
 
     def connect(self):
         """
@@ -399,26 +640,40 @@ class Connection(object):
 
             self.spawned = False
             self._connect()
+            cached_version = None if self.version_cache is None else \
+                self.version_cache.get(self.options.address, self.options.port)
             if len(self.allowed_proto_versions) == 1:
                 # There is exactly one allowed protocol version, so skip the
                 # process of determining the server's version, and immediately
                 # connect.
-                self._handshake(next_state=STATE_PLAYING)
-                login_start_packet = serverbound.login.LoginStartPacket()
-                if self.auth_token:
-                    login_start_packet.name = self.auth_token.profile.name
-                else:
-                    login_start_packet.name = self.username
-                self.write_packet(login_start_packet)
-                self.reactor = LoginReactor(self)
+                self._start_login()
+            elif cached_version in self.allowed_proto_versions:
+                # The server's version was recently determined, so assume that
+                # it has not changed, unless the login fails.
+                self.context.protocol_version = cached_version
+                self._start_login()
+                self.reactor.version_cached = True
             else:
                 # Determine the server's protocol version by first performing a
                 # status query.
                 self._handshake(next_state=STATE_STATUS)
-                self.write_packet(serverbound.status.RequestPacket())
+                self.write_packet(serverbound.status.RequestPacket(),
+                                  force=True)
                 self.reactor = PlayingStatusReactor(self)
             self._start_network_thread()
 
+    def _start_login(self):
+        # Send the handshake and login start packets, and prepare to react to
+        # packets in the login state.
+        self._handshake(next_state=STATE_PLAYING)
+        login_start_packet = serverbound.login.LoginStartPacket()
+        if self.auth_token:
+            login_start_packet.name = self.auth_token.profile.name
+        else:
+            login_start_packet.name = self.username
+        self.write_packet(login_start_packet, force=True)
+        self.reactor = LoginReactor(self)
+
     def _check_connection(self):
         if self.networking_thread is not None and \
            not self.networking_thread.interrupt or \
@@ -432,7 +687,7 @@ class Connection(object):
         # since it's "guaranteed" to read the number of bytes specified,
         # the socket itself will mostly be used to write data upstream to
         # the server.
-        self._outgoing_packet_queue = deque()
+        self._outgoing_packet_queue = self._new_outgoing_queue()
 
         info = socket.getaddrinfo(self.options.address, self.options.port,
                                   0, socket.SOCK_STREAM)
@@ -448,10 +703,34 @@ class Connection(object):
         self.socket = socket.socket(ai_faml, ai_type, ai_prot)
         self.socket.connect(ai_addr)
         self.file_object = self.socket.makefile("rb", 0)
+        self._frame_reader = FrameReader()
+        self._frame_writer = FrameWriter(
+            max_bytes=self.options.max_batch_bytes,
+            max_packets=self.options.max_batch_packets,
+            executor=self.options.compression_executor,
+            offload_size=self.options.compression_offload_size,
+            on_ready=self._wake, nonblocking=self.multiplexer is not None)
         self.options.compression_enabled = False
         self.options.compression_threshold = -1
         self.connected = True
 
+    def _new_outgoing_queue(self):
+        options = self.options
+        if options.max_queue_size is None and not options.prioritize_packets:
+            return deque()
+        return OutgoingQueue(
+            max_size=options.max_queue_size, overflow=options.queue_overflow,
+            prioritize=options.prioritize_packets,
+            may_block=self._may_block)
+
+    def _may_block(self):
+        # Returns False if the current thread is the one which writes out the
+        # queued packets, and so must not wait for room in the queue.
+        for thread in self.networking_thread, self.new_networking_thread:
+            if thread is not None and thread.is_current():
+                return False
+        return True
+
     def disconnect(self, immediate=False):
         """Terminate the existing server connection, if there is one.
            If 'immediate' is True, do not attempt to write any packets.
@@ -463,6 +742,7 @@ class Connection(object):
                 # Flush any packets remaining in the queue.
                 while self._pop_packet():
                     pass
+                self._flush()
 
             if self.new_networking_thread is not None:
                 self.new_networking_thread.interrupt = True
@@ -478,6 +758,20 @@ class Connection(object):
                     self.file_object.close()
                     self.socket.close()
                     self.socket = None
+                    if isinstance(self._outgoing_packet_queue, OutgoingQueue):
+                        # Release any threads waiting to queue packets.
+                        self._outgoing_packet_queue.close()
+
+    def _enable_encryption(self, encryptor, decryptor):
+        # Wrap the socket and file object so that all further data is
+        # encrypted and decrypted with the given cipher contexts, decrypting
+        # any data that has already been received but not yet read.
+        self._flush()
+        self.socket = encryption.EncryptedSocketWrapper(
+            self.socket, encryptor, decryptor)
+        self.file_object = encryption.EncryptedFileObjectWrapper(
+            self.file_object, decryptor)
+        self._frame_reader.transform_pending(decryptor.update)
 
     def _handshake(self, next_state=STATE_PLAYING):
         handshake = serverbound.handshake.HandShakePacket()
@@ -486,7 +780,11 @@ class Connection(object):
         handshake.server_port = self.options.port
         handshake.next_state = next_state
 
-        self.write_packet(handshake)
+        # The packets that begin a connection are written at once, rather than
+        # being queued, as they must not be subject to the queue's capacity:
+        # the caller holds the write lock, and there may not yet be any
+        # networking thread to empty the queue.
+        self.write_packet(handshake, force=True)
 
     def _handle_exception(self, exc, exc_info):
         final_handler = self.handle_exception
@@ -532,6 +830,8 @@ class Connection(object):
         # current connection is completely terminated.
         if (self.new_networking_thread or self.networking_thread).interrupt:
             self.disconnect(immediate=True)
+        if not self.connected:
+            self._close_packet_queues()
 
         # If allowed by the final exception handler, re-raise the exception.
         if final_handler is None and not caught:
@@ -557,30 +857,99 @@ class Connection(object):
         raise err
 
     def _handle_exit(self):
-        if not self.connected and self.handle_exit is not None:
-            self.handle_exit()
+        if not self.connected:
+            self._close_packet_queues()
+            if self.handle_exit is not None:
+                self.handle_exit()
+
+    def _close_packet_queues(self):
+        # Ends iteration over any queues returned by 'packets', once they are
+        # empty, as no more packets will be received.
+        for listener in list(self.packet_listeners):
+            if isinstance(listener, PacketQueue):
+                listener.close()
+
+    def _is_listened(self, packet_type):
+        # Returns True if any incoming packet listener may be called with
+        # packets of the given type.
+        return bool(self.early_packet_listeners.callbacks(packet_type) or
+                    self.packet_listeners.callbacks(packet_type))
+
+    def _wake(self):
+        # Wakes the networking thread, if it is waiting for incoming packets,
+        # so that it writes any newly queued or newly compressed packets.
+        thread = self.networking_thread
+        if thread is not None:
+            thread.wake()
+
+    def _recycle(self, packet):
+        # Called when 'packet' has been passed to all packet listeners, so that
+        # it may be reused if it was taken from the packet pool.
+        pool = packet._pool
+        if pool is not None:
+            pool.release(packet)
 
     def _react(self, packet):
+        stats = self.stats
+        if stats is not None:
+            return self._react_with_stats(packet, stats)
         try:
-            for listener in self.early_packet_listeners:
-                listener.call_packet(packet)
+            packet_type = type(packet)
+            for callback in self.early_packet_listeners.callbacks(packet_type):
+                callback(packet)
             self.reactor.react(packet)
-            for listener in self.packet_listeners:
-                listener.call_packet(packet)
+            for callback in self.packet_listeners.callbacks(packet_type):
+                callback(packet)
         except IgnorePacket:
             pass
 
+    def _react_with_stats(self, packet, stats):
+        # As '_react', but recording the time spent in the reactor and in
+        # packet listeners.
+        clock = stats.clock
+        start = clock()
+        reactor_time = 0.0
+        try:
+            packet_type = type(packet)
+            for callback in self.early_packet_listeners.callbacks(packet_type):
+                callback(packet)
+            reactor_start = clock()
+            try:
+                self.reactor.react(packet)
+            finally:
+                reactor_time = clock() - reactor_start
+            for callback in self.packet_listeners.callbacks(packet_type):
+                callback(packet)
+        except IgnorePacket:
+            pass
+        finally:
+            stats.reactor_time += reactor_time
+            stats.listener_time += clock() - start - reactor_time
+
 
 class NetworkingThread(threading.Thread):
+    # The maximum time in seconds for which to wait for incoming packets when
+    # there are none to be written. The thread is woken earlier by 'wake'.
+    idle_timeout = 0.05
+
     def __init__(self, connection, previous=None):
         threading.Thread.__init__(self)
         self.interrupt = False
         self.connection = connection
         self.name = "Networking Thread"
         self.daemon = True
+        self.waker = Waker()
 
         self.previous_thread = previous
 
+    def wake(self):
+        # Causes the thread to stop waiting for incoming packets, if it is
+        # doing so, and write any packets that are waiting to be written.
+        self.waker.wake()
+
+    def is_current(self):
+        return threading.current_thread() is self
+
     def run(self):
         try:
             if self.previous_thread is not None:
@@ -597,9 +966,14 @@ class NetworkingThread(threading.Thread):
         finally:
             with self.connection._write_lock:
                 self.connection.networking_thread = None
+            self.waker.close()
 
     def _run(self):
         while not self.interrupt:
+            # Any wakeup requested from this point on will cause the next wait
+            # for incoming packets to end immediately.
+            self.waker.clear()
+
             # Attempt to write out as many as 300 packets.
             num_packets = 0
             with self.connection._write_lock:
@@ -608,22 +982,25 @@ class NetworkingThread(threading.Thread):
                         num_packets += 1
                         if num_packets >= 300:
                             break
+                    self.connection._flush(block=False)
                     exc_info = None
                 except IOError:
                     exc_info = sys.exc_info()
 
                 # If any packets remain to be written, resume writing as soon
                 # as possible after reading any available packets; otherwise,
-                # wait for up to 50ms (1 tick) for new packets to arrive.
+                # wait for new packets to arrive until the thread is woken by
+                # a packet being queued or finishing being compressed.
                 if self.connection._outgoing_packet_queue:
                     read_timeout = 0
                 else:
-                    read_timeout = 0.05
+                    read_timeout = self.idle_timeout
 
             # Read and react to as many as 50 packets.
             while num_packets < 50 and not self.interrupt:
                 packet = self.connection.reactor.read_packet(
-                    self.connection.file_object, timeout=read_timeout)
+                    self.connection.file_object, timeout=read_timeout,
+                    waker=self.waker)
                 if not packet:
                     break
                 num_packets += 1
@@ -635,6 +1012,7 @@ class NetworkingThread(threading.Thread):
                 # the closed socket, which does not represent a program error.
                 if exc_info is not None and packet.packet_name == "disconnect":
                     exc_info = None
+                self.connection._recycle(packet)
 
             if exc_info is not None:
                 exc_value, exc_tb = exc_info[1:]
@@ -650,57 +1028,110 @@ class PacketReactor(object):
     # Handshaking is considered the "default" state
     get_clientbound_packets = staticmethod(clientbound.handshake.get_packets)
 
+    # The names of the packets whose fields are used by 'react', or None if
+    # this is not known. Subclasses overriding 'react' should update this, or
+    # set it to None, so that these packets are not read lazily.
+    handled_packet_names = frozenset()
+
     def __init__(self, connection):
         self.connection = connection
+        # This is a copy of the shared table, so that it may be modified.
         context = self.connection.context
-        self.clientbound_packets = {
-            packet.get_id(context): packet
-            for packet in self.__class__.get_clientbound_packets(context)}
-
-    def read_packet(self, stream, timeout=0):
+        self.clientbound_packets = dict(packets.registry.get_packet_classes(
+            self.__class__.get_clientbound_packets, context))
+        if self.connection.options.compact_packets:
+            for packet_id, packet_class in self.clientbound_packets.items():
+                self.clientbound_packets[packet_id] = \
+                    packet_class.compact_class(context)
+
+    def read_packet(self, stream, timeout=0, waker=None):
         # Block for up to `timeout' seconds waiting for `stream' to become
-        # readable, returning `None' if the timeout elapses.
-        ready_to_read = select.select([stream], [], [], timeout)[0]
-
-        if ready_to_read:
-            length = VarInt.read(stream)
-
-            packet_data = packets.PacketBuffer()
-            packet_data.send(stream.read(length))
-            # Ensure we read all the packet
-            while len(packet_data.get_writable()) < length:
-                packet_data.send(
-                    stream.read(length - len(packet_data.get_writable())))
-            packet_data.reset_cursor()
-
-            if self.connection.options.compression_enabled:
-                decompressed_size = VarInt.read(packet_data)
-                if decompressed_size > 0:
-                    decompressor = zlib.decompressobj()
-                    decompressed_packet = decompressor.decompress(
-                                                       packet_data.read())
-                    assert len(decompressed_packet) == decompressed_size, \
-                        'decompressed length %d, but expected %d' % \
-                        (len(decompressed_packet), decompressed_size)
-                    packet_data.reset()
-                    packet_data.send(decompressed_packet)
-                    packet_data.reset_cursor()
-
-            packet_id = VarInt.read(packet_data)
-
-            # If we know the structure of the packet, attempt to parse it
-            # otherwise, just return an instance of the base Packet class.
-            if packet_id in self.clientbound_packets:
-                packet = self.clientbound_packets[packet_id]()
-                packet.context = self.connection.context
-                packet.read(packet_data)
-            else:
-                packet = packets.Packet()
-                packet.context = self.connection.context
-                packet.id = packet_id
-            return packet
+        # readable, returning `None' if the timeout elapses or if `waker' is
+        # woken first.
+        reader = self.connection._frame_reader
+        stats = self.connection.stats
+        if stats is None:
+            frame = reader.read_frame(stream, timeout, waker)
         else:
+            start = stats.clock()
+            frame = reader.read_frame(stream, timeout, waker)
+            stats.wait_time += stats.clock() - start
+        if frame is None:
             return None
+        return self.parse_packet(frame)
+
+    def parse_packet(self, frame):
+        # Decode a packet from the payload of a single frame, i.e. the bytes
+        # following its length prefix, given as a bytes-like object.
+        stats = self.connection.stats
+        if stats is not None:
+            start = stats.clock()
+        packet_data = FrameBuffer(frame)
+
+        options = self.connection.options
+        if options.compression_enabled:
+            decompressed_size = VarInt.read(packet_data)
+            if decompressed_size > options.max_decompressed_size:
+                raise ValueError(
+                    'Compressed packet declares a size of %d, more than the '
+                    'maximum of %d.' % (decompressed_size,
+                                        options.max_decompressed_size))
+            if decompressed_size > 0:
+                # Limiting the output to the declared size means that only a
+                # buffer of that size is allocated, and no more is produced
+                # even if the data would decompress to something larger.
+                decompressor = zlib.decompressobj()
+                decompressed_packet = decompressor.decompress(
+                    packet_data.remaining(), decompressed_size)
+                if len(decompressed_packet) != decompressed_size \
+                        or not decompressor.eof:
+                    raise ValueError(
+                        'Compressed packet does not decompress to its '
+                        'declared size of %d.' % decompressed_size)
+                packet_data = FrameBuffer(decompressed_packet)
+
+        raw_size = len(packet_data.view) - packet_data.pos
+        packet_id = VarInt.read(packet_data)
+
+        # If we know the structure of the packet, attempt to parse it
+        # otherwise, just return an instance of the base Packet class.
+        if packet_id in self.clientbound_packets:
+            packet_class = self.clientbound_packets[packet_id]
+            pool = self.connection._packet_pool
+            packet = pool.get(packet_class) \
+                if pool is not None and packet_class.poolable \
+                else packet_class()
+            packet.context = self.connection.context
+            # Pooled packets are never read lazily, as the fields from their
+            # previous use would be accessed instead.
+            if options.lazy_decoding \
+                    and packet_class.lazy_read \
+                    and packet._pool is None \
+                    and not self.needs_packet(packet_class):
+                payload = packet_data.remaining()
+                if not isinstance(payload.obj, bytes):
+                    # The frame may be overwritten by data received later.
+                    payload = payload.tobytes()
+                packet.read_lazily(payload)
+            else:
+                packet.read(packet_data)
+        else:
+            packet = packets.Packet()
+            packet.context = self.connection.context
+            packet.id = packet_id
+        if stats is not None:
+            stats.record_in(type(packet), len(frame), raw_size,
+                            stats.clock() - start)
+        return packet
+
+    def needs_packet(self, packet_class):
+        """Returns True if incoming packets of the given class are used by this
+           reactor or by any packet listener of the connection, so that they
+           should be read as soon as they are received, or False otherwise.
+        """
+        return self.handled_packet_names is None \
+            or packet_class.packet_name in self.handled_packet_names \
+            or self.connection._is_listened(packet_class)
 
     def react(self, packet):
         """Called with each incoming packet after early packet listeners are
@@ -720,6 +1151,13 @@ class PacketReactor(object):
 
 class LoginReactor(PacketReactor):
     get_clientbound_packets = staticmethod(clientbound.login.get_packets)
+    handled_packet_names = frozenset((
+        'encryption request', 'disconnect', 'login success', 'set compression',
+        'login plugin request'))
+
+    # True if the protocol version was taken from the connection's
+    # 'version_cache', rather than being determined by a status query.
+    version_cached = False
 
     def react(self, packet):
         if packet.packet_name == "encryption request":
@@ -745,13 +1183,8 @@ class LoginReactor(PacketReactor):
 
             # Enable the encryption
             cipher = encryption.create_AES_cipher(secret)
-            encryptor = cipher.encryptor()
-            decryptor = cipher.decryptor()
-            self.connection.socket = encryption.EncryptedSocketWrapper(
-                self.connection.socket, encryptor, decryptor)
-            self.connection.file_object = \
-                encryption.EncryptedFileObjectWrapper(
-                    self.connection.file_object, decryptor)
+            self.connection._enable_encryption(
+                cipher.encryptor(), cipher.decryptor())
 
         elif packet.packet_name == "disconnect":
             # Receiving a disconnect packet in the login state indicates an
@@ -780,9 +1213,24 @@ class LoginReactor(PacketReactor):
                 serverbound.login.PluginResponsePacket(
                     message_id=packet.message_id, successful=False))
 
+    def handle_exception(self, exc, exc_info):
+        if self.version_cached and \
+           isinstance(exc, (VersionMismatch, LoginDisconnect)):
+            # The server's version may have changed since it was cached, so
+            # forget it, and try again, determining the version anew.
+            self.connection.version_cache.invalidate(
+                self.connection.options.address, self.connection.options.port)
+            self.connection.disconnect(immediate=True)
+            self.connection.connect()
+            return True
+        return False
+
 
 class PlayingReactor(PacketReactor):
     get_clientbound_packets = staticmethod(clientbound.play.get_packets)
+    handled_packet_names = frozenset((
+        'set compression', 'keep alive', 'player position and look',
+        'disconnect'))
 
     def react(self, packet):
         if packet.packet_name == "set compression":
@@ -816,6 +1264,7 @@ class PlayingReactor(PacketReactor):
 
 class StatusReactor(PacketReactor):
     get_clientbound_packets = staticmethod(clientbound.status.get_packets)
+    handled_packet_names = frozenset(('response', 'ping'))
 
     def __init__(self, connection, do_ping=False):
         super(StatusReactor, self).__init__(connection)
@@ -866,6 +1315,10 @@ class PlayingStatusReactor(StatusReactor):
                 server_protocol=proto,
                 server_version=status['version'].get('name'))
 
+        if self.connection.version_cache is not None:
+            self.connection.version_cache.set(
+                self.connection.options.address,
+                self.connection.options.port, proto)
         self.handle_proto_version(proto)
 
     def handle_proto_version(self, proto_version):
@@ -16,6 +16,27 @@ def create_AES_cipher(shared_secret):
     return cipher
 
 
+# Some versions of 'cryptography' require the output buffer of 'update_into'
+# to have room for this many bytes more than the input, even for CFB8.
+UPDATE_INTO_SLACK = 15
+
+
+def update_in_place(cipher_context, buffer, length):
+    """Encrypts or decrypts the first 'length' bytes of the writable buffer
+       'buffer' in place, using the given cipher context. This avoids creating
+       a new bytes object if 'buffer' has room for 'UPDATE_INTO_SLACK' more
+       bytes, or if the installed version of 'cryptography' does not need it.
+    """
+    view = memoryview(buffer)
+    data = view[:length]
+    try:
+        cipher_context.update_into(
+            data, view[:min(len(view), length + UPDATE_INTO_SLACK)])
+    except ValueError:
+        # The output buffer is too small for this version of 'cryptography'.
+        data[:] = cipher_context.update(data)
+
+
 def encrypt_token_and_secret(pubkey, verification_token, shared_secret):
     """Encrypts the verification token and shared secret
     with the server's public key.
@@ -70,6 +91,12 @@ class EncryptedFileObjectWrapper(object):
     def read(self, length):
         return self.decryptor.update(self.actual_file_object.read(length))
 
+    def readinto(self, buffer):
+        count = self.actual_file_object.readinto(buffer)
+        if count:
+            update_in_place(self.decryptor, buffer, count)
+        return count
+
     def fileno(self):
         return self.actual_file_object.fileno()
 
@@ -89,6 +116,25 @@ class EncryptedSocketWrapper(object):
     def send(self, data):
         self.actual_socket.send(self.encryptor.update(data))
 
+    def sendall(self, data):
+        self.actual_socket.sendall(self.encryptor.update(data))
+
+    def sendall_in_place(self, buffer):
+        """As 'sendall', but encrypts 'buffer', which must be a bytearray, in
+           place, so that its original contents are lost.
+        """
+        self.actual_socket.sendall(self.encrypt_in_place(buffer))
+
+    def encrypt_in_place(self, buffer):
+        """Encrypts 'buffer', which must be a bytearray, in place, and returns
+           a 'memoryview' of the encrypted data, which must then be sent to
+           'actual_socket' before any other data is given to this object.
+        """
+        length = len(buffer)
+        buffer.extend(bytes(UPDATE_INTO_SLACK))
+        update_in_place(self.encryptor, buffer, length)
+        return memoryview(buffer)[:length]
+
     def fileno(self):
         return self.actual_socket.fileno()
 
@@ -0,0 +1,372 @@
+"""Contains utilities for cutting the length-prefixed frames of the Minecraft
+   protocol out of a stream of bytes, without reading the stream one byte at a
+   time or copying each frame's payload.
+"""
+from collections import deque
+import select
+import socket as socket_module
+
+from .types import VarInt
+
+# The flag of 'socket.send' which prevents it from blocking, where available
+# (it is not on Windows).
+_MSG_DONTWAIT = getattr(socket_module, 'MSG_DONTWAIT', None)
+
+
+class FrameReader(object):
+    """Reads length-prefixed frames from a stream into a growable receive
+       buffer, which is filled using as few calls as possible to the stream's
+       'readinto' method (for a socket file object, this is 'recv_into').
+
+       Each complete frame is returned as a 'memoryview' of the payload in the
+       receive buffer, excluding the length prefix. Such a view is only valid
+       until the next call to 'fill', 'feed' or 'read_frame', as the data it
+       refers to may then be overwritten; callers wishing to keep the data must
+       copy it.
+    """
+    __slots__ = 'buffer', 'view', 'start', 'end', 'min_read_size'
+
+    def __init__(self, initial_size=65536, min_read_size=16384):
+        self.buffer = bytearray(max(initial_size, min_read_size))
+        self.view = memoryview(self.buffer)
+        self.start = 0  # The offset of the first unconsumed byte.
+        self.end = 0    # The offset just after the last received byte.
+        self.min_read_size = min_read_size
+
+    def __len__(self):
+        """The number of bytes received but not yet returned in a frame."""
+        return self.end - self.start
+
+    def next_frame(self):
+        """Returns the next complete frame already present in the buffer, or
+           None if there is no such frame, without reading from any stream.
+        """
+        buffer, pos, end = self.buffer, self.start, self.end
+        length = shift = 0
+        while True:
+            if pos >= end:
+                return None
+            byte = buffer[pos]
+            pos += 1
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+            if shift >= 7 * VarInt.max_bytes:
+                raise ValueError("Tried to read too long of a VarInt")
+
+        if end - pos < length:
+            # Make sure that the rest of the frame will fit in the buffer.
+            self._reserve(pos - self.start + length)
+            return None
+
+        self.start = pos + length
+        return self.view[pos:self.start]
+
+    def fill(self, stream):
+        """Reads as much data as is immediately available from 'stream' into
+           the buffer, using a single call to 'stream.readinto', and returns
+           the number of bytes read. Raises EOFError if the stream has ended.
+        """
+        if len(self.buffer) - self.end < self.min_read_size:
+            self._reserve(self.end - self.start + self.min_read_size)
+        count = stream.readinto(self.view[self.end:])
+        if count is None:
+            # The stream is non-blocking and no data is available.
+            return 0
+        if count == 0:
+            raise EOFError("Unexpected end of message.")
+        self.end += count
+        return count
+
+    def feed(self, data):
+        """Appends the given bytes to the buffer, for use when data is received
+           by some means other than 'fill', such as an asyncio stream.
+        """
+        count = len(data)
+        if len(self.buffer) - self.end < count:
+            self._reserve(self.end - self.start + count)
+        self.view[self.end:self.end + count] = data
+        self.end += count
+
+    def read_frame(self, stream, timeout=0, waker=None):
+        """Returns the next frame, reading from 'stream' if no complete frame
+           is already buffered. Blocks for up to 'timeout' seconds waiting for
+           'stream' to become readable, returning None if the timeout elapses,
+           or if 'waker' (a 'minecraft.networking.waker.Waker') is given and
+           is woken first; but, once any data has arrived, blocks until a
+           frame is complete.
+        """
+        frame = self.next_frame()
+        if frame is None:
+            waitables = [stream] if waker is None else [stream, waker]
+            if stream not in select.select(waitables, [], [], timeout)[0]:
+                return None
+            self.fill(stream)
+            frame = self.next_frame()
+            while frame is None:
+                self.fill(stream)
+                frame = self.next_frame()
+        return frame
+
+    def transform_pending(self, transform):
+        """Replaces the data received but not yet returned in a frame with the
+           result of 'transform' applied to it, which must be of the same
+           length. This is used when encryption is enabled on the stream, as
+           any such data will have been read before it could be decrypted.
+        """
+        if self.end > self.start:
+            pending = self.view[self.start:self.end]
+            pending[:] = transform(pending)
+
+    def _reserve(self, size):
+        # Ensures that at least 'size' bytes, counting from the first
+        # unconsumed byte, fit in the buffer. Existing frames may be
+        # overwritten, but the buffer is never resized in place, as that is
+        # not possible while any views of it exist.
+        pending = self.end - self.start
+        if size > len(self.buffer):
+            buffer = bytearray(max(size, 2 * len(self.buffer)))
+            view = memoryview(buffer)
+            view[:pending] = self.view[self.start:self.end]
+            self.buffer, self.view = buffer, view
+        elif self.start + size > len(self.buffer) or not pending:
+            self.view[:pending] = self.view[self.start:self.end]
+        else:
+            return
+        self.start, self.end = 0, pending
+
+
+class FrameBuffer(object):
+    """A read-only file-like object over a 'memoryview', providing the same
+       reading interface as 'minecraft.networking.packets.PacketBuffer', but
+       without first copying the data into a new buffer.
+    """
+    __slots__ = 'view', 'pos'
+
+    def __init__(self, view):
+        self.view = view if isinstance(view, memoryview) else memoryview(view)
+        self.pos = 0
+
+    def read(self, length=None):
+        start = self.pos
+        end = len(self.view) if length is None else \
+            min(start + length, len(self.view))
+        self.pos = end
+        return self.view[start:end].tobytes()
+
+    def recv(self, length=None):
+        return self.read(length)
+
+    def read_struct(self, struct):
+        """Unpacks 'struct' from the buffer, advancing the cursor past it."""
+        values = struct.unpack_from(self.view, self.pos)
+        self.pos += struct.size
+        return values
+
+    def read_direct(self, data_type):
+        """Decodes a value of 'data_type', which must have a 'read_from' method
+           (as 'VarInt' does), directly from the buffer, advancing the cursor
+           past it.
+        """
+        value, self.pos = data_type.read_from(self.view, self.pos)
+        return value
+
+    def read_varints(self, var_type, count):
+        """Returns a list of 'count' values of 'var_type', which is 'VarInt'
+           or 'VarLong', decoded as in 'read_direct'.
+        """
+        values, self.pos = var_type.decode_many(self.view, count, self.pos)
+        return values
+
+    def remaining(self):
+        """Returns a view of the unread data, without advancing the cursor."""
+        return self.view[self.pos:]
+
+    def reset_cursor(self):
+        self.pos = 0
+
+
+class FrameWriter(object):
+    """Accumulates the complete frames of outgoing packets in a single buffer,
+       so that a batch of packets can be written to the network, and encrypted
+       if necessary, with a single call to the socket's 'sendall' method.
+
+       Packets are written into this object by 'append', or by giving it as
+       the 'socket' argument of 'Packet.write'. It should be flushed when
+       'full' becomes true, and otherwise at the end of each batch, e.g. once
+       per iteration of the networking loop.
+
+       If an 'executor' is given, packets whose payloads are larger than
+       'offload_size' and are to be compressed are compressed by it, so that
+       the calling thread is not delayed. Until this is finished, 'flush'
+       writes only the data preceding such packets (unless 'block' is given),
+       so that the order of packets is preserved, and 'pending' is true.
+       If 'on_ready' is given, it is called (from any thread) whenever such a
+       packet has been compressed, so that 'flush' may be called again.
+
+       If 'nonblocking' is true, a 'flush' which does not block also does not
+       wait for room in the socket's send buffer. Any data which does not fit
+       is kept in 'unsent', and is sent before anything else by the next
+       'flush', which should be called once the socket is writable.
+    """
+    __slots__ = 'buffer', 'num_packets', 'max_bytes', 'max_packets', \
+                'executor', 'offload_size', 'on_ready', 'pending', \
+                'nonblocking', 'unsent', '_unsent_socket'
+
+    def __init__(self, max_bytes=65536, max_packets=300, executor=None,
+                 offload_size=65536, on_ready=None, nonblocking=False):
+        """
+        :param max_bytes: The number of buffered bytes at which 'full' becomes
+                          true, or None for no limit.
+        :param max_packets: The number of buffered packets at which 'full'
+                            becomes true, or None for no limit.
+        :param executor: A 'concurrent.futures.Executor' with which to
+                         compress large packets, or None to compress all
+                         packets in the calling thread.
+        :param offload_size: The payload size above which packets are
+                             compressed using the executor, if any.
+        :param on_ready: A function taking no arguments, to be called when a
+                         packet has been compressed by the executor.
+        :param nonblocking: Whether 'flush' may leave data in 'unsent' rather
+                            than waiting to send it, unless 'block' is given.
+        """
+        self.buffer = bytearray()
+        self.num_packets = 0
+        self.max_bytes = max_bytes
+        self.max_packets = max_packets
+        self.executor = executor
+        self.offload_size = offload_size
+        self.on_ready = on_ready
+        # The data preceding 'buffer', alternating between complete data and
+        # futures for the frames of packets being compressed by 'executor'.
+        self.pending = deque()
+        self.nonblocking = nonblocking
+        # A 'memoryview' of the data, ready to be sent to '_unsent_socket'
+        # (after any encryption), which the last 'flush' did not send.
+        self.unsent = None
+        self._unsent_socket = None
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def send(self, data):
+        self.buffer += data
+
+    def append(self, packet, compression_threshold=None, compression_level=-1):
+        if self.executor is not None and compression_threshold is not None:
+            payload = packet.get_payload()
+            if len(payload) > self.offload_size:
+                future = self.executor.submit(
+                    _render_frame, packet.write_frame, payload,
+                    compression_threshold, compression_level)
+                if self.on_ready is not None:
+                    on_ready = self.on_ready
+                    future.add_done_callback(lambda _future: on_ready())
+                self.pending.append(self.buffer)
+                self.pending.append(future)
+                # Only the packets in 'buffer' are counted by 'num_packets',
+                # so that 'full' does not remain true while this packet is
+                # being compressed.
+                self.buffer, self.num_packets = bytearray(), 0
+                return
+            packet.write_frame(self, payload, compression_threshold,
+                               compression_level)
+        else:
+            packet.write(self, compression_threshold, compression_level)
+        self.num_packets += 1
+
+    @property
+    def full(self):
+        return (self.max_bytes is not None and
+                len(self.buffer) >= self.max_bytes or
+                self.max_packets is not None and
+                self.num_packets >= self.max_packets)
+
+    def flush(self, socket, block=False):
+        """Writes all buffered data to 'socket' using one call to its 'sendall'
+           method, if there is any such data, and empties the buffer. If any
+           packets are still being compressed by the executor, only the data
+           preceding the first of these is written, unless 'block' is true, in
+           which case this waits for all of them to be compressed. If
+           'nonblocking' is true and 'block' is not, any data which cannot be
+           sent at once is kept in 'unsent', and nothing more is written until
+           it has been sent.
+        """
+        partial = self.nonblocking and not block
+        if self.unsent is not None:
+            self._send_unsent(partial)
+            if self.unsent is not None:
+                return
+        if self.pending:
+            chunks = []
+            while self.pending:
+                chunk = self.pending[0]
+                if not isinstance(chunk, (bytes, bytearray)):
+                    if not block and not chunk.done():
+                        break
+                    chunk = chunk.result()
+                chunks.append(chunk)
+                self.pending.popleft()
+            if not self.pending:
+                chunks.append(self.buffer)
+                self.buffer, self.num_packets = bytearray(), 0
+            data = bytearray().join(chunks)
+            if data:
+                self._send(socket, data, partial)
+        elif self.buffer:
+            data, self.buffer, self.num_packets = self.buffer, bytearray(), 0
+            self._send(socket, data, partial)
+
+    def _send(self, socket, data, partial):
+        # The data is no longer needed once it is sent, so, if the socket
+        # encrypts it, this may be done in place.
+        if partial:
+            # The data must be encrypted once only, even though it may be
+            # sent in parts, so it is sent to the underlying socket.
+            encrypt = getattr(socket, 'encrypt_in_place', None)
+            if encrypt is not None:
+                data, socket = encrypt(data), socket.actual_socket
+            self.unsent, self._unsent_socket = memoryview(data), socket
+            self._send_unsent(partial)
+            return
+        sendall = getattr(socket, 'sendall_in_place', None)
+        if sendall is None:
+            sendall = socket.sendall
+        sendall(data)
+
+    def _send_unsent(self, partial):
+        # Sends as much of 'unsent' as possible, or all of it if 'partial' is
+        # false, setting 'unsent' to None if no data remains.
+        if partial:
+            count = _send_nowait(self._unsent_socket, self.unsent)
+            if count < len(self.unsent):
+                self.unsent = self.unsent[count:]
+                return
+        else:
+            self._unsent_socket.sendall(self.unsent)
+        self.unsent = self._unsent_socket = None
+
+
+def _send_nowait(socket, data):
+    # Sends as much of 'data' as fits in the socket's send buffer, without
+    # blocking, and returns the number of bytes sent.
+    try:
+        if _MSG_DONTWAIT is not None:
+            return socket.send(data, _MSG_DONTWAIT)
+        timeout = socket.gettimeout()
+        socket.setblocking(False)
+        try:
+            return socket.send(data)
+        finally:
+            socket.settimeout(timeout)
+    except BlockingIOError:
+        return 0
+
+
+def _render_frame(write_frame, *args):
+    # Returns the frame written by 'write_frame' (a bound 'Packet.write_frame')
+    # with the given arguments, for use in an executor.
+    writer = FrameWriter(max_bytes=None, max_packets=None)
+    write_frame(writer, *args)
+    return writer.buffer
@@ -0,0 +1,293 @@
+"""Contains 'Multiplexer', which performs the networking of many instances of
+   'Connection' using a small, fixed number of threads.
+"""
+from collections import deque
+import selectors
+import threading
+import sys
+
+from .waker import Waker
+
+
+class Multiplexer(object):
+    """Performs the networking of any number of instances of 'Connection' using
+    a fixed number of threads, each of which waits for many sockets at once
+    using a 'selectors.DefaultSelector' (for example, epoll on Linux), instead
+    of each connection having a networking thread of its own.
+
+    To use, give an instance of this class as the 'multiplexer' argument of
+    the 'Connection' constructor. Each connection is then assigned to one of
+    the threads whenever it connects. Packet listeners, reactors and exception
+    handlers are called from that thread, so a listener which blocks will
+    delay all other connections assigned to the same thread.
+
+    The threads never wait for room in a socket's send buffer: if a server
+    is not reading the data sent to it, the rest is sent once the socket is
+    writable, and meanwhile packets written to the connection wait in its
+    queue. (A 'write_packet' with 'force', or a 'disconnect', still waits
+    until all of the connection's data has been sent.)
+
+    The threads are daemon threads, started when they are first needed, and
+    stopped by calling 'close'.
+    """
+
+    def __init__(self, num_threads=1):
+        """
+        :param num_threads: The number of threads among which connections are
+                            distributed.
+        """
+        self._lock = threading.Lock()
+        self._threads = [MultiplexerThread(self, 'Multiplexer Thread %d' % i)
+                         for i in range(num_threads)]
+
+    def _register(self, connection):
+        # Begin performing the networking of a newly-connected 'connection',
+        # returning an object which takes the place of its networking thread.
+        with self._lock:
+            thread = min(self._threads, key=len)
+            task = NetworkingTask(connection, thread)
+            thread.add(task)
+            if not thread.is_alive():
+                thread.start()
+            return task
+
+    def close(self):
+        """Stops all threads once their current iteration finishes. Any
+        connections still assigned to them are not disconnected, but will no
+        longer be serviced.
+        """
+        with self._lock:
+            for thread in self._threads:
+                thread.stop()
+
+
+class NetworkingTask(object):
+    """Takes the place of 'NetworkingThread' for a connection whose networking
+    is performed by a 'Multiplexer'. It may be accessed as the connection's
+    'networking_thread' attribute, and supports the 'is_alive' and 'join'
+    methods of a thread.
+    """
+    __slots__ = 'connection', 'thread', 'fileno', 'interrupt', 'failed', \
+                'write_exc_info', 'finished', 'events'
+
+    def __init__(self, connection, thread):
+        self.connection = connection
+        self.thread = thread
+        self.fileno = connection.socket.fileno()
+        self.interrupt = False
+        self.failed = False
+        self.write_exc_info = None
+        self.finished = threading.Event()
+        # The events for which the thread's selector waits on the socket.
+        self.events = selectors.EVENT_READ
+
+    @property
+    def name(self):
+        return self.thread.name
+
+    def is_alive(self):
+        return not self.finished.is_set()
+
+    def join(self, timeout=None):
+        self.finished.wait(timeout)
+
+    def wake(self):
+        # Causes the thread to write this task's queued packets, waking it if
+        # it is waiting for incoming packets.
+        self.thread.wake(self)
+
+    def is_current(self):
+        return threading.current_thread() is self.thread
+
+    @property
+    def blocked(self):
+        # Whether data remains to be sent once the socket becomes writable.
+        return self.connection._frame_writer.unsent is not None
+
+    def write(self):
+        # Attempts to write out as many as 300 packets in a batch, returning
+        # True if any packets remain to be written and the socket has room for
+        # them. Packets being compressed by an executor wake the thread when
+        # they are ready to be written.
+        connection = self.connection
+        with connection._write_lock:
+            try:
+                num_packets = 0
+                while not self.interrupt and not self.blocked and \
+                        connection._pop_packet():
+                    num_packets += 1
+                    if num_packets >= 300:
+                        break
+                connection._flush(block=False)
+            except IOError:
+                self.write_exc_info = sys.exc_info()
+            return not self.blocked and \
+                bool(connection._outgoing_packet_queue)
+
+    def read(self):
+        # Reads all immediately available data, and reacts to each complete
+        # packet it contains.
+        connection = self.connection
+        reader = connection._frame_reader
+        reader.fill(connection.file_object)
+        while not self.interrupt:
+            frame = reader.next_frame()
+            if frame is None:
+                break
+            packet = connection.reactor.parse_packet(frame)
+            connection._react(packet)
+
+            # Ignore any earlier exception from writing if a disconnect packet
+            # is received, as it may have been caused by trying to write to
+            # the closed socket, which does not represent a program error.
+            if packet.packet_name == 'disconnect':
+                self.write_exc_info = None
+            connection._recycle(packet)
+
+    def raise_write_error(self):
+        exc_info, self.write_exc_info = self.write_exc_info, None
+        if exc_info is not None:
+            exc_value, exc_tb = exc_info[1:]
+            raise exc_value.with_traceback(exc_tb)
+
+
+class MultiplexerThread(threading.Thread):
+    """One of the threads of a 'Multiplexer', which services a set of
+    'NetworkingTask's using a single selector.
+    """
+
+    # The maximum time in seconds for which to wait for incoming packets when
+    # there are none to be written. The thread is woken earlier by 'wake'.
+    idle_timeout = 0.05
+
+    def __init__(self, multiplexer, name):
+        threading.Thread.__init__(self)
+        self.name = name
+        self.daemon = True
+        self.multiplexer = multiplexer
+        self.selector = selectors.DefaultSelector()
+        self.tasks = set()
+        self.stopping = False
+
+        # New tasks are passed to this thread through 'pending', and tasks
+        # which may have packets to be written through 'writable', so that
+        # only these are written to in each iteration. The thread is woken
+        # from 'select' by 'waker' when either is added to.
+        self.pending = deque()
+        self.writable = deque()
+        self.waker = Waker()
+        self.selector.register(self.waker, selectors.EVENT_READ)
+
+    def __len__(self):
+        return len(self.tasks) + len(self.pending)
+
+    def add(self, task):
+        self.pending.append(task)
+        self.wake()
+
+    def stop(self):
+        self.stopping = True
+        self.wake()
+
+    def wake(self, task=None):
+        if task is not None:
+            self.writable.append(task)
+        self.waker.wake()
+
+    def run(self):
+        try:
+            while not self.stopping:
+                self._run_once()
+        finally:
+            self.selector.close()
+            self.waker.close()
+
+    def _run_once(self):
+        self.waker.clear()
+        for task in [task for task in self.tasks if task.interrupt]:
+            self._remove(task)
+        while self.pending:
+            task = self.pending.popleft()
+            self.tasks.add(task)
+            self.selector.register(task.fileno, selectors.EVENT_READ, task)
+            # Write any packets queued before the task was registered.
+            self.writable.append(task)
+
+        # If any packets remain to be written, resume writing as soon as
+        # possible after reading any available packets; otherwise, wait for new
+        # packets to arrive until the thread is woken.
+        timeout = self.idle_timeout
+        writable = set()
+        while self.writable:
+            writable.add(self.writable.popleft())
+        for task in writable:
+            if self._call(task, task.write):
+                self.writable.append(task)
+                timeout = 0
+            self._update_events(task)
+
+        for key, events in self.selector.select(timeout):
+            task = key.data
+            if task is None:
+                continue
+            if events & selectors.EVENT_WRITE:
+                self.writable.append(task)
+            if events & selectors.EVENT_READ:
+                self._call(task, task.read)
+
+        for task in writable:
+            if task.write_exc_info is not None:
+                self._call(task, task.raise_write_error)
+
+    def _update_events(self, task):
+        # Waits for room in the task's socket's send buffer only while there
+        # is data which did not fit in it.
+        if task.interrupt:
+            return
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE \
+            if task.blocked else selectors.EVENT_READ
+        if events != task.events:
+            try:
+                self.selector.modify(task.fileno, events, task)
+            except (KeyError, ValueError, OSError):
+                # The socket has been closed, so the task will be removed.
+                return
+            task.events = events
+
+    def _call(self, task, method):
+        # Calls 'method' of 'task', passing any exception to its connection,
+        # as 'NetworkingThread' would.
+        if task.interrupt:
+            return None
+        try:
+            return method()
+        except Exception as e:
+            task.interrupt = task.failed = True
+            try:
+                task.connection._handle_exception(e, sys.exc_info())
+            except Exception:
+                # The exception would have terminated a networking thread, so
+                # report it in the same way, but without stopping this thread.
+                sys.excepthook(*sys.exc_info())
+
+    def _remove(self, task):
+        try:
+            self.selector.unregister(task.fileno)
+        except (KeyError, ValueError):
+            pass
+        self.tasks.discard(task)
+
+        connection = task.connection
+        try:
+            if not task.failed:
+                connection._handle_exit()
+        except Exception as e:
+            try:
+                connection._handle_exception(e, sys.exc_info())
+            except Exception:
+                sys.excepthook(*sys.exc_info())
+        finally:
+            with connection._write_lock:
+                if connection.networking_thread is task:
+                    connection.networking_thread = None
+            task.finished.set()
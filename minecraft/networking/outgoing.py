@@ -0,0 +1,161 @@
+"""Contains 'OutgoingQueue', a bounded queue of outgoing packets which sends
+   urgent packets first and replaces superseded packets.
+"""
+from collections import deque
+import threading
+
+from ..exceptions import OutgoingQueueFull
+
+__all__ = 'OutgoingQueue', 'OVERFLOW_POLICIES'
+
+# The possible values of 'OutgoingQueue.overflow'.
+OVERFLOW_POLICIES = 'block', 'drop_oldest', 'raise'
+
+
+class OutgoingQueue(object):
+    """A queue of packets waiting to be written by a 'Connection', supporting
+       the 'append', 'popleft', 'len' and truth value operations of the
+       'collections.deque' otherwise used, which may be performed from any
+       thread.
+
+       If 'max_size' is not None, at most that many packets are kept in the
+       queue, and 'overflow' determines what happens when a packet is
+       appended to a full queue:
+
+       'block': wait until a packet is removed from the queue, unless
+       'may_block' is given and returns False (as it does in the thread which
+       removes packets from the queue), in which case the packet is appended
+       anyway, exceeding the capacity.
+
+       'drop_oldest': discard the packet which has been waiting longest among
+       those of the lowest priority, including the new packet, and increment
+       'dropped'.
+
+       'raise': raise 'minecraft.exceptions.OutgoingQueueFull'.
+
+       If 'prioritize' is True, packets are removed in decreasing order of the
+       'priority' attributes of their classes, and otherwise in the order in
+       which they were appended; and a packet whose 'coalescing_key' is equal
+       to that of a packet still waiting in the queue takes the place of the
+       earlier packet, which is discarded, rather than being appended.
+    """
+    __slots__ = 'max_size', 'overflow', 'prioritize', 'may_block', \
+                'dropped', '_levels', '_priorities', '_latest', '_size', \
+                '_lock', '_not_full', '_waiters', '_closed'
+
+    def __init__(self, max_size=None, overflow='block', prioritize=False,
+                 may_block=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown overflow policy: %r.' % (overflow,))
+        if max_size is not None and max_size < 1:
+            raise ValueError('The maximum size must be positive.')
+        self.max_size = max_size
+        self.overflow = overflow
+        self.prioritize = prioritize
+        self.may_block = may_block
+        self.dropped = 0
+        # A deque of packets for each priority, and the priorities in
+        # decreasing order.
+        self._levels = {0: deque()}
+        self._priorities = [0]
+        # Maps the coalescing key of each packet in the queue to the packet
+        # to be written in its place.
+        self._latest = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._waiters = 0
+        self._closed = False
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def append(self, packet):
+        with self._lock:
+            while True:
+                key = packet.coalescing_key if self.prioritize else None
+                if key is not None and key in self._latest:
+                    self._latest[key] = packet
+                    return
+                if self.max_size is None or self._size < self.max_size:
+                    break
+                action = self._overflow(packet)
+                if action is not None:
+                    if not action:
+                        return
+                    break
+
+            priority = packet.priority if self.prioritize else 0
+            level = self._levels.get(priority)
+            if level is None:
+                level = self._levels[priority] = deque()
+                self._priorities = sorted(self._levels, reverse=True)
+            level.append(packet)
+            self._size += 1
+            if key is not None:
+                self._latest[key] = packet
+
+    def _overflow(self, packet):
+        # Called with the lock held when 'packet' is to be appended to the full
+        # queue. Returns True if the packet is to be appended, False if it is
+        # to be discarded, or None if the queue is to be checked again.
+        if self.overflow == 'raise':
+            raise OutgoingQueueFull(
+                'The queue of outgoing packets is full (%d packets).'
+                % self._size)
+
+        elif self.overflow == 'block':
+            if self._closed or \
+               self.may_block is not None and not self.may_block():
+                return True
+            self._waiters += 1
+            try:
+                self._not_full.wait()
+            finally:
+                self._waiters -= 1
+            return None
+
+        else:
+            priority = packet.priority if self.prioritize else 0
+            for lowest in reversed(self._priorities):
+                level = self._levels[lowest]
+                if level:
+                    break
+            self.dropped += 1
+            if lowest > priority:
+                return False
+            dropped = level.popleft()
+            if self.prioritize and dropped.coalescing_key is not None:
+                del self._latest[dropped.coalescing_key]
+            self._size -= 1
+            return True
+
+    def popleft(self):
+        with self._lock:
+            for priority in self._priorities:
+                level = self._levels[priority]
+                if level:
+                    break
+            else:
+                raise IndexError('pop from an empty queue')
+            packet = level.popleft()
+            self._size -= 1
+            if self._latest:
+                key = packet.coalescing_key
+                if key is not None:
+                    packet = self._latest.pop(key, packet)
+            if self._waiters:
+                self._not_full.notify()
+            return packet
+
+    def close(self):
+        """Causes any threads waiting for room in the queue, and any which
+           would do so later, to append their packets at once. This is called
+           when the connection is closed, after which the queue is not used.
+        """
+        with self._lock:
+            self._closed = True
+            self._not_full.notify_all()
@@ -0,0 +1,143 @@
+"""Contains 'PacketQueue', through which incoming packets may be consumed by
+   other threads than the networking thread.
+"""
+from collections import deque
+import threading
+
+from .packets import Packet, PacketListener
+
+__all__ = 'PacketQueue', 'OVERFLOW_POLICIES'
+
+# The possible values of 'PacketQueue.overflow'.
+OVERFLOW_POLICIES = 'drop_oldest', 'drop_newest', 'block'
+
+
+class PacketQueue(PacketListener):
+    """A bounded queue of incoming packets, created by 'Connection.packets',
+       from which packets of the selected types may be taken, in the order in
+       which they were received, by any thread. The packets are added by the
+       networking thread after the built-in reaction to them, like a regular
+       packet listener, so only packets of the selected types are ever
+       queued, and other packets are not decoded on its account when the
+       connection uses lazy decoding. Packets taken from the packet pool are
+       retained, so they may be kept indefinitely.
+
+       Iterating over the queue yields its packets as they arrive, waiting
+       for up to 'timeout' seconds (or indefinitely, if it is None) for each
+       packet, until the queue is closed and empty. The queue is closed when
+       'close' is called, when it is used as a context manager and the
+       'with' block is exited, or when the connection terminates.
+
+       If 'maxsize' is not None, at most that many packets are kept in the
+       queue, and 'overflow' determines what happens when a packet arrives
+       while the queue is full: 'drop_oldest' discards the packet that has
+       been waiting longest, 'drop_newest' discards the packet that arrived,
+       and 'block' causes the networking thread to wait until there is room
+       in the queue, which also delays the handling of all later packets,
+       including keep-alives. 'dropped' counts the discarded packets.
+    """
+    def __init__(self, connection, *packet_types, **kwds):
+        self.maxsize = kwds.pop('maxsize', 1024)
+        self.overflow = kwds.pop('overflow', 'drop_oldest')
+        self.timeout = kwds.pop('timeout', None)
+        if kwds:
+            raise TypeError('Unexpected keyword arguments: %s.'
+                            % ', '.join(sorted(kwds)))
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown overflow policy: %r.' % (self.overflow,))
+        if self.maxsize is not None and self.maxsize < 1:
+            raise ValueError('The maximum size must be positive.')
+
+        super(PacketQueue, self).__init__(
+            self.put, *(packet_types or (Packet,)))
+        self.connection = connection
+        self.dropped = 0
+        self._packets = deque()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def put(self, packet):
+        # Called by the networking thread with each packet of a selected type.
+        with self._lock:
+            if self._closed:
+                return
+            packets = self._packets
+            if self.maxsize is not None and len(packets) >= self.maxsize:
+                if self.overflow == 'drop_newest':
+                    self.dropped += 1
+                    return
+                elif self.overflow == 'drop_oldest':
+                    packets.popleft()
+                    self.dropped += 1
+                else:
+                    while len(packets) >= self.maxsize and not self._closed:
+                        self._not_full.wait()
+                    if self._closed:
+                        return
+            packets.append(packet.retain())
+            self._not_empty.notify()
+
+    def get(self, timeout=None):
+        """Removes and returns the oldest packet in the queue, waiting for up
+           to 'timeout' seconds (or indefinitely, if it is None) for one to
+           arrive. Returns None if there is still no packet, or if the queue
+           is closed and empty.
+        """
+        batch = self.get_batch(1, timeout)
+        return batch[0] if batch else None
+
+    def get_batch(self, max_count=None, timeout=None):
+        """Removes and returns a list of the oldest packets in the queue, up to
+           'max_count' of them, if it is not None. If the queue is empty,
+           waits as 'get' for at least one packet to arrive, and returns an
+           empty list if none does.
+        """
+        with self._lock:
+            packets = self._packets
+            if not packets and not self._closed:
+                self._not_empty.wait_for(
+                    lambda: packets or self._closed, timeout)
+            count = len(packets)
+            if max_count is not None and max_count < count:
+                count = max_count
+            batch = [packets.popleft() for _ in range(count)]
+            if batch:
+                self._not_full.notify()
+            return batch
+
+    def close(self):
+        """Stops adding packets to the queue, and wakes any threads waiting for
+           them. Packets already in the queue may still be taken from it.
+        """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        try:
+            self.connection.packet_listeners.remove(self)
+        except ValueError:
+            pass
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        return len(self._packets)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        packet = self.get(self.timeout)
+        if packet is None:
+            raise StopIteration
+        return packet
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
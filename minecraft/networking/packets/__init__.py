@@ -10,10 +10,13 @@ packets.serverbound.* instead.
 
 # Packet-Related Utilities
 from .packet_buffer import PacketBuffer
-from .packet_listener import PacketListener
+from .packet_listener import (
+    PacketListener, ExecutorPacketListener, PacketListenerList
+)
+from . import registry
 
 # Abstract Packet Classes
-from .packet import Packet
+from .packet import Packet, PacketPool
 from .keep_alive_packet import AbstractKeepAlivePacket
 from .plugin_message_packet import AbstractPluginMessagePacket
 
@@ -95,6 +95,8 @@ class KeepAlivePacket(AbstractKeepAlivePacket):
                0x1F if context.protocol_later_eq(107) else \
                0x00
 
+    poolable = True
+
 
 class ServerDifficultyPacket(Packet):
     @staticmethod
@@ -231,6 +233,7 @@ class EntityVelocityPacket(Packet):
                0x12
 
     packet_name = 'entity velocity'
+    poolable = True
     get_definition = staticmethod(lambda context: [
         {'entity_id': VarInt},
         {'velocity_x': Short},
@@ -254,6 +257,7 @@ class EntityPositionDeltaPacket(Packet):
                0x15
 
     packet_name = "entity position delta"
+    poolable = True
 
     @staticmethod
     def get_definition(context):
@@ -299,6 +303,7 @@ class TimeUpdatePacket(Packet):
                0x03
 
     packet_name = "time update"
+    poolable = True
     get_definition = staticmethod(lambda context: [
         {'world_age': Long},
         {'time_of_day': Long},
@@ -387,6 +392,7 @@ class EntityLookPacket(Packet):
                0x16
 
     packet_name = 'entity look'
+    poolable = True
     definition = [
         {'entity_id': VarInt},
         {'yaw': Angle},
@@ -23,6 +23,7 @@ class BlockChangePacket(Packet):
         {'location': Position},
         {'block_state_id': VarInt}]
     block_state_id = 0
+    lazy_read = False
 
     # For protocols before 347: an accessor for (block_state_id >> 4).
     @property
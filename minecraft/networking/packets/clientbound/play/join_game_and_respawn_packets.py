@@ -3,7 +3,7 @@ import pynbt
 from minecraft.networking.packets import Packet
 from minecraft.networking.types import (
     NBT, Integer, Boolean, UnsignedByte, String, Byte, Long, VarInt,
-    PrefixedArray, Difficulty, GameMode, Dimension,
+    PrefixedArray, Difficulty, GameMode, Dimension, LazyNBT,
 )
 
 
@@ -35,7 +35,7 @@ def nbt_to_snbt(tag):
     if isinstance(tag, pynbt.TAG_List):
         return '[' + ','.join(map(nbt_to_snbt, tag.value)) + ']'
 
-    if isinstance(tag, pynbt.TAG_Compound):
+    if isinstance(tag, (pynbt.TAG_Compound, LazyNBT)):
         return '{' + ','.join(n + ':' + nbt_to_snbt(v)
                               for (n, v) in tag.items()) + '}'
 
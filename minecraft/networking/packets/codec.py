@@ -0,0 +1,128 @@
+"""Contains 'PacketCodec', which compiles a packet definition into specialised
+   functions for reading and writing the fields of a packet.
+"""
+import inspect
+import keyword
+import struct
+
+from minecraft.networking.types import Type
+from minecraft.networking.types.basic import fixed_struct_format
+
+
+class PacketCodec(object):
+    """Reads and writes the fields of a packet according to a 'definition',
+       as 'Packet.read' and 'Packet.write_fields' do, but using functions
+       generated once from that definition, which access each field and
+       call the 'read' or 'send' method of each type directly, rather than
+       iterating over the definition for every packet.
+
+       The type methods are bound when the codec is created, so that no
+       bound method objects are created when the codec is used.
+
+       If 'fuse_structs' is true, each run of consecutive fields whose types
+       have a 'struct_format' is instead read or written all at once using a
+       single 'struct.Struct', which is unpacked directly from the underlying
+       buffer if the file object has a 'read_struct' method.
+    """
+    __slots__ = 'definition', 'read', 'write'
+
+    # Whether consecutive fixed-size fields are read and written together.
+    # 'Packet.clear_codec_cache' must be called after changing this, for the
+    # change to affect packet classes that have already been used.
+    fuse_structs = True
+
+    def __init__(self, definition):
+        """
+        :param definition: A list of dicts mapping field names to types, as
+                           in the 'definition' attribute of a packet.
+        """
+        self.definition = definition
+        namespace = {'read_struct': read_struct}
+        read_lines, write_lines = [], []
+        run = []  # The current run of consecutive fixed-size fields.
+
+        fields = [(name, data_type) for field in definition
+                  for name, data_type in field.items()]
+        for index, (name, data_type) in enumerate(fields):
+            if name.isidentifier() and not keyword.iskeyword(name):
+                get_field = 'packet.%s' % name
+                set_field = 'packet.%s = %%s' % name
+            else:
+                # The field cannot be accessed with the attribute syntax.
+                namespace['name_%d' % index] = name
+                get_field = 'getattr(packet, name_%d)' % index
+                set_field = 'setattr(packet, name_%d, %%s)' % index
+
+            if self.fuse_structs and \
+               fixed_struct_format(data_type) is not None:
+                run.append((index, data_type, get_field, set_field))
+                continue
+            if run:
+                self._fuse(run, namespace, read_lines, write_lines)
+                run = []
+
+            read, read_context = _bind_type_method(
+                data_type, 'read', 'read_with_context')
+            send, send_context = _bind_type_method(
+                data_type, 'send', 'send_with_context')
+            namespace['read_%d' % index] = read
+            namespace['send_%d' % index] = send
+            read_lines.append(set_field % (
+                'read_%d(file_object%s)' % (index, read_context)))
+            write_lines.append('send_%d(%s, packet_buffer%s)' % (
+                index, get_field, send_context))
+        if run:
+            self._fuse(run, namespace, read_lines, write_lines)
+
+        source = (
+            'def read(packet, file_object, context):\n    %s\n'
+            'def write(packet, packet_buffer, context):\n    %s\n'
+        ) % ('\n    '.join(read_lines) or 'pass',
+             '\n    '.join(write_lines) or 'pass')
+        exec(compile(source, '<packet codec>', 'exec'), namespace)
+        self.read = namespace['read']
+        self.write = namespace['write']
+
+    @staticmethod
+    def _fuse(run, namespace, read_lines, write_lines):
+        # Generates the code to read and write the given run of fields, which
+        # are consecutive and of fixed size, using a single 'struct.Struct'.
+        first = run[0][0]
+        namespace['struct_%d' % first] = struct.Struct('>' + ''.join(
+            data_type.struct_format for _, data_type, _, _ in run))
+        read_lines.append('%s, = read_struct(file_object, struct_%d)' % (
+            ', '.join('value_%d' % index for index, _, _, _ in run), first))
+
+        values = []
+        for index, data_type, get_field, set_field in run:
+            if data_type.from_struct is None:
+                read_lines.append(set_field % ('value_%d' % index))
+                values.append(get_field)
+            else:
+                namespace['from_%d' % index] = data_type.from_struct
+                namespace['to_%d' % index] = data_type.to_struct
+                read_lines.append(set_field % ('from_%d(value_%d)' % (
+                    index, index)))
+                values.append('to_%d(%s)' % (index, get_field))
+        write_lines.append('packet_buffer.send(struct_%d.pack(%s))' % (
+            first, ', '.join(values)))
+
+
+def read_struct(file_object, struct):
+    """Reads and unpacks the data for 'struct' from 'file_object', without
+       copying it if 'file_object' has a 'read_struct' method.
+    """
+    method = getattr(file_object, 'read_struct', None)
+    if method is not None:
+        return method(struct)
+    return struct.unpack(file_object.read(struct.size))
+
+
+def _bind_type_method(data_type, method, context_method):
+    # Returns the method of 'data_type' to be called by generated code, and
+    # the source of its final argument, preferring the method that does not
+    # take a context if the type has not overridden the one that does.
+    if inspect.getattr_static(data_type, context_method, None) \
+            is Type.__dict__[context_method]:
+        return getattr(data_type, method), ''
+    return getattr(data_type, context_method), ', context'
@@ -1,6 +1,12 @@
+import copy
+import inspect
+import keyword
 from zlib import compress
 
 from .packet_buffer import PacketBuffer
+from .codec import PacketCodec
+from .registry import get_packet_id
+from ..framing import FrameBuffer
 from minecraft.networking.types import (
     VarInt, Enum, overridable_property,
 )
@@ -16,13 +22,16 @@ class Packet(object):
     #     has changed across protocol versions, for example; or
     #  3. Define the attribute `id' in an instance of a class without either
     #     of the above.
+    # The result of `get_id' must depend only on the class and the protocol
+    # version, as it is cached (see `minecraft.networking.packets.registry').
     @classmethod
     def get_id(cls, _context):
         return getattr(cls, 'id')
 
     @overridable_property
     def id(self):
-        return None if self.context is None else self.get_id(self.context)
+        return None if self.context is None else \
+               get_packet_id(type(self), self.context)
 
     # To define the network data layout of a packet, either:
     #  1. Define the attribute `definition', a list of fields, each of which
@@ -42,6 +51,85 @@ class Packet(object):
         return None if self.context is None else \
                self.get_definition(self.context)
 
+    # The fields of a packet are read and written using a 'PacketCodec'
+    # compiled from its definition, which is cached for each class and protocol
+    # version, unless 'definition' has been overridden in the instance, or
+    # by something other than a list in a subclass.
+    @classmethod
+    def get_codec(cls, context):
+        key = cls, context.protocol_version
+        codec = _codec_cache.get(key)
+        if codec is None and key not in _codec_cache:
+            definition = inspect.getattr_static(cls, 'definition', None)
+            if definition is Packet.__dict__['definition'] and \
+               inspect.getattr_static(cls, 'get_definition') \
+                    is not Packet.__dict__['get_definition']:
+                definition = cls.get_definition(context)
+            if isinstance(definition, list):
+                codec = PacketCodec(definition)
+            codec = _codec_cache.setdefault(key, codec)
+        return codec
+
+    @staticmethod
+    def clear_codec_cache():
+        """ Discards all cached codecs and compact classes. This is necessary
+            if the definition of a packet class is changed after any packets
+            of that class have been read or written.
+        """
+        _codec_cache.clear()
+        _compact_classes.clear()
+
+    def _codec(self):
+        if self.context is None or 'definition' in self.__dict__:
+            return None
+        return self.get_codec(self.context)
+
+    # A packet class may be made more compact by 'compact_class', which derives
+    # a subclass storing the fields of its definition in '__slots__'.
+    @classmethod
+    def compact_class(cls, context):
+        """ Returns a subclass of this class with the same name, whose
+            instances keep their 'context', and each field given by the
+            definition for 'context', in '__slots__' rather than in a
+            '__dict__', so that they use less memory and are faster to create.
+            Other attributes may still be set, and are kept in a '__dict__'
+            created when the first such attribute is set. However, 'definition'
+            must not be overridden in instances of such a class.
+
+            If the definition cannot be determined without an instance, or if
+            this class is already compact, returns this class itself.
+        """
+        key = cls, context.protocol_version
+        compact = _compact_classes.get(key)
+        if compact is None:
+            codec = cls.get_codec(context)
+            if codec is None or '_compact_base' in cls.__dict__:
+                compact = cls
+            else:
+                names = ['context', '_payload']
+                for field in codec.definition:
+                    for name in field:
+                        if name.isidentifier() \
+                           and not keyword.iskeyword(name) \
+                           and name not in names \
+                           and inspect.getattr_static(cls, name, None) is None:
+                            names.append(name)
+                compact = type(cls)(cls.__name__, (cls,), {
+                    '__slots__': tuple(names),
+                    '__module__': cls.__module__,
+                    '__qualname__': cls.__qualname__,
+                    '_compact_base': cls,
+                    '_codec': Packet._compact_codec,
+                    '_take_payload': Packet._take_slot_payload,
+                })
+            compact = _compact_classes.setdefault(key, compact)
+        return compact
+
+    def _compact_codec(self):
+        # As '_codec', for compact classes, which do not check for an
+        # overridden 'definition', as this would create a '__dict__'.
+        return None if self.context is None else self.get_codec(self.context)
+
     # In general, a packet instance must have its 'context' attribute set to an
     # instance of 'ConnectionContext', for example to decide on version-
     # dependent behaviour. This can either be given as an argument to this
@@ -63,54 +151,143 @@ class Packet(object):
             setattr(self, key, value)
         return self
 
+    # If True, a packet of this class that is received by a 'Connection' with
+    # 'lazy_decoding' enabled may have its fields read only when one of them is
+    # first accessed. This must be False in classes that give default values
+    # of fields as class attributes, as these would be accessed instead.
+    lazy_read = True
+
+    def read_lazily(self, payload):
+        """ Arranges for the packet's fields to be read from 'payload', a
+            bytes-like object which must not be modified afterwards, when any
+            attribute of the packet that is not otherwise present is accessed.
+        """
+        self._payload = payload
+
+    def __getattr__(self, name):
+        # This is only called when 'name' is not found by the usual means.
+        payload = None if name.startswith('__') or name == '_payload' else \
+            self._take_payload()
+        if payload is None:
+            raise AttributeError("'%s' object has no attribute '%s'"
+                                 % (type(self).__name__, name))
+        self.read(FrameBuffer(payload))
+        return getattr(self, name)
+
+    def _take_payload(self):
+        # Removes and returns the payload given to 'read_lazily', or None.
+        return self.__dict__.pop('_payload', None)
+
+    def _take_slot_payload(self):
+        # As '_take_payload', for compact classes.
+        try:
+            payload = self._payload
+        except AttributeError:
+            return None
+        del self._payload
+        return payload
+
     def read(self, file_object):
+        codec = self._codec()
+        if codec is not None:
+            return codec.read(self, file_object, self.context)
         for field in self.definition:  # pylint: disable=not-an-iterable
             for var_name, data_type in field.items():
                 value = data_type.read_with_context(file_object, self.context)
                 setattr(self, var_name, value)
 
-    # Writes a packet buffer to the socket with the appropriate headers
-    # and compressing the data if necessary
-    def _write_buffer(self, socket, packet_buffer, compression_threshold):
+    # If False, packets of this class are never compressed, even if their size
+    # exceeds the compression threshold. This may be useful for packets whose
+    # fields consist mostly of data which is already compressed, or random.
+    # (Servers accept uncompressed packets of any size, but reject compressed
+    # packets whose size is below the threshold.)
+    compressible = True
+
+    def write_frame(self, socket, payload, compression_threshold=None,
+                    compression_level=-1):
+        """ Writes the given payload, as returned by 'get_payload', to the
+            socket with the appropriate headers, compressing it if necessary.
+            This method does not access any attributes of the packet other
+            than 'compressible', so it may be called from any thread.
+        """
+        # The length prefixes are written with a single call to 'send'.
+        header = bytearray()
         # compression_threshold of None means compression is disabled
-        if compression_threshold is not None:
-            if len(packet_buffer.get_writable()) > compression_threshold != -1:
-                # compress the current payload
-                packet_data = packet_buffer.get_writable()
-                compressed_data = compress(packet_data)
-                packet_buffer.reset()
-                # write out the length of the uncompressed payload
-                VarInt.send(len(packet_data), packet_buffer)
-                # write the compressed payload itself
-                packet_buffer.send(compressed_data)
-            else:
-                # write out a 0 to indicate uncompressed data
-                packet_data = packet_buffer.get_writable()
-                packet_buffer.reset()
-                VarInt.send(0, packet_buffer)
-                packet_buffer.send(packet_data)
-
-        VarInt.send(len(packet_buffer.get_writable()), socket)  # Packet Size
-        socket.send(packet_buffer.get_writable())  # Packet Payload
-
-    def write(self, socket, compression_threshold=None):
-        # buffer the data since we need to know the length of each packet's
-        # payload
+        if compression_threshold is None:
+            VarInt.encode_into(header, len(payload))  # Packet Size
+        elif len(payload) > compression_threshold != -1 and self.compressible:
+            compressed_payload = compress(payload, compression_level)
+            # write out the packet size, the length of the uncompressed
+            # payload, and the compressed payload itself
+            VarInt.encode_many(header, (
+                VarInt.size(len(payload)) + len(compressed_payload),
+                len(payload)))
+            payload = compressed_payload
+        else:
+            # write out a 0 to indicate uncompressed data
+            VarInt.encode_many(header, (len(payload) + 1, 0))
+        socket.send(header)
+        socket.send(payload)  # Packet Payload
+
+    def get_payload(self):
+        """ Returns the packet's ID followed by its fields, as a bytes object,
+            excluding the length, compression and encryption.
+        """
         packet_buffer = PacketBuffer()
         # write packet's id right off the bat in the header
         VarInt.send(self.id, packet_buffer)
         # write every individual field
         self.write_fields(packet_buffer)
-        self._write_buffer(socket, packet_buffer, compression_threshold)
+        return packet_buffer.get_writable()
+
+    def write(self, socket, compression_threshold=None, compression_level=-1):
+        self.write_frame(socket, self.get_payload(), compression_threshold,
+                         compression_level)
 
     def write_fields(self, packet_buffer):
         # Write the fields comprising the body of the packet (excluding the
         # length, packet ID, compression and encryption) into a PacketBuffer.
+        codec = self._codec()
+        if codec is not None:
+            return codec.write(self, packet_buffer, self.context)
         for field in self.definition:  # pylint: disable=not-an-iterable
             for var_name, data_type in field.items():
                 data = getattr(self, var_name)
                 data_type.send_with_context(data, packet_buffer, self.context)
 
+    # If True, a 'Connection' with 'pool_packets' enabled reuses instances of
+    # this class for incoming packets, after they have been passed to all
+    # packet listeners. This must only be True in classes whose 'read' method
+    # sets every attribute that may have been set by an earlier 'read'.
+    poolable = False
+
+    # If a 'Connection' is created with 'prioritize_packets=True', outgoing
+    # packets waiting to be written are sent in decreasing order of priority,
+    # and a packet whose 'coalescing_key' is not None replaces any packet with
+    # the same key which is still waiting, taking its place in the queue.
+    priority = 0
+    coalescing_key = None
+
+    # The 'PacketPool' to which this packet is to be returned, if any.
+    _pool = None
+
+    def retain(self):
+        """ Ensures that this packet will not be reused for another incoming
+            packet, if it was taken from a 'PacketPool', so that it may be
+            kept after the packet listener to which it was given returns.
+            Returns the packet itself.
+        """
+        self._pool = None
+        return self
+
+    def copy(self):
+        """ Returns a shallow copy of this packet, which is never reused for
+            another incoming packet.
+        """
+        packet = copy.copy(self)
+        packet._pool = None
+        return packet
+
     def __repr__(self):
         str = type(self).__name__
         if self.id is not None:
@@ -154,3 +331,47 @@ class Packet(object):
             enum_class = getattr(cls, enum_name)
             if isinstance(enum_class, type) and issubclass(enum_class, Enum):
                 return enum_class
+
+
+# Maps (packet class, protocol version) to the 'PacketCodec' for that class, or
+# to None if the class's definition cannot be compiled.
+_codec_cache = {}
+
+# Maps (packet class, protocol version) to the result of 'compact_class'.
+_compact_classes = {}
+
+
+class PacketPool(object):
+    """ Keeps instances of packet classes whose 'poolable' attribute is True,
+        once they are no longer needed, so that they can be reused for later
+        incoming packets instead of creating new instances. A pool may only be
+        used by one thread at a time.
+    """
+    __slots__ = 'max_size', '_free'
+
+    def __init__(self, max_size=16):
+        """
+        :param max_size: The maximum number of unused instances of each class
+                         to keep.
+        """
+        self.max_size = max_size
+        self._free = {}
+
+    def get(self, packet_class):
+        """ Returns an unused instance of 'packet_class', which is to be given
+            to 'release' when it is no longer needed, unless it is retained.
+        """
+        free = self._free.get(packet_class)
+        packet = free.pop() if free else packet_class()
+        packet._pool = self
+        return packet
+
+    def release(self, packet):
+        """ Makes 'packet' available for reuse, if it was taken from this pool
+            and has not been retained.
+        """
+        if packet._pool is self:
+            packet._pool = None
+            free = self._free.setdefault(type(packet), [])
+            if len(free) < self.max_size:
+                free.append(packet)
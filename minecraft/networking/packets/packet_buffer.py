@@ -18,6 +18,41 @@ class PacketBuffer(object):
     def recv(self, length=None):
         return self.read(length)
 
+    def read_struct(self, struct):
+        """
+        Unpacks the given 'struct.Struct' from the buffer, directly from its
+        current position, and advances the position past it.
+        :param struct: The struct to unpack
+        """
+        position = self.bytes.tell()
+        with self.bytes.getbuffer() as view:
+            values = struct.unpack_from(view, position)
+        self.bytes.seek(position + struct.size)
+        return values
+
+    def read_direct(self, data_type):
+        """
+        Decodes a value directly from the buffer at its current position, and
+        advances the position past it.
+        :param data_type: A type with a 'read_from' method, such as VarInt
+        """
+        with self.bytes.getbuffer() as view:
+            value, position = data_type.read_from(view, self.bytes.tell())
+        self.bytes.seek(position)
+        return value
+
+    def read_varints(self, var_type, count):
+        """
+        As 'read_direct', but returns a list of the given number of values.
+        :param var_type: VarInt or VarLong
+        :param count: The number of values to read
+        """
+        with self.bytes.getbuffer() as view:
+            values, position = var_type.decode_many(
+                view, count, self.bytes.tell())
+        self.bytes.seek(position)
+        return values
+
     def reset(self):
         self.bytes = BytesIO()
 
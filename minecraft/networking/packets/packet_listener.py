@@ -1,4 +1,8 @@
+from collections import deque
+import threading
+
 from .packet import Packet
+from ...exceptions import IgnorePacket
 
 
 class PacketListener(object):
@@ -15,3 +19,149 @@ class PacketListener(object):
                 self.callback(packet)
                 return True
         return False
+
+
+class ExecutorPacketListener(PacketListener):
+    """A 'PacketListener' whose callback is called by a
+       'concurrent.futures.Executor', rather than by the thread receiving the
+       packets, so that it does not delay the handling of later packets.
+
+       Packets are passed to the executor one at a time, in the order in which
+       they were received, each once the callback has returned for the
+       previous one. At most 'max_pending' packets may wait for the callback
+       (including the one being handled); if there are more, the thread
+       receiving them waits until there is room. Packets taken from the
+       packet pool are retained. With a 'ProcessPoolExecutor', the callback
+       and the packets must be picklable, so the packets must not be created
+       with 'compact_packets'.
+
+       Raising 'IgnorePacket' from the callback has no effect, as the other
+       listeners have already been called. If it raises any other exception,
+       the packets still waiting are discarded, and the exception is raised
+       again in the receiving thread the next time a packet is given to this
+       listener.
+    """
+    def __init__(self, callback, executor, *args, **kwds):
+        self.max_pending = kwds.pop('max_pending', 1024)
+        super(ExecutorPacketListener, self).__init__(self.submit, *args)
+        self.function = callback
+        self.executor = executor
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._exc_info = None
+
+    def submit(self, packet):
+        with self._lock:
+            exc_info, self._exc_info = self._exc_info, None
+            if exc_info is not None:
+                exc_value, exc_tb = exc_info[1:]
+                raise exc_value.with_traceback(exc_tb)
+            while len(self._pending) >= self.max_pending:
+                self._not_full.wait()
+            self._pending.append(packet.retain())
+            if len(self._pending) > 1:
+                # The packet will be submitted when the previous one is done.
+                return
+        try:
+            self._submit(packet)
+        except Exception:
+            with self._lock:
+                self._pending.clear()
+                self._not_full.notify_all()
+            raise
+
+    def _submit(self, packet):
+        future = self.executor.submit(self.function, packet)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        exc = None if future.cancelled() else future.exception()
+        if exc is not None and not isinstance(exc, IgnorePacket):
+            self._fail(exc)
+            return
+        with self._lock:
+            self._pending.popleft()
+            packet = self._pending[0] if self._pending else None
+            self._not_full.notify_all()
+        if packet is not None:
+            try:
+                self._submit(packet)
+            except Exception as e:
+                # For example, if the executor has been shut down.
+                self._fail(e)
+
+    def _fail(self, exc):
+        with self._lock:
+            self._exc_info = type(exc), exc, exc.__traceback__
+            self._pending.clear()
+            self._not_full.notify_all()
+
+    def join(self, timeout=None):
+        """Waits until the callback has returned for all packets received so
+           far, or until 'timeout' seconds have passed, if it is not None.
+           Returns True if there are no more packets waiting.
+        """
+        with self._lock:
+            return self._not_full.wait_for(
+                lambda: not self._pending, timeout)
+
+
+class PacketListenerList(list):
+    """A list of 'PacketListener's, which also maintains an index from each
+       packet class to the callbacks of the listeners that would be called by
+       'call_packet' for packets of that class, so that these need not be
+       found by checking every listener for every packet.
+
+       Each entry of the index is built when it is first needed, by comparing
+       the classes in the packet class's MRO with those of each listener, and
+       the whole index is discarded whenever the list is modified.
+    """
+    __slots__ = '_index', '_generation'
+
+    def __init__(self, *args):
+        super(PacketListenerList, self).__init__(*args)
+        self._index = {}
+        self._generation = 0
+
+    def callbacks(self, packet_type):
+        """Returns a tuple of the functions to be called, in order, with each
+           packet of the given class.
+        """
+        callbacks = self._index.get(packet_type)
+        if callbacks is None:
+            generation = self._generation
+            mro = set(packet_type.__mro__)
+            callbacks, call_packet = [], PacketListener.call_packet
+            for listener in list(self):
+                if type(listener).call_packet is not call_packet:
+                    # This listener decides for itself which packets to accept.
+                    callbacks.append(listener.call_packet)
+                elif not mro.isdisjoint(listener.packets_to_listen):
+                    callbacks.append(listener.callback)
+            callbacks = tuple(callbacks)
+            # Only store the result if the list was not modified meanwhile.
+            if generation == self._generation:
+                self._index[packet_type] = callbacks
+        return callbacks
+
+    def _invalidate(self):
+        self._generation += 1
+        self._index = {}
+
+
+def _invalidating(method):
+    # Returns a version of the given method of 'list' which also discards the
+    # index of a 'PacketListenerList'.
+    def wrapper(self, *args, **kwds):
+        self._invalidate()
+        return method(self, *args, **kwds)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort',
+              'reverse', '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(PacketListenerList, _name, _invalidating(getattr(list, _name)))
+del _name
@@ -0,0 +1,50 @@
+"""Contains caches of the packet IDs of packet classes, and of the packet
+   classes of each state and direction of the protocol, for each protocol
+   version, which are shared by all connections.
+"""
+
+__all__ = 'get_packet_id', 'get_packet_classes', 'clear_packet_cache'
+
+
+# Maps (packet class, protocol version) to the packet ID given by 'get_id'.
+_packet_ids = {}
+
+# Maps (function, protocol version), where the function is one of the
+# 'get_packets' functions of a state and direction, to a dict mapping the
+# packet ID of each packet class that it returns to that class.
+_packet_classes = {}
+
+
+def get_packet_id(packet_class, context):
+    """Returns 'packet_class.get_id(context)', which is calculated only once
+       for each packet class and protocol version.
+    """
+    key = packet_class, context.protocol_version
+    try:
+        return _packet_ids[key]
+    except KeyError:
+        return _packet_ids.setdefault(key, packet_class.get_id(context))
+
+
+def get_packet_classes(get_packets, context):
+    """Returns a dict mapping the ID of each packet class in the collection
+       returned by 'get_packets(context)' to that class, which is created only
+       once for each such function and protocol version. The dict is shared,
+       so it must not be modified.
+    """
+    key = get_packets, context.protocol_version
+    try:
+        return _packet_classes[key]
+    except KeyError:
+        return _packet_classes.setdefault(key, {
+            get_packet_id(packet_class, context): packet_class
+            for packet_class in get_packets(context)})
+
+
+def clear_packet_cache():
+    """Discards all cached packet IDs and classes. This is necessary if the
+       ID of a packet class, or the packets returned by a 'get_packets'
+       function, are changed after the cache has been used.
+    """
+    _packet_ids.clear()
+    _packet_classes.clear()
@@ -50,6 +50,10 @@ class KeepAlivePacket(AbstractKeepAlivePacket):
                0x0B if context.protocol_later_eq(107) else \
                0x00
 
+    # Keep-alive responses are sent ahead of other queued packets, so that a
+    # congested connection is not timed out by the server.
+    priority = 1
+
 
 class ChatPacket(Packet):
     @staticmethod
@@ -104,6 +108,9 @@ class PositionAndLookPacket(Packet):
         {'pitch': Float},
         {'on_ground': Boolean}]
 
+    # Only the latest position and look waiting to be sent is of any use.
+    coalescing_key = 'position and look'
+
     # Access the 'x', 'feet_y', 'z' fields as a Vector tuple.
     position = multi_attribute_alias(Vector, 'x', 'feet_y', 'z')
 
@@ -125,6 +132,10 @@ class TeleportConfirmPacket(Packet):
     definition = [
         {'teleport_id': VarInt}]
 
+    # Teleports are confirmed ahead of other queued packets, as the server
+    # ignores the client's movement until then.
+    priority = 1
+
 
 class AnimationPacket(Packet):
     @staticmethod
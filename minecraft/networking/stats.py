@@ -0,0 +1,203 @@
+"""Contains 'ConnectionStats', which counts the packets and bytes exchanged by
+   a 'Connection' and the time spent handling them.
+"""
+import time
+
+from .types import VarInt
+
+
+class ConnectionStats(object):
+    """Statistics of the activity of a 'Connection', collected when it is
+       created with 'collect_stats=True' and available as its 'stats'
+       attribute. The statistics accumulate over any reconnections, until
+       'reset' is called.
+
+       The counters are updated by the networking thread (and by any thread
+       writing packets with 'force=True'), without locking, and may be read
+       from any thread, using 'snapshot' or 'to_prometheus'. Collecting them
+       costs a few dictionary operations and clock readings per packet.
+
+       The following attributes are maintained:
+
+       'packets_in', 'packets_out': dicts mapping each packet class received
+       or sent to a list of the number of such packets, their size on the
+       network (excluding the length prefix of each packet, and before
+       encryption) and their uncompressed size. Outgoing packets compressed
+       by a 'compression_executor' are counted, but their sizes are not.
+
+       'decode_time': the total time, in seconds, spent decompressing and
+       decoding incoming packets (except for those decoded lazily, which is
+       done when their fields are accessed).
+
+       'encode_time': the total time spent encoding and compressing outgoing
+       packets, once they are taken from the queue of outgoing packets.
+
+       'reactor_time', 'listener_time': the total time spent in the built-in
+       reactions to incoming packets, and in incoming packet listeners.
+
+       'wait_time': the total time the networking thread has spent waiting
+       for and receiving data from the network (not maintained when using a
+       'Multiplexer', whose threads wait for many connections at once).
+
+       'queue_high_water': the greatest number of packets that have been
+       waiting in the queue of outgoing packets at once.
+    """
+    __slots__ = 'packets_in', 'packets_out', 'decode_time', 'encode_time', \
+                'reactor_time', 'listener_time', 'wait_time', \
+                'queue_high_water'
+
+    # The clock used to measure the times, in seconds.
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Sets all statistics to zero."""
+        self.packets_in = {}
+        self.packets_out = {}
+        self.decode_time = 0.0
+        self.encode_time = 0.0
+        self.reactor_time = 0.0
+        self.listener_time = 0.0
+        self.wait_time = 0.0
+        self.queue_high_water = 0
+
+    def record_in(self, packet_class, size, raw_size, decode_time):
+        counts = self.packets_in.get(packet_class)
+        if counts is None:
+            counts = self.packets_in[packet_class] = [0, 0, 0]
+        counts[0] += 1
+        counts[1] += size
+        counts[2] += raw_size
+        self.decode_time += decode_time
+
+    def record_out(self, packet_class, buffer, offset, compressed,
+                   encode_time):
+        # Records a packet written to 'buffer', a bytes-like object, starting
+        # with its length prefix at 'offset'. 'buffer' is None if the packet's
+        # frame is not yet known.
+        counts = self.packets_out.get(packet_class)
+        if counts is None:
+            counts = self.packets_out[packet_class] = [0, 0, 0]
+        counts[0] += 1
+        if buffer is not None:
+            size, offset = VarInt.read_from(buffer, offset)
+            raw_size = size
+            if compressed:
+                data_length, data_offset = VarInt.read_from(buffer, offset)
+                raw_size = data_length or size - (data_offset - offset)
+            counts[1] += size
+            counts[2] += raw_size
+        self.encode_time += encode_time
+
+    def record_queue_length(self, length):
+        if length > self.queue_high_water:
+            self.queue_high_water = length
+
+    def snapshot(self):
+        """Returns a dict containing the current statistics, in which packet
+           classes are identified by their names, with the keys:
+
+           'packets_in', 'packets_out': dicts mapping the name of each packet
+           class to a dict with the keys 'count', 'bytes' and 'raw_bytes'.
+
+           'bytes_in', 'bytes_out', 'raw_bytes_in', 'raw_bytes_out': the
+           total sizes of the packets in each direction, on the network and
+           uncompressed.
+
+           'decode_time', 'encode_time', 'reactor_time', 'listener_time',
+           'wait_time', 'queue_high_water': as the attributes of this class.
+        """
+        result = {
+            'decode_time': self.decode_time,
+            'encode_time': self.encode_time,
+            'reactor_time': self.reactor_time,
+            'listener_time': self.listener_time,
+            'wait_time': self.wait_time,
+            'queue_high_water': self.queue_high_water,
+        }
+        for direction, packets in ('in', self.packets_in), \
+                                  ('out', self.packets_out):
+            by_name = {}
+            # The dict is copied first, as it may be modified by another
+            # thread; packet classes of the same name (such as those created
+            # by 'Packet.compact_class') are counted together.
+            for packet_class, counts in dict(packets).items():
+                totals = by_name.setdefault(packet_class.__name__, {
+                    'count': 0, 'bytes': 0, 'raw_bytes': 0})
+                totals['count'] += counts[0]
+                totals['bytes'] += counts[1]
+                totals['raw_bytes'] += counts[2]
+            result['packets_' + direction] = by_name
+            result['bytes_' + direction] = \
+                sum(totals['bytes'] for totals in by_name.values())
+            result['raw_bytes_' + direction] = \
+                sum(totals['raw_bytes'] for totals in by_name.values())
+        return result
+
+    def to_prometheus(self, prefix='pycraft', labels=None):
+        """Returns the current statistics in the Prometheus text exposition
+           format, with metric names beginning with 'prefix', and with the
+           labels in the dict 'labels', if given, added to each metric.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            name = '%s_%s' % (prefix, name)
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+            for sample_labels, value in samples:
+                sample_labels = dict(labels or {}, **sample_labels)
+                lines.append('%s%s %s' % (
+                    name, _format_labels(sample_labels), _format_value(value)))
+
+        for name, key, help_text in (
+            ('packets_total', 'count', 'Packets received or sent.'),
+            ('packet_bytes_total', 'bytes',
+             'Size of packets received or sent, on the network.'),
+            ('packet_raw_bytes_total', 'raw_bytes',
+             'Size of packets received or sent, uncompressed.'),
+        ):
+            metric(name, 'counter', help_text, [
+                ({'direction': direction, 'packet': packet_name},
+                 totals[key])
+                for direction in ('in', 'out')
+                for packet_name, totals in sorted(
+                    snapshot['packets_' + direction].items())])
+
+        for activity, help_text in (
+            ('decode', 'decoding incoming packets'),
+            ('encode', 'encoding outgoing packets'),
+            ('reactor', 'built-in reactions to incoming packets'),
+            ('listener', 'incoming packet listeners'),
+            ('wait', 'waiting for data from the network'),
+        ):
+            metric('%s_seconds_total' % activity, 'counter',
+                   'Time spent in %s.' % help_text,
+                   [({}, snapshot['%s_time' % activity])])
+
+        metric('outgoing_queue_high_water', 'gauge',
+               'Greatest number of packets waiting to be sent at once.',
+               [({}, snapshot['queue_high_water'])])
+        return '\n'.join(lines) + '\n'
+
+    def __repr__(self):
+        return '%s(%d packets in, %d packets out)' % (
+            type(self).__name__,
+            sum(counts[0] for counts in dict(self.packets_in).values()),
+            sum(counts[0] for counts in dict(self.packets_out).values()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                     .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.items()))
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -1,3 +1,4 @@
 from .basic import *    # noqa: F401, F403
 from .enum import *     # noqa: F401, F403
+from .nbt import *      # noqa: F401, F403
 from .utility import *  # noqa: F401, F403
@@ -2,13 +2,16 @@
 Each type has a method which is used to read and write it.
 These definitions and methods are used by the packet definitions
 """
+import array
 import struct
+import sys
 import uuid
-import io
 
 import pynbt
 
+from .nbt import LazyNBT, nbt_end
 from .utility import Vector, class_and_instancemethod
+from ...utility import LRUCache
 
 
 __all__ = (
@@ -24,6 +27,15 @@ class Type(object):
     # pylint: disable=no-self-argument
     __slots__ = ()
 
+    # If the network representation of this type has a fixed size and can be
+    # read and written by a 'struct' format (without a byte order), this is
+    # that format, so that consecutive fields of such types can be read or
+    # written using a single 'struct.Struct'. If not None, 'from_struct' and
+    # 'to_struct' convert between values of this type and those of 'struct'.
+    struct_format = None
+    from_struct = None
+    to_struct = None
+
     @class_and_instancemethod
     def read_with_context(cls_or_self, file_object, _context):
         return cls_or_self.read(file_object)
@@ -51,7 +63,31 @@ class Type(object):
                             'call "send_with_context" instead of "send".')
 
 
+def fixed_struct_format(data_type):
+    """Returns the 'struct_format' of 'data_type', or None if it has none, or
+       if it may not be used because the type's methods for reading and
+       writing are not defined by the same class as its 'struct_format'.
+    """
+    cls = data_type if isinstance(data_type, type) else type(data_type)
+    if not issubclass(cls, Type):
+        return None
+    owner = _defining_class(cls, 'struct_format')
+    if owner is Type \
+       or _defining_class(cls, 'read') is not owner \
+       or _defining_class(cls, 'send') is not owner \
+       or _defining_class(cls, 'read_with_context') is not Type \
+       or _defining_class(cls, 'send_with_context') is not Type:
+        return None
+    return data_type.struct_format
+
+
+def _defining_class(cls, name):
+    return next(c for c in cls.__mro__ if name in c.__dict__)
+
+
 class Boolean(Type):
+    struct_format = '?'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('?', file_object.read(1))[0]
@@ -62,6 +98,8 @@ class Boolean(Type):
 
 
 class UnsignedByte(Type):
+    struct_format = 'B'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>B', file_object.read(1))[0]
@@ -72,6 +110,8 @@ class UnsignedByte(Type):
 
 
 class Byte(Type):
+    struct_format = 'b'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>b', file_object.read(1))[0]
@@ -82,6 +122,8 @@ class Byte(Type):
 
 
 class Short(Type):
+    struct_format = 'h'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>h', file_object.read(2))[0]
@@ -92,6 +134,8 @@ class Short(Type):
 
 
 class UnsignedShort(Type):
+    struct_format = 'H'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>H', file_object.read(2))[0]
@@ -102,6 +146,8 @@ class UnsignedShort(Type):
 
 
 class Integer(Type):
+    struct_format = 'i'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>i', file_object.read(4))[0]
@@ -122,7 +168,17 @@ class FixedPoint(Type):
         return self.integer_type.read(file_object) / self.denominator
 
     def send(self, value, socket):
-        self.integer_type.send(int(value * self.denominator))
+        self.integer_type.send(int(value * self.denominator), socket)
+
+    @property
+    def struct_format(self):
+        return self.integer_type.struct_format
+
+    def from_struct(self, value):
+        return value / self.denominator
+
+    def to_struct(self, value):
+        return int(value * self.denominator)
 
 
 # This named instance is retained for backward compatibility:
@@ -130,15 +186,25 @@ FixedPointInteger = FixedPoint(Integer)
 
 
 class Angle(Type):
+    struct_format = 'B'
+
     @staticmethod
     def read(file_object):
-        # Linearly transform angle in steps of 1/256 into steps of 1/360
-        return 360 * UnsignedByte.read(file_object) / 256
+        return Angle.from_struct(UnsignedByte.read(file_object))
 
     @staticmethod
     def send(value, socket):
+        UnsignedByte.send(Angle.to_struct(value), socket)
+
+    @staticmethod
+    def from_struct(value):
+        # Linearly transform angle in steps of 1/256 into steps of 1/360
+        return 360 * value / 256
+
+    @staticmethod
+    def to_struct(value):
         # Normalize angle between 0 and 255 and convert to int.
-        UnsignedByte.send(round(256 * ((value % 360) / 360)), socket)
+        return round(256 * ((value % 360) / 360))
 
 
 class VarInt(Type):
@@ -146,6 +212,11 @@ class VarInt(Type):
 
     @classmethod
     def read(cls, file_object):
+        read_direct = getattr(file_object, 'read_direct', None)
+        if read_direct is not None:
+            # The file object can decode the value directly from its buffer.
+            return read_direct(cls)
+
         number = 0
         # Limit of 'cls.max_bytes' bytes, otherwise its possible to cause
         # a DOS attack by sending VarInts that just keep going
@@ -165,23 +236,99 @@ class VarInt(Type):
                 raise ValueError("Tried to read too long of a VarInt")
         return number
 
+    @classmethod
+    def read_from(cls, buffer, offset=0):
+        """Decodes a value from 'buffer' (a bytes-like object whose items are
+           ints, such as bytes, a bytearray or a memoryview of either) starting
+           at 'offset', and returns a tuple of the value and the offset of the
+           byte following it.
+        """
+        try:
+            byte = buffer[offset]
+            if byte < 0x80:
+                return byte, offset + 1
+            number, shift = byte & 0x7F, 7
+            end = offset + cls.max_bytes + 1
+            offset += 1
+            while True:
+                byte = buffer[offset]
+                offset += 1
+                number |= (byte & 0x7F) << shift
+                if not byte & 0x80:
+                    return number, offset
+                if offset >= end:
+                    raise ValueError("Tried to read too long of a VarInt")
+                shift += 7
+        except IndexError:
+            raise EOFError("Unexpected end of message.")
+
+    @classmethod
+    def decode_many(cls, buffer, count, offset=0):
+        """As 'read_from', but decodes 'count' consecutive values, returning a
+           tuple of a list of the values and the offset following the last.
+        """
+        read_from = cls.read_from
+        values = []
+        append = values.append
+        for _ in range(count):
+            value, offset = read_from(buffer, offset)
+            append(value)
+        return values, offset
+
+    @classmethod
+    def read_many(cls, file_object, count):
+        """Reads 'count' consecutive values from 'file_object' as a list."""
+        read_varints = getattr(file_object, 'read_varints', None)
+        if read_varints is not None:
+            return read_varints(cls, count)
+        return [cls.read(file_object) for _ in range(count)]
+
+    @staticmethod
+    def encode_into(buffer, value):
+        """Appends the encoding of 'value' to the bytearray 'buffer'."""
+        while value > 0x7F:
+            buffer.append(value & 0x7F | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    @staticmethod
+    def encode_many(buffer, values):
+        """Appends the encodings of each of 'values' to the bytearray
+           'buffer'.
+        """
+        append = buffer.append
+        for value in values:
+            while value > 0x7F:
+                append(value & 0x7F | 0x80)
+                value >>= 7
+            append(value)
+
     @staticmethod
     def send(value, socket):
-        out = bytes()
-        while True:
-            byte = value & 0x7F
-            value >>= 7
-            out += struct.pack("B", byte | (0x80 if value > 0 else 0))
-            if value == 0:
-                break
+        if 0 <= value < 0x80:
+            socket.send(VARINT_SINGLE_BYTES[value])
+        else:
+            out = bytearray()
+            VarInt.encode_into(out, value)
+            socket.send(out)
+
+    @classmethod
+    def send_many(cls, values, socket):
+        """Writes each of 'values' to 'socket' using a single call to its
+           'send' method.
+        """
+        out = bytearray()
+        cls.encode_many(out, values)
         socket.send(out)
 
     @staticmethod
     def size(value):
-        for max_value, size in VARINT_SIZE_TABLE.items():
-            if value < max_value:
-                return size
-        raise ValueError("Integer too large")
+        if value < 0x80:
+            return 1
+        size = (value.bit_length() + 6) // 7
+        if size > len(VARINT_SIZE_TABLE):
+            raise ValueError("Integer too large")
+        return size
 
 
 class VarLong(VarInt):
@@ -204,8 +351,13 @@ VARINT_SIZE_TABLE = {
     2 ** 84: 12
 }
 
+# The encodings of the values that occupy a single byte.
+VARINT_SINGLE_BYTES = tuple(bytes((value,)) for value in range(0x80))
+
 
 class Long(Type):
+    struct_format = 'q'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>q', file_object.read(8))[0]
@@ -216,6 +368,8 @@ class Long(Type):
 
 
 class UnsignedLong(Type):
+    struct_format = 'Q'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>Q', file_object.read(8))[0]
@@ -226,6 +380,8 @@ class UnsignedLong(Type):
 
 
 class Float(Type):
+    struct_format = 'f'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>f', file_object.read(4))[0]
@@ -236,6 +392,8 @@ class Float(Type):
 
 
 class Double(Type):
+    struct_format = 'd'
+
     @staticmethod
     def read(file_object):
         return struct.unpack('>d', file_object.read(8))[0]
@@ -283,10 +441,23 @@ class TrailingByteArray(Type):
 
 
 class String(Type):
+    # If not None, an 'LRUCache' in which strings of at most
+    # 'max_cached_length' bytes are kept when they are read, keyed by their
+    # encoded form, so that strings which are received repeatedly (such as
+    # identifiers like 'minecraft:overworld') are decoded only once, and share
+    # a single interned 'str' object.
+    cache = None
+
+    max_cached_length = 64
+
     @staticmethod
     def read(file_object):
         length = VarInt.read(file_object)
-        return file_object.read(length).decode("utf-8")
+        data = file_object.read(length)
+        cache = String.cache
+        if cache is not None and length <= String.max_cached_length:
+            return cache.get(data, _decode_interned)
+        return data.decode("utf-8")
 
     @staticmethod
     def send(value, socket):
@@ -295,14 +466,55 @@ class String(Type):
         socket.send(value)
 
 
+def _decode_interned(data):
+    return sys.intern(data.decode('utf-8'))
+
+
 class UUID(Type):
+    struct_format = '16s'
+
+    # If True, UUIDs are read as the 16-byte 'bytes' objects of their network
+    # representation, rather than strings. In either case, UUIDs given as
+    # 'bytes' objects are written as they are.
+    raw = False
+
+    # If not None, and 'raw' is False, an 'LRUCache' of the strings
+    # representing the UUIDs most recently read, keyed by their network
+    # representation, so that each distinct UUID shares a single 'str' object.
+    cache = None
+
     @staticmethod
     def read(file_object):
-        return str(uuid.UUID(bytes=file_object.read(16)))
+        data = file_object.read(16)
+        if len(data) < 16:
+            raise EOFError("Unexpected end of message.")
+        return UUID.from_struct(data)
 
     @staticmethod
     def send(value, socket):
-        socket.send(uuid.UUID(value).bytes)
+        socket.send(UUID.to_struct(value))
+
+    @staticmethod
+    def from_struct(value):
+        if UUID.raw:
+            return value
+        cache = UUID.cache
+        if cache is not None:
+            return cache.get(value, _uuid_string)
+        return _uuid_string(value)
+
+    @staticmethod
+    def to_struct(value):
+        if isinstance(value, bytes):
+            return value
+        return uuid.UUID(value).bytes
+
+
+def _uuid_string(data):
+    # Equivalent to 'str(uuid.UUID(bytes=data))', without creating the UUID.
+    digits = data.hex()
+    return '%s-%s-%s-%s-%s' % (digits[:8], digits[8:12], digits[12:16],
+                               digits[16:20], digits[20:])
 
 
 class Position(Type, Vector):
@@ -343,45 +555,193 @@ class Position(Type, Vector):
 
 
 class NBT(Type):
+    # If True, NBT values in packets received from the network are read as
+    # instances of 'LazyNBT', which are decoded only as far as they are
+    # accessed, and are written without encoding them again. Otherwise, they
+    # are read as instances of 'pynbt.NBTFile'.
+    lazy = False
+
+    # If 'lazy' is True, and this is not None, an 'LRUCache' of the 'LazyNBT'
+    # instances most recently read, keyed by their data, so that when the same
+    # data is received again (such as the dimension codec sent with every
+    # 'JoinGamePacket'), the same instance is returned, and its entries need
+    # not be found again.
+    cache = LRUCache(16)
+
     @staticmethod
     def read(file_object):
+        if NBT.lazy:
+            read_direct = getattr(file_object, 'read_direct', None)
+            if read_direct is not None:
+                return read_direct(NBT)
         return pynbt.NBTFile(io=file_object)
 
+    @staticmethod
+    def read_from(buffer, offset=0):
+        """Returns a 'LazyNBT' containing the NBT value starting at 'offset' in
+           the bytes-like object 'buffer', and the offset following it.
+        """
+        end = nbt_end(buffer, offset)
+        data = bytes(buffer[offset:end])
+        cache = NBT.cache
+        if cache is None:
+            return LazyNBT(data), end
+        return cache.get(data, LazyNBT), end
+
     @staticmethod
     def send(value, socket):
-        buffer = io.BytesIO()
-        pynbt.NBTFile(value=value).save(buffer)
-        socket.send(buffer.getvalue())
+        if isinstance(value, LazyNBT):
+            socket.send(value.to_bytes())
+        else:
+            pynbt.NBTFile(value=value).save(_SocketFile(socket))
 
 
-class PrefixedArray(Type):
-    __slots__ = 'length_type', 'element_type'
+class _SocketFile(object):
+    # Presents a socket-like object with the interface of a writable file, so
+    # that pyNBT can write directly to it.
+    __slots__ = 'write',
+
+    def __init__(self, socket):
+        self.write = socket.send
 
-    def __init__(self, length_type, element_type):
+
+class PrefixedArray(Type):
+    """An array of elements of 'element_type', preceded by its length as a
+       value of 'length_type'.
+
+       If the elements are VarInts or VarLongs, or are of a fixed-size numeric
+       type with no conversion from their 'struct_format' (such as Integer or
+       Double), they are read and written all at once. In this case, if
+       'as_array' is True, the elements are read into an 'array.array' rather
+       than a list. In any case, any sequence of elements may be written.
+
+       VarLongs read into an array are the signed 64-bit integers they encode,
+       whereas those read into a list are unsigned, as for a single VarLong.
+    """
+    __slots__ = 'length_type', 'element_type', 'as_array', '_format', \
+                '_typecode'
+
+    def __init__(self, length_type, element_type, as_array=False):
         self.length_type = length_type
         self.element_type = element_type
+        self.as_array = as_array
+
+        # The 'struct' format of a single element, if they are read in bulk.
+        self._format = fixed_struct_format(element_type)
+        if self._format is not None and \
+                getattr(element_type, 'from_struct', None) is not None:
+            self._format = None
+
+        # The type code of the 'array.array' to read the elements into.
+        if self._format is not None:
+            self._typecode = ARRAY_TYPECODES.get(self._format)
+        elif self.__varint_elements():
+            self._typecode = 'q'
+        else:
+            self._typecode = None
+        if as_array and self._typecode is None:
+            raise ValueError('Elements of type %r cannot be read into an '
+                             'array.' % (element_type,))
 
     def read(self, file_object):
-        return self.__read(file_object, self.element_type.read)
+        length = self.length_type.read(file_object)
+        if self._format is not None:
+            return self.__read_fixed(file_object, length)
+        if self.__varint_elements():
+            values = self.element_type.read_many(file_object, length)
+            return self.__int64_array(values) if self.as_array else values
+        read = self.element_type.read
+        return [read(file_object) for i in range(length)]
 
     def send(self, value, socket):
-        return self.__send(value, socket, self.element_type.send)
+        self.length_type.send(len(value), socket)
+        if self._format is not None:
+            return self.__send_fixed(value, socket)
+        if self.__varint_elements():
+            if self.as_array and value and min(value) < 0:
+                # Write negative values as the unsigned integers encoding
+                # them, as they are read by '__int64_array'.
+                value = [element % 2 ** 64 for element in value]
+            return self.element_type.send_many(value, socket)
+        send = self.element_type.send
+        for element in value:
+            send(element, socket)
 
     def read_with_context(self, file_object, context):
-        def element_read(file_object):
-            return self.element_type.read_with_context(file_object, context)
-        return self.__read(file_object, element_read)
-
-    def send_with_context(self, value, socket, context):
-        def element_send(value, socket):
-            return self.element_type.send_with_context(value, socket, context)
-        return self.__send(value, socket, element_send)
-
-    def __read(self, file_object, element_read):
+        if self._format is not None or self.__varint_elements():
+            return self.read(file_object)
         length = self.length_type.read(file_object)
-        return [element_read(file_object) for i in range(length)]
+        read = self.element_type.read_with_context
+        return [read(file_object, context) for i in range(length)]
 
-    def __send(self, value, socket, element_send):
+    def send_with_context(self, value, socket, context):
+        if self._format is not None or self.__varint_elements():
+            return self.send(value, socket)
         self.length_type.send(len(value), socket)
+        send = self.element_type.send_with_context
         for element in value:
-            element_send(element, socket)
+            send(element, socket, context)
+
+    def __varint_elements(self):
+        # Whether the elements are VarInts or VarLongs, which are then read and
+        # written all at once.
+        element_type = self.element_type
+        return isinstance(element_type, type) and \
+            issubclass(element_type, VarInt) and \
+            element_type.read.__func__ is VarInt.read.__func__ and \
+            element_type.send is VarInt.send
+
+    @staticmethod
+    def __int64_array(values):
+        # VarLongs are read as unsigned integers of up to 70 bits, which may
+        # not fit in an array of type 'q', so any such values are converted to
+        # the signed 64-bit integers which they encode.
+        try:
+            return array.array('q', values)
+        except OverflowError:
+            return array.array('q', [(value + 2 ** 63) % 2 ** 64 - 2 ** 63
+                                     for value in values])
+
+    def __read_fixed(self, file_object, length):
+        length = max(length, 0)
+        size = length * struct.calcsize(self._format)
+        data = file_object.read(size)
+        if len(data) < size:
+            raise EOFError("Unexpected end of message.")
+        if self.as_array:
+            values = array.array(self._typecode)
+            values.frombytes(data)
+            if sys.byteorder == 'little':
+                values.byteswap()
+            return values
+        return list(struct.unpack('>%d%s' % (length, self._format), data))
+
+    def __send_fixed(self, value, socket):
+        if isinstance(value, array.array) and value.typecode == self._typecode:
+            if sys.byteorder == 'little':
+                value = array.array(value.typecode, value)
+                value.byteswap()
+            socket.send(value.tobytes())
+        else:
+            socket.send(struct.pack('>%d%s' % (len(value), self._format),
+                                    *value))
+
+
+def _array_typecodes():
+    # Returns a dict mapping 'struct' formats to the 'array.array' type codes
+    # with the same meaning and size, where there are any on this platform.
+    typecodes = {}
+    for struct_format, candidates in (
+        ('b', 'b'), ('B', 'B'), ('h', 'h'), ('H', 'H'), ('i', 'il'),
+        ('I', 'IL'), ('q', 'ql'), ('Q', 'QL'), ('f', 'f'), ('d', 'd'),
+    ):
+        for typecode in candidates:
+            if array.array(typecode).itemsize == \
+                    struct.calcsize('>' + struct_format):
+                typecodes[struct_format] = typecode
+                break
+    return typecodes
+
+
+# Maps 'struct' formats to the equivalent 'array.array' type codes.
+ARRAY_TYPECODES = _array_typecodes()
@@ -0,0 +1,200 @@
+"""Contains 'LazyNBT', a read-only representation of an NBT compound tag which
+   keeps its network representation and decodes its entries only when they
+   are accessed, and functions for finding the extent of NBT data in a buffer
+   without decoding it.
+"""
+from collections.abc import Mapping
+import io
+import struct
+
+import pynbt
+
+
+__all__ = (
+    'LazyNBT', 'nbt_end',
+)
+
+TAG_END, TAG_LIST, TAG_COMPOUND = 0, 9, 10
+
+# The pyNBT classes representing each tag type, indexed by type ID.
+TAG_CLASSES = (
+    pynbt.TAG_End, pynbt.TAG_Byte, pynbt.TAG_Short, pynbt.TAG_Int,
+    pynbt.TAG_Long, pynbt.TAG_Float, pynbt.TAG_Double, pynbt.TAG_Byte_Array,
+    pynbt.TAG_String, pynbt.TAG_List, pynbt.TAG_Compound, pynbt.TAG_Int_Array,
+    pynbt.TAG_Long_Array,
+)
+
+# Maps the type IDs of fixed-size tags to the sizes of their payloads.
+FIXED_SIZES = {1: 1, 2: 2, 3: 4, 4: 8, 5: 4, 6: 8}
+
+# Maps the type IDs of array tags to the sizes of their elements.
+ARRAY_ITEM_SIZES = {7: 1, 11: 4, 12: 8}
+
+INT = struct.Struct('>i')
+UNSIGNED_SHORT = struct.Struct('>H')
+LIST_HEADER = struct.Struct('>bi')
+
+
+def nbt_end(buffer, offset=0):
+    """Returns the offset just after the named compound tag (as used in the
+       network representation of NBT data) starting at 'offset' in 'buffer',
+       a bytes-like object, without decoding the tag.
+    """
+    if len(buffer) <= offset:
+        raise EOFError("Unexpected end of message.")
+    if buffer[offset] != TAG_COMPOUND:
+        raise IOError('NBTFile does not begin with 0x0A.')
+    try:
+        name_length, = UNSIGNED_SHORT.unpack_from(buffer, offset + 1)
+        end = _skip_payload(buffer, TAG_COMPOUND, offset + 3 + name_length)
+    except (struct.error, IndexError):
+        raise EOFError("Unexpected end of message.")
+    if end > len(buffer):
+        raise EOFError("Unexpected end of message.")
+    return end
+
+
+def _skip_payload(buffer, tag_type, pos):
+    # Returns the offset just after the payload of a tag of type 'tag_type'
+    # starting at 'pos', which may be beyond the end of 'buffer'.
+    size = FIXED_SIZES.get(tag_type)
+    if size is not None:
+        return pos + size
+    if tag_type == TAG_COMPOUND:
+        while True:
+            child_type = buffer[pos]
+            if child_type == TAG_END:
+                return pos + 1
+            name_length, = UNSIGNED_SHORT.unpack_from(buffer, pos + 1)
+            pos = _skip_payload(buffer, child_type, pos + 3 + name_length)
+    if tag_type == 8:
+        return pos + 2 + UNSIGNED_SHORT.unpack_from(buffer, pos)[0]
+    if tag_type in ARRAY_ITEM_SIZES:
+        length, = INT.unpack_from(buffer, pos)
+        if length < 0:
+            raise ValueError('Negative NBT array length: %d' % length)
+        return pos + 4 + length * ARRAY_ITEM_SIZES[tag_type]
+    if tag_type == TAG_LIST:
+        item_type, length = LIST_HEADER.unpack_from(buffer, pos)
+        if length < 0:
+            raise ValueError('Negative NBT list length: %d' % length)
+        pos += LIST_HEADER.size
+        size = FIXED_SIZES.get(item_type)
+        if size is not None:
+            return pos + length * size
+        for _ in range(length):
+            pos = _skip_payload(buffer, item_type, pos)
+        return pos
+    raise ValueError('Unknown NBT tag type: %d' % tag_type)
+
+
+def _read_name(data, pos):
+    # Returns the length-prefixed name starting at 'pos' in 'data', and the
+    # offset following it. Names are in Java's modified UTF-8, which differs
+    # from UTF-8 only in ways that are invalid in UTF-8.
+    length, = UNSIGNED_SHORT.unpack_from(data, pos)
+    end = pos + 2 + length
+    try:
+        return data[pos + 2:end].decode('utf-8'), end
+    except UnicodeDecodeError:
+        return pynbt.TAG_String.read(_reader(data, pos), False).value, end
+
+
+def _reader(data, pos):
+    # Returns a reading function, as used by pyNBT, which reads from 'data'
+    # starting at 'pos'.
+    src = io.BytesIO(data)
+    src.seek(pos)
+
+    def read(fmt, size):
+        return struct.unpack('>' + fmt, src.read(size))
+    read.src = src
+    return read
+
+
+class LazyNBT(Mapping):
+    """A read-only NBT compound tag, which is kept in its network
+       representation, in the bytes object 'data'. When it is first accessed,
+       the offsets of its entries are found without decoding them, and each
+       entry is then decoded only when it is accessed, as a pyNBT tag, or as a
+       'LazyNBT' (sharing the same 'data') if it is itself a compound tag.
+
+       This type supports the same read-only mapping operations as
+       'pynbt.TAG_Compound', and has the same 'name' and 'value' attributes.
+       'to_nbt' returns an equivalent pyNBT tag, which may be modified. When
+       written to a packet, the tag's data is written directly, without
+       encoding it again.
+    """
+    __slots__ = 'data', 'offset', 'name', 'start', '_index'
+
+    def __init__(self, data, offset=0):
+        """
+        :param data: A bytes object containing a named compound tag, as in the
+                     network representation of an NBT value.
+        :param offset: The offset of the tag in 'data'.
+        """
+        if len(data) <= offset or data[offset] != TAG_COMPOUND:
+            raise IOError('NBTFile does not begin with 0x0A.')
+        self.data = data
+        self.offset = offset
+        self.name, self.start = _read_name(data, offset + 1)
+        self._index = None
+
+    @property
+    def value(self):
+        return self
+
+    @property
+    def index(self):
+        """A dict mapping the name of each entry to a tuple of its tag type ID,
+           its offset in 'data', and the offset of its payload in 'data'.
+        """
+        index = self._index
+        if index is None:
+            index, data, pos = {}, self.data, self.start
+            while data[pos] != TAG_END:
+                tag_type, offset = data[pos], pos
+                name, pos = _read_name(data, pos + 1)
+                index[name] = tag_type, offset, pos
+                pos = _skip_payload(data, tag_type, pos)
+            self._index = index
+        return index
+
+    def __getitem__(self, name):
+        tag_type, offset, pos = self.index[name]
+        if tag_type == TAG_COMPOUND:
+            return LazyNBT(self.data, offset)
+        tag = TAG_CLASSES[tag_type].read(_reader(self.data, pos), False)
+        tag.name = name
+        return tag
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __eq__(self, other):
+        if not isinstance(other, LazyNBT):
+            return NotImplemented
+        return self.to_bytes() == other.to_bytes()
+
+    __hash__ = None
+
+    def to_bytes(self):
+        """Returns the network representation of this tag."""
+        end = _skip_payload(self.data, TAG_COMPOUND, self.start)
+        if self.offset == 0 and end == len(self.data):
+            return self.data
+        return self.data[self.offset:end]
+
+    def to_nbt(self):
+        """Returns a new 'pynbt.NBTFile' with the same contents as this tag."""
+        return pynbt.NBTFile(io=io.BytesIO(self.to_bytes()))
+
+    def __repr__(self):
+        return '%s(%r entries, %r)' % (type(self).__name__, len(self),
+                                       self.name)
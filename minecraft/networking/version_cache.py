@@ -0,0 +1,66 @@
+"""Contains 'ProtocolVersionCache', which remembers the protocol versions of
+   servers, so that connections to them need not first query their status.
+"""
+import threading
+import time
+
+__all__ = 'ProtocolVersionCache', 'default_cache'
+
+
+class ProtocolVersionCache(object):
+    """A mapping from the address and port of each server to the protocol
+       version it was last found to use, which may be shared by any number of
+       'Connection's, given as their 'version_cache' argument, in any threads.
+
+       A 'Connection' which is allowed to use more than one protocol version
+       normally queries the status of the server before each login, in order
+       to determine its version. If the version is in its cache, it instead
+       logs in with that version at once, and if the server then rejects the
+       login, it removes the version from the cache and tries again with a
+       status query.
+
+       Each version is kept for 'ttl' seconds after it was determined.
+    """
+    __slots__ = 'ttl', '_versions', '_lock'
+
+    # The clock used to determine the age of each entry, in seconds.
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        # Maps each (address, port) to a (protocol version, expiry time) pair.
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, address, port):
+        """Returns the protocol version of the server at the given address
+           and port, or None if it is not known or has expired.
+        """
+        with self._lock:
+            entry = self._versions.get((address, port))
+            if entry is None:
+                return None
+            version, expiry = entry
+            if self.clock() >= expiry:
+                del self._versions[address, port]
+                return None
+            return version
+
+    def set(self, address, port, version):
+        with self._lock:
+            self._versions[address, port] = version, self.clock() + self.ttl
+
+    def invalidate(self, address, port):
+        with self._lock:
+            self._versions.pop((address, port), None)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._versions)
+
+
+# A cache which may be shared by all connections in a program.
+default_cache = ProtocolVersionCache()
@@ -0,0 +1,53 @@
+"""Contains 'Waker', which allows a thread waiting for sockets to become
+   readable to be woken by another thread.
+"""
+import socket
+
+
+class Waker(object):
+    """A connected pair of sockets, the reading end of which may be waited for
+       together with other sockets, using 'select.select' or a selector from
+       'selectors', so that a thread waiting for them can be woken at once by
+       another thread calling 'wake'.
+
+       The thread being woken must call 'clear' before checking for whatever
+       work 'wake' signals, so that no wakeup is lost. Repeated calls to
+       'wake' before the next call to 'clear' cost no system calls.
+    """
+    __slots__ = 'reader', 'writer', 'woken'
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.reader.setblocking(False)
+        self.writer.setblocking(False)
+        self.woken = False
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def wake(self):
+        """Makes the reading end readable, if it is not already. This may be
+           called from any thread.
+        """
+        if not self.woken:
+            self.woken = True
+            try:
+                self.writer.send(b'\0')
+            except (BlockingIOError, OSError):
+                # The reading end is already readable, or has been closed.
+                pass
+
+    def clear(self):
+        """Makes the reading end no longer readable, until 'wake' is called."""
+        try:
+            while self.reader.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        # This is reset only after the data is consumed, so that a concurrent
+        # call to 'wake' may send a superfluous byte, but is never ignored.
+        self.woken = False
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
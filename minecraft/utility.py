@@ -1,6 +1,7 @@
 """ Miscellaneous general utilities.
 """
 import types
+from collections import OrderedDict
 from itertools import chain
 
 from . import PROTOCOL_VERSION_INDICES
@@ -186,3 +187,43 @@ class class_and_instancemethod:
     def __get__(self, inst, owner=None):
         bind_to = owner if inst is None else inst
         return types.MethodType(self._func, bind_to)
+
+
+class LRUCache(object):
+    """ A cache of the values of a function for at most 'max_size' distinct
+        keys, which discards the least recently used value when another is
+        added. It may be used from any number of threads at once, as, in the
+        worst case, a value may be computed more than once, or discarded early.
+    """
+
+    __slots__ = 'max_size', '_items'
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def get(self, key, compute):
+        """ Returns the value for 'key', calling 'compute(key)' to find it if
+            it is not already in the cache.
+        """
+        items = self._items
+        try:
+            value = items[key]
+            items.move_to_end(key)
+        except KeyError:
+            value = items[key] = compute(key)
+            try:
+                while len(items) > self.max_size:
+                    items.popitem(last=False)
+            except KeyError:
+                pass
+        return value
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
@@ -0,0 +1,101 @@
+"""Benchmarks of pyCraft's performance, for tracking regressions between
+   releases. These are not run as part of the test suite; instead, run::
+
+       python -m tests.benchmarks [micro] [macro] [--json FILE] ...
+
+   from the root of the repository ('--help' lists the options). The 'micro'
+   benchmarks measure the encoding and decoding of each data type and of
+   representative packets in several protocol versions, and the 'macro'
+   benchmarks measure the throughput of a 'Connection' talking to a
+   'FakeServer' with and without compression and encryption.
+
+   Each benchmark produces a result: a dict with the keys 'name', 'group',
+   'params', 'unit' and 'stats', where 'stats' maps the names of measurements
+   to numbers in the given unit (or, for rates, in units per second). The
+   results are written as a table, or, with '--json', as a JSON document also
+   describing the environment in which they were taken.
+"""
+import json
+import platform
+import sys
+import time
+
+from minecraft import __version__
+
+
+def measure(name, group, function, params=None, number=None, repeat=5,
+            min_time=0.05):
+    """Returns the result of timing 'function', called with no arguments,
+       'repeat' times in batches of 'number' calls. If 'number' is None, it is
+       chosen so that each batch takes at least 'min_time' seconds. The result
+       reports the best and median times per call, in seconds.
+    """
+    if number is None:
+        number = 1
+        while _time_calls(function, number) < min_time:
+            number *= 10 if number < 1000 else 2
+    times = sorted(_time_calls(function, number) / number
+                   for _ in range(repeat))
+    return result(name, group, params, 's', {
+        'best': times[0],
+        'median': times[len(times) // 2],
+        'calls': number * repeat,
+    })
+
+
+def _time_calls(function, number):
+    # Returns the time taken to call 'function' 'number' times.
+    calls = range(number)
+    start = time.perf_counter()
+    for _ in calls:
+        function()
+    return time.perf_counter() - start
+
+
+def result(name, group, params, unit, stats):
+    return {'name': name, 'group': group, 'params': params or {},
+            'unit': unit, 'stats': stats}
+
+
+def environment():
+    """Returns a dict describing the environment in which the benchmarks are
+       run, to be included with their results.
+    """
+    return {
+        'pycraft_version': __version__,
+        'python_implementation': platform.python_implementation(),
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def write_json(results, file):
+    json.dump({'environment': environment(), 'results': results}, file,
+              indent=2, sort_keys=True)
+    file.write('\n')
+
+
+def write_table(results, file=sys.stdout):
+    """Writes the given results in a human-readable form."""
+    for res in results:
+        stats = res['stats']
+        if res['unit'] == 's':
+            summary = '%10.3f us  (median %.3f us)' % (
+                stats['best'] * 1e6, stats['median'] * 1e6)
+        else:
+            summary = '  '.join('%s=%s' % (key, _format_number(stats[key]))
+                                for key in sorted(stats))
+        params = ', '.join('%s=%s' % item for item in sorted(
+            res['params'].items()) if item[0] != 'protocol')
+        if 'protocol' in res['params']:
+            name = '%s [%s]' % (res['name'], res['params']['protocol'])
+        else:
+            name = res['name']
+        file.write('%-60s %s%s\n' % (
+            name, summary, '  (%s)' % params if params else ''))
+
+
+def _format_number(value):
+    return '%.4g' % value if isinstance(value, float) else str(value)
@@ -0,0 +1,95 @@
+"""Runs the benchmarks from the command line: see 'tests.benchmarks'."""
+import argparse
+import sys
+
+from . import write_json, write_table
+from . import macro, micro
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m tests.benchmarks',
+        description='Benchmark pyCraft. By default, all benchmarks are run.')
+    parser.add_argument(
+        'suites', nargs='*', metavar='{micro,macro}',
+        help='the suites of benchmarks to run')
+    parser.add_argument(
+        '--json', metavar='FILE',
+        help='write the results as JSON to FILE, or to standard output if '
+             'FILE is "-", instead of writing a table')
+    parser.add_argument(
+        '--filter', metavar='TEXT', action='append',
+        help='run only the benchmarks whose names contain TEXT (may be '
+             'given more than once)')
+    parser.add_argument(
+        '--protocol', metavar='VERSION', type=int, action='append',
+        help='a protocol version in which to benchmark packets and '
+             'connections (may be given more than once)')
+    parser.add_argument(
+        '--quick', action='store_true',
+        help='take fewer measurements, for checking that the benchmarks work')
+    parser.add_argument(
+        '--count', type=int, default=10000,
+        help='the number of packets sent in each connection benchmark '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--rate', metavar='PACKETS', type=float, action='append',
+        help='a rate in packets per second at which to send packets in the '
+             'connection benchmarks, or 0 for as fast as possible (may be '
+             'given more than once; default: 0)')
+    parser.add_argument(
+        '--compression-threshold', metavar='BYTES', type=int, default=256,
+        help='the compression threshold used by connection benchmarks with '
+             'compression enabled (default: %(default)s)')
+    options = parser.parse_args(args)
+    suites = options.suites or ['micro', 'macro']
+    for suite in suites:
+        if suite not in ('micro', 'macro'):
+            parser.error('unknown suite: %r' % suite)
+
+    results = []
+    for res in _run(options, suites):
+        if options.json is None:
+            write_table([res])
+            sys.stdout.flush()
+        results.append(res)
+
+    if options.json == '-':
+        write_json(results, sys.stdout)
+    elif options.json is not None:
+        with open(options.json, 'w') as file:
+            write_json(results, file)
+
+
+def _run(options, suites):
+    # Yields the result of each selected benchmark.
+    def selected(name):
+        return options.filter is None or \
+            any(text in name for text in options.filter)
+
+    measure_args = {'repeat': 1, 'min_time': 0.001} if options.quick else {}
+    if 'micro' in suites:
+        for res in micro.type_benchmarks(selected=selected, **measure_args):
+            yield res
+        for res in micro.packet_benchmarks(
+                options.protocol, selected=selected, **measure_args):
+            yield res
+
+    if 'macro' in suites:
+        count = min(options.count, 100) if options.quick else options.count
+        protocols = options.protocol or [None]
+        for protocol in protocols:
+            for direction in macro.DIRECTIONS:
+                if not selected('connection.%s' % direction):
+                    continue
+                for rate in options.rate or [0]:
+                    for threshold in None, options.compression_threshold:
+                        for encryption in False, True:
+                            yield macro.connection_benchmark(
+                                direction, count=count, rate=rate or None,
+                                compression_threshold=threshold,
+                                encryption=encryption, protocol=protocol)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Benchmarks of a 'Connection' exchanging packets with a 'FakeServer' over a
+   local socket, in either direction, at a given rate or as fast as possible,
+   with or without compression and encryption.
+
+   The server runs in another thread of the same process, so that it competes
+   with the client for the interpreter: the results are useful for comparing
+   versions of pyCraft on the same machine, rather than as absolute measures
+   of its performance.
+"""
+import os
+import sys
+import threading
+import time
+import zlib
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import load_der_private_key
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import Connection
+from minecraft.networking.framing import FrameBuffer, FrameReader, FrameWriter
+from minecraft.networking.packets import clientbound, serverbound
+from minecraft.networking.types import VarInt
+
+from .. import fake_server
+from . import result
+from .micro import sample_packet
+
+
+KEY_LOCATION = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'encryption')
+
+# The packets sent by the server in the 'receive' direction, and by the client
+# in the 'send' direction, in rotation. The plugin messages are large enough
+# to be compressed with a threshold of 256.
+CLIENTBOUND_CLASSES = [
+    clientbound.play.EntityPositionDeltaPacket,
+    clientbound.play.EntityVelocityPacket,
+    clientbound.play.EntityLookPacket,
+    clientbound.play.TimeUpdatePacket,
+    clientbound.play.PluginMessagePacket,
+]
+SERVERBOUND_CLASSES = [
+    serverbound.play.PositionAndLookPacket,
+    serverbound.play.AnimationPacket,
+    serverbound.play.PluginMessagePacket,
+]
+
+DIRECTIONS = 'receive', 'send'
+
+
+def connection_benchmark(direction, count=10000, rate=None,
+                         compression_threshold=None, encryption=False,
+                         protocol=None, timeout=60):
+    """Returns the result of 'count' packets being sent from the server to the
+       client (if 'direction' is 'receive') or from the client to the server
+       (if it is 'send'), by a client using 'Connection' with its networking
+       thread. If 'rate' is not None, the packets are sent at that many per
+       second; otherwise, as fast as possible.
+
+       The result reports the elapsed time in seconds from when the first
+       packet is sent until the last is processed, the achieved rate in
+       packets per second, and the number of bytes transferred. For the
+       'receive' direction, it also reports the latencies, in seconds, between
+       the server sending each 'TimeUpdatePacket' and the client's packet
+       listener being called for it.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError('Unknown direction: %r.' % (direction,))
+    if protocol is None:
+        protocol = SUPPORTED_PROTOCOL_VERSIONS[-1]
+
+    private_key = public_key_bytes = None
+    if encryption:
+        with open(os.path.join(KEY_LOCATION, 'priv_key.bin'), 'rb') as f:
+            private_key = load_der_private_key(
+                f.read(), None, default_backend())
+        with open(os.path.join(KEY_LOCATION, 'pub_key.bin'), 'rb') as f:
+            public_key_bytes = f.read()
+
+    server = _BenchmarkServer(
+        minecraft_version=protocol,
+        compression_threshold=compression_threshold,
+        client_handler_type=_BenchmarkClientHandler,
+        private_key=private_key, public_key_bytes=public_key_bytes)
+    server.direction, server.count, server.rate = direction, count, rate
+    server.epoch = time.perf_counter()
+    server.num_bytes = 0
+
+    joined, finished = threading.Event(), threading.Event()
+    times, latencies, errors = {}, [], []
+
+    def run_server():
+        try:
+            server.run()
+        except Exception:
+            errors.append(sys.exc_info())
+            finished.set()
+    server_thread = threading.Thread(target=run_server, name='FakeServer')
+    server_thread.daemon = True
+    server_thread.start()
+
+    client = Connection('localhost', server.listen_socket.getsockname()[1],
+                        username='Benchmark', allowed_versions={protocol})
+
+    @client.exception_handler()
+    def handle_exception(_exc, exc_info):
+        errors.append(exc_info)
+        finished.set()
+
+    @client.listener(clientbound.play.JoinGamePacket)
+    def handle_join_game(_packet):
+        times['start'] = time.perf_counter()
+        joined.set()
+
+    @client.listener(clientbound.play.DisconnectPacket)
+    def handle_disconnect(_packet):
+        times['end'] = time.perf_counter()
+        finished.set()
+
+    @client.listener(clientbound.play.TimeUpdatePacket)
+    def handle_time_update(packet):
+        latencies.append(time.perf_counter() - server.epoch -
+                         packet.world_age / 1e6)
+
+    try:
+        client.connect()
+        if direction == 'send' and joined.wait(timeout):
+            packets = [sample_packet(cls, client.context)
+                       for cls in SERVERBOUND_CLASSES]
+            times['start'] = time.perf_counter()
+            _send_paced(count, rate, lambda first, num: [
+                client.write_packet(packets[i % len(packets)])
+                for i in range(first, first + num)])
+        if not finished.wait(timeout):
+            raise RuntimeError('Benchmark timed out.')
+        if errors:
+            exc_value, exc_tb = errors[0][1:]
+            raise exc_value.with_traceback(exc_tb)
+    finally:
+        client.disconnect(immediate=True)
+        server.stop()
+        for thread in client.networking_thread, server_thread:
+            if thread is not None:
+                thread.join(fake_server.THREAD_TIMEOUT_S)
+
+    elapsed = times['end'] - times['start']
+    stats = {
+        'elapsed': elapsed,
+        'packets_per_second': count / elapsed,
+        'bytes': server.num_bytes,
+    }
+    if latencies:
+        latencies.sort()
+        stats.update({
+            'latency_mean': sum(latencies) / len(latencies),
+            'latency_p50': latencies[len(latencies) // 2],
+            'latency_p99': latencies[len(latencies) * 99 // 100],
+            'latency_max': latencies[-1],
+        })
+    return result('connection.%s' % direction, 'connection', {
+        'protocol': protocol, 'count': count, 'rate': rate,
+        'compression_threshold': compression_threshold,
+        'encryption': encryption,
+    }, 'packets', stats)
+
+
+def _send_paced(count, rate, send):
+    # Calls 'send(first, num)' for successive batches of packets numbered from
+    # 'first' to 'first + num - 1', until 'count' packets have been sent, such
+    # that packet 'i' is sent no earlier than 'i / rate' seconds after the
+    # first, or as soon as possible if 'rate' is None.
+    start, sent = time.perf_counter(), 0
+    while sent < count:
+        if rate is None:
+            due = min(count, sent + 300)
+        else:
+            elapsed = time.perf_counter() - start
+            due = min(count, int(elapsed * rate) + 1)
+            if due <= sent:
+                time.sleep(sent / rate - elapsed)
+                continue
+        send(sent, due - sent)
+        sent = due
+
+
+class _BenchmarkServer(fake_server.FakeServer):
+    __slots__ = 'direction', 'count', 'rate', 'epoch', 'num_bytes'
+
+
+class _BenchmarkClientHandler(fake_server.FakeClientHandler):
+    # Sends or receives the server's packets upon entering the play state,
+    # then disconnects the client. Packets are written and read directly, as
+    # the server's usual methods log each packet.
+
+    def handle_play_start(self):
+        super(_BenchmarkClientHandler, self).handle_play_start()
+        if self.server.direction == 'receive':
+            self._send_packets()
+        else:
+            self._receive_packets()
+        raise fake_server.FakeServerDisconnect
+
+    def _send_packets(self):
+        context = self.server.context
+        packets = [sample_packet(cls, context) for cls in CLIENTBOUND_CLASSES]
+        threshold = self.server.compression_threshold \
+            if self.compression_enabled else None
+        writer = FrameWriter()
+
+        def send(first, num):
+            for i in range(first, first + num):
+                packet = packets[i % len(packets)]
+                if isinstance(packet, clientbound.play.TimeUpdatePacket):
+                    packet.world_age = int(
+                        (time.perf_counter() - self.server.epoch) * 1e6)
+                writer.append(packet, threshold)
+                if writer.full:
+                    self._flush(writer)
+            self._flush(writer)
+        _send_paced(self.server.count, self.server.rate, send)
+
+    def _flush(self, writer):
+        self.server.num_bytes += len(writer)
+        writer.flush(self.socket)
+
+    def _receive_packets(self):
+        context = self.server.context
+        packet_ids = {cls.get_id(context) for cls in SERVERBOUND_CLASSES}
+        reader, received = FrameReader(), 0
+        while received < self.server.count:
+            frame = reader.next_frame()
+            if frame is None:
+                reader.fill(self.socket_file)
+                continue
+            self.server.num_bytes += len(frame)
+            buffer = FrameBuffer(frame)
+            if self.compression_enabled and VarInt.read(buffer) > 0:
+                buffer = FrameBuffer(zlib.decompress(buffer.remaining()))
+            if VarInt.read(buffer) in packet_ids:
+                received += 1
@@ -0,0 +1,194 @@
+"""Benchmarks of the encoding and decoding of individual data types and
+   packets, without any networking.
+"""
+import pynbt
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS, RELEASE_PROTOCOL_VERSIONS
+from minecraft.networking.types import basic
+from minecraft.networking.types import (
+    Boolean, UnsignedByte, Byte, Short, UnsignedShort, Integer, FixedPoint,
+    FixedPointInteger, Angle, VarInt, VarLong, Long, UnsignedLong, Float,
+    Double, ShortPrefixedByteArray, VarIntPrefixedByteArray,
+    TrailingByteArray, String, UUID, Position, NBT, PrefixedArray,
+)
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.framing import FrameBuffer
+from minecraft.networking.packets import PacketBuffer, clientbound, serverbound
+
+from . import measure
+
+
+# A value of each type to be encoded and decoded, covering each type in
+# 'minecraft.networking.types.basic' except for the base class 'Type'.
+TYPE_VALUES = [
+    (Boolean, True),
+    (UnsignedByte, 200),
+    (Byte, -100),
+    (Short, -3000),
+    (UnsignedShort, 60000),
+    (Integer, -100000),
+    (FixedPointInteger, -1234.5),
+    (Angle, 90.0),
+    (VarInt, 300000),
+    (VarLong, 2**40),
+    (Long, -2**40),
+    (UnsignedLong, 2**60),
+    (Float, 1.5),
+    (Double, 1.5),
+    (ShortPrefixedByteArray, bytes(256)),
+    (VarIntPrefixedByteArray, bytes(256)),
+    (TrailingByteArray, bytes(256)),
+    (String, 'minecraft:overworld'),
+    (UUID, '12345678-1234-5678-1234-567812345678'),
+    (Position, (758, 64, -691)),
+    (NBT, pynbt.TAG_Compound({
+        'name': pynbt.TAG_String('minecraft:plains'),
+        'id': pynbt.TAG_Int(1),
+        'temperature': pynbt.TAG_Float(0.8),
+        'effects': pynbt.TAG_Compound({
+            'sky_color': pynbt.TAG_Int(7907327),
+            'water_color': pynbt.TAG_Int(4159204),
+        }),
+    }, '')),
+    (PrefixedArray(VarInt, VarInt), list(range(0, 256000, 1000))),
+    (PrefixedArray(VarInt, Long), list(range(256))),
+    (PrefixedArray(VarInt, String), ['minecraft:overworld'] * 16),
+]
+
+# Representative packets: those most frequently exchanged while playing, and
+# some with more varied fields.
+PACKET_CLASSES = [
+    clientbound.play.KeepAlivePacket,
+    clientbound.play.ChatMessagePacket,
+    clientbound.play.EntityVelocityPacket,
+    clientbound.play.EntityPositionDeltaPacket,
+    clientbound.play.EntityLookPacket,
+    clientbound.play.TimeUpdatePacket,
+    clientbound.play.SpawnPlayerPacket,
+    clientbound.play.BlockChangePacket,
+    serverbound.play.KeepAlivePacket,
+    serverbound.play.ChatPacket,
+    serverbound.play.PositionAndLookPacket,
+    serverbound.play.TeleportConfirmPacket,
+]
+
+
+def default_protocols():
+    """Returns the protocol versions in which packets are benchmarked by
+       default: the earliest, middle and latest release versions, and the
+       latest supported version.
+    """
+    releases = list(RELEASE_PROTOCOL_VERSIONS)
+    protocols = [releases[0], releases[len(releases) // 2], releases[-1],
+                 SUPPORTED_PROTOCOL_VERSIONS[-1]]
+    return sorted(set(protocols), key=protocols.index)
+
+
+def sample_value(data_type):
+    """Returns a value of 'data_type' like those in 'TYPE_VALUES', or raises
+       KeyError if there is none.
+    """
+    if isinstance(data_type, FixedPoint):
+        return 1.5
+    if isinstance(data_type, PrefixedArray):
+        return [sample_value(data_type.element_type)] * 16
+    for value_type, value in TYPE_VALUES:
+        if value_type is data_type:
+            return value
+    raise KeyError(data_type)
+
+
+def sample_packet(packet_class, context):
+    """Returns an instance of 'packet_class' with each field set to a sample
+       value, or None if there is no sample value for any of its fields.
+    """
+    try:
+        definition = packet_class.get_definition(context)
+        fields = {name: sample_value(data_type)
+                  for field in definition
+                  for name, data_type in field.items()}
+    except (KeyError, NotImplementedError):
+        return None
+    return packet_class(context, **fields)
+
+
+def type_benchmarks(context=None, selected=None, **kwds):
+    """Yields the results of encoding and decoding each type in
+       'TYPE_VALUES', in the given context (by default, the latest protocol
+       version). If 'selected' is given, only the benchmarks whose names it
+       returns true for are run. Other keyword arguments are passed to
+       'measure'.
+    """
+    if context is None:
+        context = ConnectionContext(
+            protocol_version=SUPPORTED_PROTOCOL_VERSIONS[-1])
+    for data_type, value in TYPE_VALUES:
+        name = 'types.%s' % _type_name(data_type)
+        buffer = PacketBuffer()
+        data_type.send_with_context(value, buffer, context)
+        data = buffer.get_writable()
+
+        def encode(send=data_type.send_with_context, value=value):
+            buffer = PacketBuffer()
+            send(value, buffer, context)
+
+        def decode(read=data_type.read_with_context, data=data):
+            read(FrameBuffer(data), context)
+
+        for suffix, function in ('.encode', encode), ('.decode', decode):
+            if selected is None or selected(name + suffix):
+                yield measure(name + suffix, 'types', function, **kwds)
+
+
+def packet_benchmarks(protocols=None, selected=None, **kwds):
+    """Yields the results of encoding and decoding each packet in
+       'PACKET_CLASSES' which exists in each of the given protocol versions
+       (by default, those of 'default_protocols'). A packet is encoded as by
+       'Packet.write' and decoded as by 'Connection', excluding compression,
+       encryption and the dispatching of packets by ID. Other arguments are
+       as for 'type_benchmarks'.
+    """
+    for protocol in default_protocols() if protocols is None else protocols:
+        context = ConnectionContext(protocol_version=protocol)
+        params = {'protocol': protocol}
+        for packet_class in PACKET_CLASSES:
+            if packet_class not in _all_packets(context):
+                continue
+            packet = sample_packet(packet_class, context)
+            if packet is None:
+                continue
+            name = 'packets.%s.%s' % (
+                packet_class.__module__.split('.')[3], packet_class.__name__)
+            data = packet.get_payload()
+            payload = FrameBuffer(data)
+            VarInt.read(payload)
+            data = payload.remaining()
+
+            def encode(packet=packet):
+                packet.write(PacketBuffer())
+
+            def decode(packet_class=packet_class, data=data):
+                packet_class(context).read(FrameBuffer(data))
+
+            for suffix, function in ('.encode', encode), ('.decode', decode):
+                if selected is None or selected(name + suffix):
+                    yield measure(name + suffix, 'packets', function, params,
+                                  **kwds)
+
+
+def _all_packets(context):
+    return clientbound.play.get_packets(context) | \
+           serverbound.play.get_packets(context)
+
+
+def _type_name(data_type):
+    if isinstance(data_type, type):
+        return data_type.__name__
+    for name in basic.__all__:
+        if getattr(basic, name, None) is data_type:
+            return name
+    if isinstance(data_type, PrefixedArray):
+        return 'PrefixedArray(%s, %s)' % (
+            _type_name(data_type.length_type),
+            _type_name(data_type.element_type))
+    return type(data_type).__name__
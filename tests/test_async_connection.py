@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import unittest
+import os
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import load_der_private_key
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.async_connection import AsyncConnection
+from minecraft.networking.encryption import EncryptedSocketWrapper
+from minecraft.networking.packets import clientbound
+from minecraft.exceptions import LoginDisconnect
+
+from . import fake_server, test_connection
+from .test_encryption import KEY_LOCATION
+
+
+class AsyncConnectTest(unittest.TestCase):
+    client_handler_type = test_connection.ConnectTest.client_handler_type
+    compression_threshold = None
+    private_key = None
+    public_key_bytes = None
+    client_versions = None
+    # Additional arguments of the AsyncConnection.
+    connection_kwds = {}
+
+    def run_client(self, client_coroutine):
+        server = fake_server.FakeServer(
+            compression_threshold=self.compression_threshold,
+            client_handler_type=self.client_handler_type,
+            private_key=self.private_key,
+            public_key_bytes=self.public_key_bytes,
+            test_case=self)
+        port = server.listen_socket.getsockname()[1]
+        server_exc_info = []
+
+        def run_server():
+            try:
+                server.run()
+            except Exception as e:
+                server_exc_info.append(e)
+        server_thread = threading.Thread(target=run_server, daemon=True)
+        server_thread.start()
+
+        client = AsyncConnection('localhost', port, username='TestUser',
+                                 allowed_versions=self.client_versions,
+                                 **self.connection_kwds)
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(asyncio.wait_for(
+                client_coroutine(client), fake_server.THREAD_TIMEOUT_S))
+        finally:
+            loop.close()
+            server.stop()
+            server_thread.join(fake_server.THREAD_TIMEOUT_S)
+            self.assertFalse(server_thread.is_alive())
+            self.assertEqual(server_exc_info, [])
+
+    async def join_game(self, client):
+        sockets = []
+
+        @client.listener(clientbound.play.JoinGamePacket)
+        def handle_join_game(_packet):
+            sockets.append(client._writer.transport.get_extra_info('socket'))
+
+        await client.connect()
+        packet_types = []
+        async for packet in client:
+            packet_types.append(type(packet))
+        self.assertIn(clientbound.play.JoinGamePacket, packet_types)
+        self.assertEqual(packet_types[-1], clientbound.play.DisconnectPacket)
+        # The socket is closed by the time the iteration ends.
+        self.assertEqual(sockets[0].fileno(), -1)
+        return client
+
+    def test_connect(self):
+        self.run_client(self.join_game)
+
+
+class AsyncConnectSingleVersionTest(AsyncConnectTest):
+    client_versions = {SUPPORTED_PROTOCOL_VERSIONS[-1]}
+
+
+class AsyncConnectCompressionTest(AsyncConnectTest):
+    compression_threshold = 0
+    connection_kwds = {'compression_level': 9, 'max_batch_packets': 1}
+
+
+class AsyncEncryptedCompressedConnectTest(AsyncConnectTest):
+    compression_threshold = 256
+
+    def setUp(self):
+        with open(os.path.join(KEY_LOCATION, "priv_key.bin"), "rb") as f:
+            self.private_key = load_der_private_key(
+                f.read(), None, default_backend())
+        with open(os.path.join(KEY_LOCATION, "pub_key.bin"), "rb") as f:
+            self.public_key_bytes = f.read()
+
+    def test_connect(self):
+        client = self.run_client(self.join_game)
+        self.assertIsNone(client.socket)
+
+    async def join_game(self, client):
+        @client.listener(clientbound.login.LoginSuccessPacket)
+        def handle_login_success(_packet):
+            assert isinstance(client.socket, EncryptedSocketWrapper)
+        return await super(AsyncEncryptedCompressedConnectTest, self) \
+            .join_game(client)
+
+
+class AsyncLoginDisconnectTest(AsyncConnectTest):
+    client_handler_type = \
+        test_connection.LoginDisconnectTest.client_handler_type
+
+    def test_connect(self):
+        with self.assertRaisesRegex(LoginDisconnect, r'You are banned'):
+            self.run_client(self.join_game)
+
+
+class AsyncStatusTest(AsyncConnectTest):
+    def test_connect(self):
+        results = []
+
+        async def status(client):
+            await client.status(handle_status=results.append,
+                                handle_ping=results.append)
+        self.run_client(status)
+        status_dict, latency_ms = results
+        self.assertEqual(status_dict['description'], {'text': 'FakeServer'})
+        self.assertTrue(0 <= latency_ms < 60000)
@@ -0,0 +1,64 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+
+from .benchmarks import macro, micro, write_json, write_table
+from .benchmarks.__main__ import main
+
+
+class BenchmarksTest(unittest.TestCase):
+    # Checks that the benchmarks still work, without measuring anything.
+    measure_args = {'repeat': 1, 'number': 1}
+
+    def test_types(self):
+        results = list(micro.type_benchmarks(**self.measure_args))
+        self.assertEqual(len(results), 2 * len(micro.TYPE_VALUES))
+        for res in results:
+            self.assertEqual(res['group'], 'types')
+            self.assertGreater(res['stats']['best'], 0)
+
+    def test_packets(self):
+        protocols = [micro.default_protocols()[0],
+                     SUPPORTED_PROTOCOL_VERSIONS[-1]]
+        results = list(micro.packet_benchmarks(
+            protocols, selected=lambda name: 'clientbound' in name,
+            **self.measure_args))
+        self.assertEqual({res['params']['protocol'] for res in results},
+                         set(protocols))
+        self.assertIn('packets.clientbound.KeepAlivePacket.decode',
+                      {res['name'] for res in results})
+
+    def test_connection(self):
+        for direction in macro.DIRECTIONS:
+            for threshold, encryption in (None, False), (0, True):
+                res = macro.connection_benchmark(
+                    direction, count=50, compression_threshold=threshold,
+                    encryption=encryption)
+                self.assertEqual(res['name'], 'connection.%s' % direction)
+                self.assertGreater(res['stats']['packets_per_second'], 0)
+        self.assertIn('latency_max', macro.connection_benchmark(
+            'receive', count=10, rate=1000)['stats'])
+
+    def test_output(self):
+        results = list(micro.type_benchmarks(**self.measure_args))[:2]
+        table, file = io.StringIO(), io.StringIO()
+        write_table(results, table)
+        self.assertIn('types.Boolean.encode', table.getvalue())
+        write_json(results, file)
+        document = json.loads(file.getvalue())
+        self.assertEqual(document['results'], results)
+        self.assertIn('python_version', document['environment'])
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            main(['micro', '--quick', '--filter', 'types.VarInt.',
+                  '--json', path])
+            with open(path) as file:
+                results = json.load(file)['results']
+        self.assertEqual([res['name'] for res in results],
+                         ['types.VarInt.encode', 'types.VarInt.decode'])
@@ -3,13 +3,17 @@ from minecraft import (
     PROTOCOL_VERSION_INDICES,
 )
 from minecraft.networking.packets import clientbound, serverbound
-from minecraft.networking.connection import Connection
+from minecraft.networking.connection import Connection, NetworkingThread
+from minecraft.networking.multiplexer import MultiplexerThread
 from minecraft.exceptions import (
     VersionMismatch, LoginDisconnect, InvalidState, IgnorePacket
 )
 
 from . import fake_server
 
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import threading
 import sys
 import re
 import io
@@ -120,6 +124,120 @@ class ConnectCompressionHighTest(ConnectTest):
     compression_threshold = 256
 
 
+class ConnectCompressionOffloadTest(ConnectTest):
+    compression_threshold = 0
+
+    def connection_type(self, *args, **kwds):
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        return Connection(*args, compression_executor=executor,
+                          compression_offload_size=0, compression_level=1,
+                          **kwds)
+
+
+class WakeupTest(fake_server._FakeServerTest):
+    # A packet written from another thread while the networking thread is
+    # waiting for incoming packets should be sent at once: the time for which
+    # the thread would otherwise wait is made longer than the test's timeout.
+    client_versions = {SUPPORTED_PROTOCOL_VERSIONS[-1]}
+
+    def setUp(self):
+        for thread_type in NetworkingThread, MultiplexerThread:
+            patcher = mock.patch.object(thread_type, 'idle_timeout', 60)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_connect(self):
+        self._test_connect()
+
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_packet(self, packet):
+            if isinstance(packet, serverbound.play.KeepAlivePacket):
+                assert packet.keep_alive_id == 1223334444
+                raise fake_server.FakeServerDisconnect
+
+    def _start_client(self, client):
+        def write_packet():
+            client.write_packet(serverbound.play.KeepAlivePacket(
+                keep_alive_id=1223334444))
+
+        @client.listener(clientbound.play.JoinGamePacket)
+        def handle_join_game(_packet):
+            timer = threading.Timer(0.1, write_packet)
+            timer.daemon = True
+            timer.start()
+        super(WakeupTest, self)._start_client(client)
+
+
+class WakeupCompressionOffloadTest(WakeupTest):
+    # As 'WakeupTest', but the thread must also be woken when each packet has
+    # been compressed by the executor.
+    compression_threshold = 0
+
+    def connection_type(self, *args, **kwds):
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        return Connection(*args, compression_executor=executor,
+                          compression_offload_size=0, **kwds)
+
+
+class CompressionOffloadBatchTest(fake_server._FakeServerTest):
+    # A full batch of packets following a packet which is being compressed by
+    # the executor should not make the networking thread wait for it: the
+    # compression is only allowed to finish after the batch is full.
+    client_versions = {SUPPORTED_PROTOCOL_VERSIONS[-1]}
+    compression_threshold = 0
+    messages = ['b' * 200, 'c', 'd']
+
+    def test_connect(self):
+        self._test_connect()
+
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_start(self):
+            super(CompressionOffloadBatchTest.client_handler_type, self) \
+                .handle_play_start()
+            self.received = []
+
+        def handle_play_packet(self, packet):
+            if isinstance(packet, serverbound.play.ChatPacket):
+                self.received.append(packet.message)
+                if len(self.received) == 3:
+                    assert self.received == \
+                        CompressionOffloadBatchTest.messages
+                    raise fake_server.FakeServerDisconnect
+
+    class GatedExecutor(object):
+        """ An executor which runs each function only once 'gate' is set. """
+        def __init__(self):
+            self.gate = threading.Event()
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+        def submit(self, function, *args):
+            def run():
+                assert self.gate.wait(fake_server.THREAD_TIMEOUT_S)
+                return function(*args)
+            return self.executor.submit(run)
+
+    def connection_type(self, *args, **kwds):
+        executor = self.GatedExecutor()
+        self.addCleanup(executor.executor.shutdown)
+        client = Connection(*args, compression_executor=executor,
+                            compression_offload_size=100, max_batch_packets=2,
+                            **kwds)
+
+        @client.listener(clientbound.play.JoinGamePacket)
+        def handle_join_game(_packet):
+            for message in self.messages:
+                client.write_packet(serverbound.play.ChatPacket(
+                    message=message))
+
+        @client.listener(serverbound.play.ChatPacket, outgoing=True)
+        def handle_chat(packet):
+            if packet.message == self.messages[-1]:
+                executor.gate.set()
+        return client
+
+
 class AllowedVersionsTest(fake_server._FakeServerTest):
     versions = list(SUPPORTED_MINECRAFT_VERSIONS.items())
     test_indices = (0, len(versions) // 2, len(versions) - 1)
@@ -342,6 +460,41 @@ class IgnorePacketTest(ConnectTest):
             raise fake_server.FakeServerTestSuccess
 
 
+class ExecutorListenerTest(ConnectTest):
+    """ A packet listener given an executor should not delay the networking
+        thread, so that the keep-alive packet is answered while it waits.
+    """
+    def _start_client(self, client):
+        executor = ThreadPoolExecutor(max_workers=1)
+        released = threading.Event()
+        keep_alive_ids = []
+
+        def handle_keep_alive(packet):
+            assert threading.current_thread() is not client.networking_thread
+            released.wait(fake_server.THREAD_TIMEOUT_S)
+            keep_alive_ids.append(packet.keep_alive_id)
+        client.register_packet_listener(
+            handle_keep_alive, clientbound.play.KeepAlivePacket,
+            executor=executor)
+        listener = client.packet_listeners[-1]
+
+        with self.assertRaises(ValueError):
+            client.register_packet_listener(
+                handle_keep_alive, clientbound.play.KeepAlivePacket,
+                early=True, executor=executor)
+
+        @client.listener(clientbound.play.DisconnectPacket)
+        def handle_disconnect(packet):
+            assert not keep_alive_ids
+            released.set()
+            assert listener.join(fake_server.THREAD_TIMEOUT_S)
+            executor.shutdown()
+            assert keep_alive_ids == [1223334444], keep_alive_ids
+            raise fake_server.FakeServerTestSuccess
+
+        client.connect()
+
+
 class HandleExceptionTest(ConnectTest):
     ignore_extra_exceptions = True
 
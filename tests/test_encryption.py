@@ -9,7 +9,9 @@ from minecraft.networking.encryption import (
     generate_verification_hash,
     create_AES_cipher,
     EncryptedFileObjectWrapper,
-    EncryptedSocketWrapper
+    EncryptedSocketWrapper,
+    update_in_place,
+    UPDATE_INTO_SLACK,
 )
 from minecraft.networking.packets import clientbound
 from tests import test_connection
@@ -111,6 +113,47 @@ class Encryption(unittest.TestCase):
         wrapper.send(test_data)
         self.assertEqual(test_data, mock_socket.received)
 
+    def test_update_in_place(self):
+        secret = generate_shared_secret()
+        data = os.urandom(100)
+        expected = create_AES_cipher(secret).encryptor().update(data)
+
+        # With and without room for the output buffer to exceed the input.
+        for slack in (UPDATE_INTO_SLACK, 0):
+            buffer = bytearray(data) + bytearray(slack)
+            update_in_place(
+                create_AES_cipher(secret).encryptor(), buffer, len(data))
+            self.assertEqual(buffer[:len(data)], expected)
+            self.assertEqual(len(buffer), len(data) + slack)
+
+    def test_readinto(self):
+        secret = generate_shared_secret()
+        data = os.urandom(100)
+        io = BytesIO(create_AES_cipher(secret).encryptor().update(data))
+        wrapper = EncryptedFileObjectWrapper(
+            io, create_AES_cipher(secret).decryptor())
+
+        buffer = bytearray(60)
+        self.assertEqual(wrapper.readinto(buffer), 60)
+        self.assertEqual(buffer, data[:60])
+        self.assertEqual(wrapper.readinto(buffer), 40)
+        self.assertEqual(buffer[:40], data[60:])
+
+    def test_sendall_in_place(self):
+        secret = generate_shared_secret()
+        cipher = create_AES_cipher(secret)
+        server_cipher = create_AES_cipher(secret)
+        mock_socket = MockSocket(server_cipher.encryptor(),
+                                 server_cipher.decryptor())
+        wrapper = EncryptedSocketWrapper(
+            mock_socket, cipher.encryptor(), cipher.decryptor())
+
+        test_data = os.urandom(100)
+        wrapper.sendall_in_place(bytearray(test_data[:30]))
+        self.assertEqual(mock_socket.received, test_data[:30])
+        wrapper.sendall_in_place(bytearray(test_data[30:]))
+        self.assertEqual(mock_socket.received, test_data[30:])
+
 
 class EncryptedConnection(test_connection.ConnectTest):
     def test_connect(self):
@@ -155,5 +198,8 @@ class MockSocket(object):
     def send(self, data):
         self.received = self.decryptor.update(data)
 
+    def sendall(self, data):
+        self.send(data)
+
     def fileno(self):
         return 0
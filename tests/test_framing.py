@@ -0,0 +1,320 @@
+import select
+import socket
+import unittest
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+
+from minecraft.networking.framing import (
+    FrameReader, FrameBuffer, FrameWriter,
+)
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.encryption import (
+    EncryptedSocketWrapper, create_AES_cipher,
+)
+from minecraft.networking.waker import Waker
+from minecraft.networking.packets import (
+    PacketBuffer, KeepAlivePacketServerbound, serverbound,
+)
+from minecraft.networking.types import VarInt
+
+
+class RecordingSocket(object):
+    """ A socket which records the data given to each call to 'sendall'. """
+    def __init__(self):
+        self.calls = []
+
+    def sendall(self, data):
+        self.calls.append(bytes(data))
+
+
+class ChunkedStream(object):
+    """ A stream which returns at most 'chunk_size' bytes from each call to
+        'readinto', in order to simulate data arriving in separate segments.
+    """
+    def __init__(self, data, chunk_size):
+        self.data = BytesIO(data)
+        self.chunk_size = chunk_size
+
+    def readinto(self, buffer):
+        return self.data.readinto(memoryview(buffer)[:self.chunk_size])
+
+
+def make_frames(payloads):
+    buffer = PacketBuffer()
+    for payload in payloads:
+        VarInt.send(len(payload), buffer)
+        buffer.send(payload)
+    return buffer.get_writable()
+
+
+class FrameReaderTest(unittest.TestCase):
+    payloads = [b'', b'a', b'hello world', bytes(range(256)) * 300, b'end']
+
+    def read_all(self, reader, stream):
+        frames = []
+        while True:
+            frame = reader.next_frame()
+            if frame is not None:
+                frames.append(bytes(frame))
+                continue
+            try:
+                reader.fill(stream)
+            except EOFError:
+                return frames
+
+    def test_chunked_reads(self):
+        data = make_frames(self.payloads)
+        for chunk_size in (1, 7, 1000, len(data)):
+            reader = FrameReader(initial_size=64, min_read_size=16)
+            frames = self.read_all(reader, ChunkedStream(data, chunk_size))
+            self.assertEqual(frames, self.payloads)
+            self.assertEqual(len(reader), 0)
+
+    def test_incomplete_frame(self):
+        data = make_frames([b'hello'])
+        reader = FrameReader()
+        reader.fill(ChunkedStream(data[:-1], len(data)))
+        self.assertIsNone(reader.next_frame())
+        self.assertEqual(len(reader), len(data) - 1)
+
+    def test_long_length(self):
+        reader = FrameReader()
+        reader.fill(ChunkedStream(b'\xff' * 6, 6))
+        with self.assertRaises(ValueError):
+            reader.next_frame()
+
+    def test_eof(self):
+        reader = FrameReader()
+        with self.assertRaises(EOFError):
+            reader.fill(ChunkedStream(b'', 1))
+
+    def test_transform_pending(self):
+        data = make_frames([b'abc', b'def'])
+        reader = FrameReader()
+        reader.fill(ChunkedStream(data, len(data)))
+        self.assertEqual(bytes(reader.next_frame()), b'abc')
+        reader.transform_pending(lambda data: bytes(data).upper())
+        self.assertEqual(bytes(reader.next_frame()), b'DEF')
+
+
+class FrameBufferTest(unittest.TestCase):
+    def test_read(self):
+        buffer = FrameBuffer(b'hello world')
+        self.assertEqual(buffer.read(5), b'hello')
+        self.assertEqual(bytes(buffer.remaining()), b' world')
+        self.assertEqual(buffer.read(), b' world')
+        self.assertEqual(buffer.read(1), b'')
+        buffer.reset_cursor()
+        self.assertEqual(buffer.recv(), b'hello world')
+
+
+class FrameWriterTest(unittest.TestCase):
+    def make_packet(self, keep_alive_id):
+        context = ConnectionContext(protocol_version=340)
+        return KeepAlivePacketServerbound(context, keep_alive_id=keep_alive_id)
+
+    def test_flush(self):
+        writer, socket = FrameWriter(), RecordingSocket()
+        writer.flush(socket)
+        self.assertEqual(socket.calls, [])
+
+        expected = PacketBuffer()
+        for keep_alive_id in range(3):
+            writer.append(self.make_packet(keep_alive_id))
+            self.make_packet(keep_alive_id).write(expected)
+        self.assertEqual(writer.num_packets, 3)
+        self.assertFalse(writer.full)
+
+        writer.flush(socket)
+        self.assertEqual(socket.calls, [expected.get_writable()])
+        self.assertEqual(len(writer), 0)
+        self.assertEqual(writer.num_packets, 0)
+
+    def test_full(self):
+        writer = FrameWriter(max_bytes=None, max_packets=2)
+        writer.append(self.make_packet(0))
+        self.assertFalse(writer.full)
+        writer.append(self.make_packet(1))
+        self.assertTrue(writer.full)
+
+        writer = FrameWriter(max_bytes=15, max_packets=None)
+        writer.append(self.make_packet(0))
+        self.assertFalse(writer.full)
+        writer.append(self.make_packet(1))
+        self.assertTrue(writer.full)
+
+    def test_nonblocking(self):
+        context = ConnectionContext(protocol_version=340)
+        packets = [serverbound.play.PluginMessagePacket(
+            context, channel='test:data', data=bytes([i]) * 65536)
+            for i in range(16)]
+        expected = PacketBuffer()
+        for packet in packets:
+            packet.write(expected)
+        expected = expected.get_writable()
+
+        cipher = create_AES_cipher(bytes(16))
+        sender, receiver = socket.socketpair()
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+        sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        wrapper = EncryptedSocketWrapper(sender, cipher.encryptor(), None)
+        writer = FrameWriter(nonblocking=True, max_bytes=None)
+        for packet in packets[:-1]:
+            writer.append(packet)
+        writer.flush(wrapper)
+        self.assertIsNotNone(writer.unsent)
+
+        # Nothing more is sent until the data already given to the socket
+        # has been sent.
+        writer.append(packets[-1])
+        size = len(writer)
+        writer.flush(wrapper)
+        self.assertEqual(len(writer), size)
+        received = bytearray()
+        while writer.unsent is not None:
+            received += receiver.recv(65536)
+            writer.flush(wrapper)
+        writer.flush(wrapper, block=True)
+        self.assertIsNone(writer.unsent)
+        self.assertEqual(len(writer), 0)
+        while len(received) < len(expected):
+            received += receiver.recv(65536)
+        self.assertEqual(cipher.decryptor().update(bytes(received)), expected)
+
+    def test_compression(self):
+        writer, expected = FrameWriter(), PacketBuffer()
+        writer.append(self.make_packet(0), compression_threshold=0)
+        self.make_packet(0).write(expected, compression_threshold=0)
+        self.assertEqual(bytes(writer.buffer), expected.get_writable())
+
+
+class DeferredExecutor(object):
+    """ An executor which runs each function only when 'run' is called. """
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, function, *args):
+        future = Future()
+        self.calls.append((future, function, args))
+        return future
+
+    def run(self):
+        for future, function, args in self.calls:
+            future.set_result(function(*args))
+        self.calls = []
+
+
+class FrameWriterCompressionTest(unittest.TestCase):
+    def make_packets(self):
+        context = ConnectionContext(protocol_version=340)
+        return [
+            serverbound.play.ChatPacket(context, message='a'),
+            serverbound.play.ChatPacket(context, message='b' * 200),
+            serverbound.play.ChatPacket(context, message='c'),
+        ]
+
+    def expected_data(self, compression_level=-1):
+        expected = PacketBuffer()
+        for packet in self.make_packets():
+            packet.write(expected, 20, compression_level)
+        return expected.get_writable()
+
+    def test_offload(self):
+        executor = DeferredExecutor()
+        writer = FrameWriter(executor=executor, offload_size=100)
+        socket = RecordingSocket()
+        for packet in self.make_packets():
+            writer.append(packet, 20)
+        self.assertEqual(len(executor.calls), 1)
+
+        # Only the packet preceding the one being compressed may be sent.
+        writer.flush(socket)
+        self.assertTrue(writer.pending)
+        executor.run()
+        writer.flush(socket)
+        self.assertFalse(writer.pending)
+        self.assertEqual(len(socket.calls), 2)
+        self.assertEqual(b''.join(socket.calls), self.expected_data())
+
+    def test_full_pending(self):
+        executor = DeferredExecutor()
+        writer = FrameWriter(executor=executor, offload_size=100,
+                             max_packets=2)
+        socket = RecordingSocket()
+        for packet in self.make_packets():
+            writer.append(packet, 20)
+        # The packet being compressed does not count towards the batch.
+        self.assertFalse(writer.full)
+        writer.append(self.make_packets()[0], 20)
+        self.assertTrue(writer.full)
+        writer.flush(socket)
+        self.assertTrue(writer.pending)
+        self.assertTrue(writer.full)
+
+        executor.run()
+        writer.flush(socket)
+        self.assertFalse(writer.full)
+
+    def test_on_ready(self):
+        executor, ready = DeferredExecutor(), []
+        writer = FrameWriter(executor=executor, offload_size=100,
+                             on_ready=lambda: ready.append(True))
+        for packet in self.make_packets():
+            writer.append(packet, 20)
+        self.assertEqual(ready, [])
+        executor.run()
+        self.assertEqual(ready, [True])
+
+    def test_offload_block(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            writer = FrameWriter(executor=executor, offload_size=100)
+            for packet in self.make_packets():
+                writer.append(packet, 20, 9)
+            socket = RecordingSocket()
+            writer.flush(socket, block=True)
+        self.assertFalse(writer.pending)
+        self.assertEqual(socket.calls, [self.expected_data(9)])
+
+    def test_incompressible(self):
+        context = ConnectionContext(protocol_version=340)
+        packet = serverbound.play.ChatPacket(context, message='x' * 100)
+        compressed, uncompressed = PacketBuffer(), PacketBuffer()
+        packet.write(compressed, 20, 9)
+        packet.compressible = False
+        packet.write(uncompressed, 20)
+
+        uncompressed.reset_cursor()
+        VarInt.read(uncompressed)
+        self.assertEqual(VarInt.read(uncompressed), 0)
+        self.assertEqual(uncompressed.read(), packet.get_payload())
+
+        compressed.reset_cursor()
+        VarInt.read(compressed)
+        self.assertEqual(VarInt.read(compressed), len(packet.get_payload()))
+        self.assertEqual(zlib.decompress(compressed.read()),
+                         packet.get_payload())
+
+
+class WakerTest(unittest.TestCase):
+    def readable(self, waker):
+        return bool(select.select([waker], [], [], 0)[0])
+
+    def test_wake(self):
+        waker = Waker()
+        self.addCleanup(waker.close)
+        self.assertFalse(self.readable(waker))
+        waker.wake()
+        waker.wake()
+        self.assertTrue(self.readable(waker))
+        waker.clear()
+        self.assertFalse(self.readable(waker))
+        waker.wake()
+        self.assertTrue(self.readable(waker))
+
+    def test_closed(self):
+        waker = Waker()
+        waker.close()
+        waker.wake()
+        waker.clear()
@@ -0,0 +1,262 @@
+import selectors
+import socket
+import threading
+import time
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import Connection
+from minecraft.networking.framing import FrameReader
+from minecraft.networking.multiplexer import (
+    Multiplexer, MultiplexerThread, NetworkingTask
+)
+from minecraft.networking.packets import clientbound, serverbound
+
+from . import fake_server, test_connection
+
+
+class MultiplexedConnectionMixin(object):
+    def setUp(self):
+        super(MultiplexedConnectionMixin, self).setUp()
+        self.multiplexer = Multiplexer(num_threads=2)
+
+    def tearDown(self):
+        self.multiplexer.close()
+        super(MultiplexedConnectionMixin, self).tearDown()
+
+    def connection_type(self, *args, **kwds):
+        kwds['multiplexer'] = self.multiplexer
+        return super(MultiplexedConnectionMixin, self).connection_type(
+            *args, **kwds)
+
+    def _start_client(self, client):
+        threads_before = threading.active_count()
+        super(MultiplexedConnectionMixin, self)._start_client(client)
+        assert client.networking_thread is None or \
+            isinstance(client.networking_thread, NetworkingTask)
+        # At most one thread of the multiplexer may have been started.
+        assert threading.active_count() <= threads_before + 1
+
+
+class MultiplexedConnectTest(MultiplexedConnectionMixin,
+                             test_connection.ConnectTest):
+    pass
+
+
+class MultiplexedCompressionTest(MultiplexedConnectionMixin,
+                                 test_connection.ConnectCompressionLowTest):
+    pass
+
+
+class MultiplexedReconnectTest(MultiplexedConnectionMixin,
+                               test_connection.ReconnectTest):
+    pass
+
+
+class MultiplexedExceptionReconnectTest(
+    MultiplexedConnectionMixin, test_connection.ExceptionReconnectTest
+):
+    pass
+
+
+class MultiplexedIgnorePacketTest(MultiplexedConnectionMixin,
+                                  test_connection.IgnorePacketTest):
+    pass
+
+
+class MultiplexedLoginDisconnectTest(MultiplexedConnectionMixin,
+                                     test_connection.LoginDisconnectTest):
+    pass
+
+
+class MultiplexedPingTest(MultiplexedConnectionMixin,
+                          test_connection.PingTest):
+    pass
+
+
+class MultiplexedAllowedVersionsTest(MultiplexedConnectionMixin,
+                                     test_connection.AllowedVersionsTest):
+    pass
+
+
+class MultiplexedWakeupTest(MultiplexedConnectionMixin,
+                            test_connection.WakeupTest):
+    pass
+
+
+class MultiplexedWakeupCompressionOffloadTest(
+    MultiplexedConnectionMixin, test_connection.WakeupCompressionOffloadTest
+):
+    pass
+
+
+class MultiplexedCompressionOffloadBatchTest(
+    MultiplexedConnectionMixin, test_connection.CompressionOffloadBatchTest
+):
+    pass
+
+
+class ManyConnectionsTest(unittest.TestCase):
+    num_connections = 4
+
+    def test_single_thread(self):
+        multiplexer = Multiplexer(num_threads=1)
+        servers, server_threads, clients = [], [], []
+        disconnected = threading.Semaphore(0)
+        try:
+            for _ in range(self.num_connections):
+                server = fake_server.FakeServer(
+                    client_handler_type=test_connection.ConnectTest
+                    .client_handler_type)
+                servers.append(server)
+                server_threads.append(threading.Thread(
+                    target=server.run, daemon=True))
+                server_threads[-1].start()
+
+                client = Connection(
+                    'localhost', server.listen_socket.getsockname()[1],
+                    username='TestUser', multiplexer=multiplexer)
+                client.register_packet_listener(
+                    lambda _packet: disconnected.release(),
+                    clientbound.play.DisconnectPacket)
+                clients.append(client)
+
+            threads_before = threading.active_count()
+            for client in clients:
+                client.connect()
+            self.assertEqual(threading.active_count(), threads_before + 1)
+
+            for _ in clients:
+                self.assertTrue(disconnected.acquire(
+                    timeout=fake_server.THREAD_TIMEOUT_S))
+            for client in clients:
+                task = client.networking_thread
+                if task is not None:
+                    task.join(fake_server.THREAD_TIMEOUT_S)
+                    self.assertFalse(task.is_alive())
+                self.assertIsNone(client.exception)
+        finally:
+            multiplexer.close()
+            for server in servers:
+                server.stop()
+            for thread in server_threads:
+                thread.join(fake_server.THREAD_TIMEOUT_S)
+
+
+class WritableTasksTest(unittest.TestCase):
+    class FakeTask(object):
+        def __init__(self, thread):
+            self.thread = thread
+            self.socket, self.peer = socket.socketpair()
+            self.fileno = self.socket.fileno()
+            self.interrupt = False
+            self.write_exc_info = None
+            self.writes = 0
+            self.remaining = 0
+            self.blocked = False
+            self.events = selectors.EVENT_READ
+
+        def wake(self):
+            self.thread.wake(self)
+
+        def write(self):
+            self.writes += 1
+            self.remaining = max(self.remaining - 1, 0)
+            return self.remaining > 0
+
+    def test_writable(self):
+        # Only tasks which have been woken, or which have packets left to
+        # write, are written to in each iteration.
+        thread = MultiplexerThread(None, 'Test Multiplexer Thread')
+        thread.idle_timeout = 0
+        tasks = [self.FakeTask(thread) for _ in range(3)]
+        try:
+            for task in tasks:
+                thread.add(task)
+            thread._run_once()
+            self.assertEqual([t.writes for t in tasks], [1, 1, 1])
+
+            thread._run_once()
+            self.assertEqual([t.writes for t in tasks], [1, 1, 1])
+
+            tasks[0].wake()
+            tasks[0].wake()
+            tasks[2].remaining = 3
+            tasks[2].wake()
+            thread._run_once()
+            self.assertEqual([t.writes for t in tasks], [2, 1, 2])
+            for _ in range(3):
+                thread._run_once()
+            self.assertEqual([t.writes for t in tasks], [2, 1, 4])
+        finally:
+            thread.selector.close()
+            thread.waker.close()
+            for task in tasks:
+                task.socket.close()
+                task.peer.close()
+
+
+class UnreadPeerTest(unittest.TestCase):
+    # A server which does not read what is sent to it should not delay the
+    # other connections served by the same thread.
+    num_packets = 64
+
+    def test_unread_peer(self):
+        multiplexer = Multiplexer(num_threads=1)
+        self.addCleanup(multiplexer.close)
+
+        listen_socket = socket.socket()
+        self.addCleanup(listen_socket.close)
+        listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        listen_socket.bind(('localhost', 0))
+        listen_socket.listen(1)
+        stalled = Connection(
+            'localhost', listen_socket.getsockname()[1], username='TestUser',
+            allowed_versions={SUPPORTED_PROTOCOL_VERSIONS[-1]},
+            multiplexer=multiplexer)
+        stalled.connect()
+        peer, _address = listen_socket.accept()
+        self.addCleanup(peer.close)
+        stalled.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+        # These packets are more than the socket buffers can hold.
+        for _ in range(self.num_packets):
+            stalled.write_packet(serverbound.play.PluginMessagePacket(
+                channel='test:data', data=bytes(65536)))
+        task = stalled.networking_thread
+        deadline = time.monotonic() + fake_server.THREAD_TIMEOUT_S
+        while not task.blocked and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(task.blocked)
+
+        server = fake_server.FakeServer(
+            client_handler_type=test_connection.ConnectTest
+            .client_handler_type)
+        server_thread = threading.Thread(target=server.run, daemon=True)
+        server_thread.start()
+        try:
+            client = Connection(
+                'localhost', server.listen_socket.getsockname()[1],
+                username='TestUser', multiplexer=multiplexer)
+            disconnected = threading.Event()
+            client.register_packet_listener(
+                lambda _packet: disconnected.set(),
+                clientbound.play.DisconnectPacket)
+            client.connect()
+            self.assertTrue(disconnected.wait(fake_server.THREAD_TIMEOUT_S))
+            self.assertIsNone(client.exception)
+        finally:
+            server.stop()
+            server_thread.join(fake_server.THREAD_TIMEOUT_S)
+
+        # Once the server reads, the rest of the data is sent.
+        reader, frames = FrameReader(), 0
+        peer.settimeout(fake_server.THREAD_TIMEOUT_S)
+        stream = peer.makefile('rb', 0)
+        while frames < 2 + self.num_packets:
+            reader.fill(stream)
+            while reader.next_frame() is not None:
+                frames += 1
+        self.assertEqual(len(reader), 0)
+        self.assertIsNone(stalled.exception)
+        stalled.disconnect()
@@ -0,0 +1,209 @@
+import functools
+import threading
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.exceptions import OutgoingQueueFull
+from minecraft.networking.connection import Connection
+from minecraft.networking.outgoing import OutgoingQueue, OVERFLOW_POLICIES
+from minecraft.networking.packets import clientbound, serverbound
+
+from . import fake_server
+
+
+latest_proto = SUPPORTED_PROTOCOL_VERSIONS[-1]
+
+
+def chat(message):
+    return serverbound.play.ChatPacket(message=message)
+
+
+def position(x):
+    return serverbound.play.PositionAndLookPacket(
+        x=x, feet_y=0, z=0, yaw=0, pitch=0, on_ground=True)
+
+
+def keep_alive():
+    return serverbound.play.KeepAlivePacket(keep_alive_id=1)
+
+
+def drain(queue):
+    packets = []
+    while queue:
+        packets.append(queue.popleft())
+    return packets
+
+
+class OutgoingQueueTest(unittest.TestCase):
+    def test_fifo(self):
+        queue = OutgoingQueue()
+        packets = [chat('a'), keep_alive(), position(1), position(2)]
+        for packet in packets:
+            queue.append(packet)
+        self.assertEqual(len(queue), 4)
+        self.assertEqual(drain(queue), packets)
+        self.assertFalse(queue)
+        self.assertRaises(IndexError, queue.popleft)
+
+    def test_prioritize(self):
+        queue = OutgoingQueue(prioritize=True)
+        first, second, urgent = chat('a'), chat('b'), keep_alive()
+        old, new = position(1), position(2)
+        for packet in first, old, second, urgent, new:
+            queue.append(packet)
+        self.assertEqual(len(queue), 4)
+        # The newer position takes the place of the older one.
+        self.assertEqual(drain(queue), [urgent, first, new, second])
+
+        queue.append(old)
+        self.assertIs(queue.popleft(), old)
+        queue.append(new)
+        self.assertIs(queue.popleft(), new)
+
+    def test_drop_oldest(self):
+        queue = OutgoingQueue(max_size=2, overflow='drop_oldest')
+        packets = [chat(str(i)) for i in range(6)]
+        for packet in packets:
+            queue.append(packet)
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.dropped, 4)
+        self.assertEqual(drain(queue), packets[4:])
+
+    def test_drop_oldest_prioritized(self):
+        queue = OutgoingQueue(max_size=2, overflow='drop_oldest',
+                              prioritize=True)
+        packets = [chat(str(i)) for i in range(4)]
+        urgent = keep_alive()
+        for packet in packets:
+            queue.append(packet)
+        queue.append(urgent)
+        self.assertEqual(queue.dropped, 3)
+        self.assertEqual(drain(queue), [urgent, packets[3]])
+
+        # A packet of lower priority than all queued packets is dropped.
+        urgent_packets = [keep_alive(), keep_alive()]
+        for packet in urgent_packets + [chat('x')]:
+            queue.append(packet)
+        self.assertEqual(queue.dropped, 4)
+        self.assertEqual(drain(queue), urgent_packets)
+
+        # Dropping a coalesced packet drops its replacement.
+        queue.append(position(1))
+        queue.append(position(2))
+        queue.append(chat('a'))
+        queue.append(chat('b'))
+        queue.append(position(3))
+        self.assertEqual([p.x for p in drain(queue)
+                          if hasattr(p, 'x')], [3])
+
+    def test_raise(self):
+        queue = OutgoingQueue(max_size=1, overflow='raise', prioritize=True)
+        queue.append(position(1))
+        # Coalescing packets need no room.
+        queue.append(position(2))
+        with self.assertRaises(OutgoingQueueFull):
+            queue.append(chat('a'))
+        self.assertEqual(queue.popleft().x, 2)
+        self.assertRaises(ValueError, OutgoingQueue, overflow='wait')
+        self.assertRaises(ValueError, OutgoingQueue, max_size=0)
+
+    def test_block(self):
+        may_block = [True]
+        queue = OutgoingQueue(max_size=1, may_block=lambda: may_block[0])
+        first, second = chat('a'), chat('b')
+        queue.append(first)
+
+        thread = threading.Thread(target=queue.append, args=(second,))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        self.assertIs(queue.popleft(), first)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(drain(queue), [second])
+
+        # A thread which may not block exceeds the capacity instead.
+        may_block[0] = False
+        queue.append(first)
+        queue.append(second)
+        self.assertEqual(len(queue), 2)
+        may_block[0] = True
+
+        thread = threading.Thread(target=queue.append, args=(chat('c'),))
+        thread.start()
+        queue.close()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(queue), 3)
+
+
+class PrioritizedConnectTest(fake_server._FakeServerTest):
+    client_versions = {latest_proto}
+    connection_type = functools.partial(
+        Connection, prioritize_packets=True, max_queue_size=4,
+        queue_overflow='drop_oldest')
+    received = []
+
+    def test_connect(self):
+        self._test_connect()
+
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_packet(self, packet):
+            PrioritizedConnectTest.received.append(packet)
+            if isinstance(packet, serverbound.play.PositionAndLookPacket):
+                raise fake_server.FakeServerDisconnect
+
+    def _start_client(self, client):
+        del self.received[:]
+
+        @client.listener(clientbound.play.JoinGamePacket)
+        def handle_join_game(_packet):
+            # The networking thread queues these packets before writing any
+            # of them, so the queue overflows.
+            for i in range(10):
+                client.write_packet(chat(str(i)))
+            client.write_packet(position(1))
+            client.write_packet(position(2))
+            client.write_packet(keep_alive())
+
+        @client.listener(clientbound.play.DisconnectPacket)
+        def handle_disconnect(_packet):
+            received = self.received
+            self.assertIsInstance(received[0],
+                                  serverbound.play.KeepAlivePacket)
+            self.assertEqual([p.message for p in received[1:3]], ['8', '9'])
+            self.assertEqual(received[3].x, 2)
+            self.assertEqual(client._outgoing_packet_queue.dropped, 8)
+            raise fake_server.FakeServerTestSuccess
+
+        client.connect()
+
+
+class SmallQueueConnectTest(fake_server._FakeServerTest):
+    """ The packets which begin a connection, or a status query, should not be
+        limited by the capacity of the queue of outgoing packets.
+    """
+    status_query = False
+
+    def test_connect(self):
+        for overflow in OVERFLOW_POLICIES:
+            self._test_connect(connection_type=functools.partial(
+                Connection, max_queue_size=1, queue_overflow=overflow))
+
+    def test_status(self):
+        self.status_query = True
+        self.test_connect()
+
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_start(self):
+            super(SmallQueueConnectTest.client_handler_type, self) \
+                .handle_play_start()
+            raise fake_server.FakeServerDisconnect
+
+    def _start_client(self, client):
+        if not self.status_query:
+            return super(SmallQueueConnectTest, self)._start_client(client)
+
+        def handle_status(status_dict):
+            raise fake_server.FakeServerTestSuccess
+        client.status(handle_status=handle_status, handle_ping=False)
@@ -0,0 +1,134 @@
+import json
+import threading
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packet_queue import PacketQueue
+from minecraft.networking.packets import (
+    PacketListenerList, PacketPool, clientbound
+)
+
+from . import fake_server
+
+
+latest_proto = SUPPORTED_PROTOCOL_VERSIONS[-1]
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.packet_listeners = PacketListenerList()
+
+
+def keep_alive(keep_alive_id):
+    return clientbound.play.KeepAlivePacket(
+        ConnectionContext(protocol_version=latest_proto),
+        keep_alive_id=keep_alive_id)
+
+
+def dispatch(connection, packet):
+    for callback in connection.packet_listeners.callbacks(type(packet)):
+        callback(packet)
+
+
+class PacketQueueTest(unittest.TestCase):
+    def test_filter(self):
+        connection = FakeConnection()
+        queue = PacketQueue(connection, clientbound.play.KeepAlivePacket)
+        connection.packet_listeners.append(queue)
+        dispatch(connection, clientbound.play.TimeUpdatePacket())
+        dispatch(connection, keep_alive(1))
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.get().keep_alive_id, 1)
+        self.assertIsNone(queue.get(timeout=0))
+
+        everything = PacketQueue(connection)
+        connection.packet_listeners.append(everything)
+        dispatch(connection, clientbound.play.TimeUpdatePacket())
+        self.assertEqual((len(queue), len(everything)), (0, 1))
+
+        with queue:
+            self.assertFalse(queue.closed)
+        self.assertTrue(queue.closed)
+        self.assertEqual(list(connection.packet_listeners), [everything])
+
+    def test_overflow(self):
+        connection = FakeConnection()
+        for overflow, expected in ('drop_oldest', [2, 3]), \
+                                  ('drop_newest', [0, 1]):
+            queue = PacketQueue(connection, maxsize=2, overflow=overflow)
+            for i in range(4):
+                queue.put(keep_alive(i))
+            self.assertEqual(queue.dropped, 2)
+            self.assertEqual([p.keep_alive_id for p in queue.get_batch()],
+                             expected)
+
+        queue = PacketQueue(connection, maxsize=1, overflow='block')
+        queue.put(keep_alive(0))
+        thread = threading.Thread(target=queue.put, args=(keep_alive(1),))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(queue.get().keep_alive_id, 0)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(queue.get().keep_alive_id, 1)
+
+        self.assertRaises(ValueError, PacketQueue, connection, maxsize=0)
+        self.assertRaises(ValueError, PacketQueue, connection, overflow='x')
+        self.assertRaises(TypeError, PacketQueue, connection, size=1)
+
+    def test_iterate(self):
+        connection = FakeConnection()
+        queue = PacketQueue(connection, maxsize=None, timeout=5)
+        pool = PacketPool()
+        packet = pool.get(clientbound.play.KeepAlivePacket)
+        queue.put(packet)
+        # Queued packets are never returned to the pool.
+        self.assertIsNone(packet._pool)
+
+        def produce():
+            for i in range(1, 5):
+                queue.put(keep_alive(i))
+            queue.close()
+        threading.Thread(target=produce).start()
+        self.assertEqual(next(queue), packet)
+        self.assertEqual([p.keep_alive_id for p in queue], [1, 2, 3, 4])
+        self.assertEqual(queue.get_batch(timeout=0), [])
+
+        queue = PacketQueue(connection, timeout=0.01)
+        self.assertEqual(list(queue), [])
+
+
+class PacketQueueConnectTest(fake_server._FakeServerTest):
+    client_versions = {latest_proto}
+    messages = ['first', 'second', 'third']
+
+    def test_connect(self):
+        self._test_connect()
+        self.consumer.join(fake_server.THREAD_TIMEOUT_S)
+        # The iteration ends when the connection terminates.
+        self.assertFalse(self.consumer.is_alive())
+        self.assertEqual(self.received, [
+            json.dumps({'text': message}) for message in self.messages])
+
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_start(self):
+            super(PacketQueueConnectTest.client_handler_type, self) \
+                .handle_play_start()
+            for message in PacketQueueConnectTest.messages:
+                self.write_packet(clientbound.play.ChatMessagePacket(
+                    json_data=json.dumps({'text': message}), position=0,
+                    sender='12345678-1234-5678-1234-567812345678'))
+            raise fake_server.FakeServerDisconnect
+
+    def _start_client(self, client):
+        self.received = []
+        chat = client.packets(clientbound.play.ChatMessagePacket)
+
+        def consume():
+            for packet in chat:
+                self.received.append(packet.json_data)
+        self.consumer = threading.Thread(target=consume, daemon=True)
+        self.consumer.start()
+        super(PacketQueueConnectTest, self)._start_client(client)
@@ -3,8 +3,12 @@ import unittest
 import string
 import logging
 import struct
+from io import BytesIO
 from zlib import decompress
 from random import choice
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 
 from minecraft.utility import protocol_earlier
 from minecraft import (
@@ -12,12 +16,17 @@ from minecraft import (
 )
 from minecraft.networking.connection import ConnectionContext
 from minecraft.networking.types import (
-    VarInt, Enum, Vector, PositionAndLook, OriginPoint,
+    VarInt, Enum, Vector, PositionAndLook, OriginPoint, Position, String,
+    UUID, Double, Angle, FixedPoint, Short, Boolean,
 )
 from minecraft.networking.packets import (
-    Packet, PacketBuffer, PacketListener, KeepAlivePacket, serverbound,
-    clientbound
+    Packet, PacketBuffer, PacketListener, PacketListenerList, KeepAlivePacket,
+    ExecutorPacketListener, PacketPool, serverbound, clientbound
 )
+from minecraft.exceptions import IgnorePacket
+from minecraft.networking.packets.codec import PacketCodec
+from minecraft.networking.packets import registry
+from minecraft.networking.framing import FrameBuffer
 
 TEST_VERSIONS = list(RELEASE_PROTOCOL_VERSIONS)
 if SUPPORTED_PROTOCOL_VERSIONS[-1] not in TEST_VERSIONS:
@@ -134,6 +143,103 @@ class PacketListenerTest(unittest.TestCase):
             listener.call_packet(uncalled_packet)
 
 
+class PacketListenerListTest(unittest.TestCase):
+    def test_callbacks(self):
+        def chat(packet):
+            pass
+
+        def everything(packet):
+            pass
+
+        listeners = PacketListenerList()
+        listeners.append(PacketListener(chat, serverbound.play.ChatPacket))
+        self.assertEqual(listeners.callbacks(serverbound.play.ChatPacket),
+                         (chat,))
+        self.assertEqual(listeners.callbacks(KeepAlivePacket), ())
+
+        # Modifying the list must invalidate the index.
+        listeners.insert(0, PacketListener(everything, Packet))
+        self.assertEqual(listeners.callbacks(serverbound.play.ChatPacket),
+                         (everything, chat))
+        self.assertEqual(listeners.callbacks(KeepAlivePacket), (everything,))
+        del listeners[0]
+        self.assertEqual(listeners.callbacks(KeepAlivePacket), ())
+
+    def test_custom_listener(self):
+        class CustomListener(PacketListener):
+            def call_packet(self, packet):
+                return False
+
+        listener = CustomListener(None, serverbound.play.ChatPacket)
+        listeners = PacketListenerList([listener])
+        self.assertEqual(listeners.callbacks(KeepAlivePacket),
+                         (listener.call_packet,))
+
+
+class ExecutorPacketListenerTest(unittest.TestCase):
+    def test_order(self):
+        # Each packet is handled after the previous one, even though the
+        # executor has several workers.
+        handled = []
+
+        def handle(packet):
+            time.sleep(0.001 * (packet.keep_alive_id % 3))
+            handled.append(packet.keep_alive_id)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            listener = ExecutorPacketListener(
+                handle, executor, KeepAlivePacket, max_pending=5)
+            pool = PacketPool()
+            for i in range(20):
+                packet = pool.get(KeepAlivePacket)
+                packet.keep_alive_id = i
+                self.assertTrue(listener.call_packet(packet))
+                self.assertLessEqual(len(listener._pending), 5)
+                # The packet is not reused while it is waiting.
+                self.assertIsNone(packet._pool)
+            self.assertTrue(listener.join(5))
+        self.assertEqual(handled, list(range(20)))
+
+    def test_max_pending(self):
+        released = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            listener = ExecutorPacketListener(
+                lambda packet: released.wait(5), executor, max_pending=1)
+            listener.submit(KeepAlivePacket(keep_alive_id=1))
+            thread = threading.Thread(target=listener.submit,
+                                      args=(KeepAlivePacket(keep_alive_id=2),))
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+            self.assertFalse(listener.join(0))
+            released.set()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertTrue(listener.join(5))
+
+    def test_exception(self):
+        def handle(packet):
+            if packet.keep_alive_id == 1:
+                raise IgnorePacket
+            if packet.keep_alive_id == 2:
+                raise ValueError(packet.keep_alive_id)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            listener = ExecutorPacketListener(handle, executor)
+            for i in range(3):
+                listener.submit(KeepAlivePacket(keep_alive_id=i))
+            self.assertTrue(listener.join(5))
+            # The exception is raised with the next packet, which is dropped.
+            with self.assertRaises(ValueError):
+                listener.submit(KeepAlivePacket(keep_alive_id=3))
+            listener.submit(KeepAlivePacket(keep_alive_id=4))
+            self.assertTrue(listener.join(5))
+
+        self.assertRaises(RuntimeError, listener.submit,
+                          KeepAlivePacket(keep_alive_id=5))
+        self.assertTrue(listener.join(0))
+
+
 class PacketEnumTest(unittest.TestCase):
     def test_packet_str(self):
         class ExamplePacket(Packet):
@@ -156,6 +262,182 @@ class PacketEnumTest(unittest.TestCase):
         )
 
 
+class PacketCodecTest(unittest.TestCase):
+    class ExamplePacket(Packet):
+        id = 0x00
+        packet_name = 'example'
+        get_definition = staticmethod(lambda context: [
+            {'alpha': VarInt, 'not an identifier': String},
+            {'location': Position} if context.protocol_later_eq(107) else {}])
+
+    def test_codec_cache(self):
+        for protocol_version in TEST_VERSIONS:
+            context = ConnectionContext(protocol_version=protocol_version)
+            codec = self.ExamplePacket.get_codec(context)
+            self.assertIs(codec, self.ExamplePacket.get_codec(context))
+            self.assertEqual(codec.definition,
+                             self.ExamplePacket(context).definition)
+
+        Packet.clear_codec_cache()
+        self.assertIsNot(self.ExamplePacket.get_codec(context), codec)
+
+    def test_read_write(self):
+        for protocol_version in TEST_VERSIONS:
+            context = ConnectionContext(protocol_version=protocol_version)
+            packet = self.ExamplePacket(context, alpha=300,
+                                        location=Position(1, -2, 3))
+            setattr(packet, 'not an identifier', u'κόσμε')
+
+            # The codec must produce the same data as iterating over the
+            # packet's definition, which it does not do if the definition is
+            # overridden in the instance.
+            uncompiled = self.ExamplePacket(context)
+            uncompiled.definition = packet.definition
+            self.assertIsNone(uncompiled._codec())
+
+            compiled_buffer, uncompiled_buffer = PacketBuffer(), PacketBuffer()
+            packet.write_fields(compiled_buffer)
+            uncompiled.set_values(**vars(packet)).write_fields(
+                uncompiled_buffer)
+            self.assertEqual(compiled_buffer.get_writable(),
+                             uncompiled_buffer.get_writable())
+
+            compiled_buffer.reset_cursor()
+            deserialized = self.ExamplePacket(context)
+            deserialized.read(compiled_buffer)
+            self.assertEqual(deserialized.alpha, 300)
+            self.assertEqual(getattr(deserialized, 'not an identifier'),
+                             u'κόσμε')
+            if context.protocol_later_eq(107):
+                self.assertEqual(deserialized.location, Position(1, -2, 3))
+            else:
+                self.assertFalse(hasattr(deserialized, 'location'))
+
+    def test_all_packets(self):
+        for protocol_version in TEST_VERSIONS:
+            context = ConnectionContext(protocol_version=protocol_version)
+            for state in (clientbound, serverbound):
+                for module in (state.handshake, state.status, state.login,
+                               state.play):
+                    for packet_class in module.get_packets(context):
+                        codec = packet_class.get_codec(context)
+                        if codec is not None:
+                            # Some definitions contain new type instances
+                            # each time, so compare only their structure.
+                            self.assertEqual(
+                                self.structure(codec.definition),
+                                self.structure(
+                                    packet_class(context).definition))
+
+    def test_fused_structs(self):
+        definition = [
+            {'uuid': UUID}, {'x': Double}, {'yaw': Angle},
+            {'dx': FixedPoint(Short, 12)}, {'name': String},
+            {'on_ground': Boolean}]
+        values = {'uuid': '12345678-1234-5678-1234-567812345678', 'x': -1.5,
+                  'yaw': 90.0, 'dx': 0.25, 'name': 'abc', 'on_ground': True}
+        context = ConnectionContext(protocol_version=TEST_VERSIONS[-1])
+        packet = Packet(context, **values)
+
+        unfused_buffer = PacketBuffer()
+        for field in definition:
+            for name, data_type in field.items():
+                data_type.send(values[name], unfused_buffer)
+        data = unfused_buffer.get_writable()
+
+        fused_buffer = PacketBuffer()
+        PacketCodec(definition).write(packet, fused_buffer, context)
+        self.assertEqual(fused_buffer.get_writable(), data)
+
+        fused_buffer.reset_cursor()
+        for file_object in (fused_buffer, FrameBuffer(data), BytesIO(data)):
+            deserialized = Packet(context)
+            PacketCodec(definition).read(deserialized, file_object, context)
+            self.assertEqual({k: getattr(deserialized, k) for k in values},
+                             values)
+
+    @staticmethod
+    def structure(definition):
+        return [[(name, data_type if isinstance(data_type, type) else
+                  type(data_type)) for name, data_type in field.items()]
+                for field in definition]
+
+
+class PacketRegistryTest(unittest.TestCase):
+    def test_packet_classes(self):
+        for protocol_version in TEST_VERSIONS:
+            context = ConnectionContext(protocol_version=protocol_version)
+            for state in (clientbound, serverbound):
+                for module in (state.handshake, state.status, state.login,
+                               state.play):
+                    table = registry.get_packet_classes(
+                        module.get_packets, context)
+                    self.assertIs(table, registry.get_packet_classes(
+                        module.get_packets, context))
+                    self.assertEqual(set(table.values()),
+                                     set(module.get_packets(context)))
+                    for packet_id, packet_class in table.items():
+                        self.assertEqual(packet_class.get_id(context),
+                                         packet_id)
+                        self.assertEqual(packet_class(context).id, packet_id)
+
+    def test_clear(self):
+        context = ConnectionContext(protocol_version=TEST_VERSIONS[-1])
+        table = registry.get_packet_classes(
+            clientbound.play.get_packets, context)
+        registry.clear_packet_cache()
+        self.assertIsNot(table, registry.get_packet_classes(
+            clientbound.play.get_packets, context))
+
+
+class CompactPacketTest(unittest.TestCase):
+    def test_compact_class(self):
+        context = ConnectionContext(protocol_version=TEST_VERSIONS[-1])
+        packet_class = clientbound.play.EntityVelocityPacket
+        compact_class = packet_class.compact_class(context)
+        self.assertIs(compact_class, packet_class.compact_class(context))
+        self.assertIs(compact_class, compact_class.compact_class(context))
+        self.assertTrue(issubclass(compact_class, packet_class))
+        self.assertEqual(compact_class.__name__, packet_class.__name__)
+        self.assertEqual(set(compact_class.__slots__), {
+            'context', '_payload', 'entity_id', 'velocity_x', 'velocity_y',
+            'velocity_z'})
+
+        values = dict(entity_id=5, velocity_x=-1, velocity_y=2, velocity_z=3)
+        packet = packet_class(context, **values)
+        compact = compact_class(context, **values)
+        self.assertEqual(repr(compact), repr(packet))
+        self.assertEqual(list(compact.fields), list(packet.fields))
+        self.assertEqual(compact.id, packet.id)
+        self.assertEqual(compact.get_payload(), packet.get_payload())
+
+        read = compact_class(context)
+        read.read(FrameBuffer(packet.get_payload()[1:]))
+        self.assertEqual(repr(read), repr(packet))
+        read.read_lazily(packet.get_payload()[1:])
+        del read.entity_id
+        self.assertEqual(read.entity_id, 5)
+        with self.assertRaises(AttributeError):
+            read.nonexistent_field
+
+        # Attributes other than fields are kept in a '__dict__'.
+        compact.other = 'value'
+        self.assertEqual(compact.__dict__, {'other': 'value'})
+
+        # Fields with class-level defaults are not given slots.
+        compact_class = clientbound.play.BlockChangePacket \
+            .compact_class(context)
+        self.assertNotIn('block_state_id', compact_class.__slots__)
+        self.assertEqual(compact_class(context).block_state_id, 0)
+
+        # Packets without a definition are not made compact.
+        self.assertIs(Packet.compact_class(context), Packet)
+
+        old_class = packet_class.compact_class(context)
+        Packet.clear_codec_cache()
+        self.assertIsNot(packet_class.compact_class(context), old_class)
+
+
 class TestReadWritePackets(unittest.TestCase):
     maxDiff = None
 
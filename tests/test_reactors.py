@@ -6,9 +6,13 @@ except ImportError:
 
 from minecraft import SUPPORTED_PROTOCOL_VERSIONS
 from minecraft.networking.connection import (
-    LoginReactor, PlayingReactor, ConnectionContext
+    LoginReactor, PlayingReactor, ConnectionContext, Connection
 )
-from minecraft.networking.packets import clientbound
+from minecraft.networking.packets import (
+    clientbound, PacketBuffer, PacketPool,
+)
+from minecraft.networking.types import VarInt, Position
+import zlib
 
 
 latest_proto = SUPPORTED_PROTOCOL_VERSIONS[-1]
@@ -108,3 +112,174 @@ class PlayingReactorTest(unittest.TestCase):
 
         response_packet = connection.write_packet.call_args[0][0]
         self.assertEqual(response_packet.teleport_id, 42)
+
+
+class LazyDecodingTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = Connection('localhost', lazy_decoding=True)
+        self.connection.context = ConnectionContext(
+            protocol_version=latest_proto)
+        self.reactor = PlayingReactor(self.connection)
+
+    def parse(self, packet):
+        packet.context = self.connection.context
+        buffer = PacketBuffer()
+        packet.write(buffer)
+        buffer.reset_cursor()
+        VarInt.read(buffer)
+        return self.reactor.parse_packet(buffer.read())
+
+    def test_lazy_packet(self):
+        packet = self.parse(clientbound.play.ChatMessagePacket(
+            json_data='{"text": "hello"}', position=0,
+            sender='12345678-1234-5678-1234-567812345678'))
+        self.assertIn('_payload', packet.__dict__)
+        self.assertEqual(packet.json_data, '{"text": "hello"}')
+        self.assertNotIn('_payload', packet.__dict__)
+        with self.assertRaises(AttributeError):
+            packet.nonexistent_field
+
+    def test_needed_packets(self):
+        packet = self.parse(clientbound.play.KeepAlivePacket(
+            keep_alive_id=12345))
+        self.assertNotIn('_payload', packet.__dict__)
+        self.assertEqual(packet.keep_alive_id, 12345)
+
+        self.connection.register_packet_listener(
+            lambda packet: None, clientbound.play.ChatMessagePacket)
+        packet = self.parse(clientbound.play.ChatMessagePacket(
+            json_data='{"text": "hello"}', position=0,
+            sender='12345678-1234-5678-1234-567812345678'))
+        self.assertNotIn('_payload', packet.__dict__)
+
+        # Packets with class-level field defaults are never read lazily.
+        packet = self.parse(clientbound.play.BlockChangePacket(
+            location=Position(1, 2, 3), block_state_id=5))
+        self.assertEqual(packet.block_state_id, 5)
+
+
+class CompactPacketsTest(LazyDecodingTest):
+    def setUp(self):
+        self.connection = Connection(
+            'localhost', lazy_decoding=True, compact_packets=True)
+        self.connection.context = ConnectionContext(
+            protocol_version=latest_proto)
+        self.reactor = PlayingReactor(self.connection)
+
+    def test_lazy_packet(self):
+        original = clientbound.play.ChatMessagePacket(
+            json_data='{"text": "hello"}', position=0,
+            sender='12345678-1234-5678-1234-567812345678')
+        packet = self.parse(original)
+        self.assertIsInstance(packet, clientbound.play.ChatMessagePacket)
+        self.assertIn('json_data', type(packet).__slots__)
+        self.assertIsNotNone(packet._payload)
+        self.assertEqual(packet.json_data, '{"text": "hello"}')
+        self.assertEqual(repr(packet), repr(original))
+        with self.assertRaises(AttributeError):
+            packet._payload
+        with self.assertRaises(AttributeError):
+            packet.nonexistent_field
+
+    def test_needed_packets(self):
+        packet = self.parse(clientbound.play.KeepAlivePacket(
+            keep_alive_id=12345))
+        self.assertIsNot(type(packet), clientbound.play.KeepAlivePacket)
+        self.assertEqual(packet.keep_alive_id, 12345)
+
+        called = []
+        self.connection.register_packet_listener(
+            called.append, clientbound.play.ChatMessagePacket)
+        packet = self.parse(clientbound.play.ChatMessagePacket(
+            json_data='{"text": "hello"}', position=0,
+            sender='12345678-1234-5678-1234-567812345678'))
+        self.connection.reactor = self.reactor
+        self.connection._react(packet)
+        self.assertEqual(called, [packet])
+
+
+class PacketPoolTest(LazyDecodingTest):
+    def setUp(self):
+        self.connection = Connection(
+            'localhost', lazy_decoding=True, pool_packets=True)
+        self.connection.context = ConnectionContext(
+            protocol_version=latest_proto)
+        self.reactor = PlayingReactor(self.connection)
+
+    def test_pooled_packets(self):
+        first = self.parse(clientbound.play.EntityLookPacket(
+            entity_id=1, yaw=90, pitch=0, on_ground=True))
+        self.assertNotIn('_payload', first.__dict__)
+        self.assertEqual(first.entity_id, 1)
+        self.connection._recycle(first)
+
+        second = self.parse(clientbound.play.EntityLookPacket(
+            entity_id=2, yaw=0, pitch=0, on_ground=False))
+        self.assertIs(second, first)
+        self.assertEqual((second.entity_id, second.on_ground), (2, False))
+
+        copied = second.copy()
+        self.assertEqual(repr(copied), repr(second))
+        self.assertIs(second.retain(), second)
+        self.connection._recycle(second)
+        self.connection._recycle(copied)
+        third = self.parse(clientbound.play.EntityLookPacket(
+            entity_id=3, yaw=0, pitch=0, on_ground=False))
+        self.assertIsNot(third, second)
+        self.assertIsNot(third, copied)
+        self.assertEqual(second.entity_id, 2)
+
+        # Packets of other classes are not pooled.
+        packet = self.parse(clientbound.play.ChatMessagePacket(
+            json_data='{"text": "hello"}', position=0,
+            sender='12345678-1234-5678-1234-567812345678'))
+        self.assertIsNone(packet._pool)
+
+    def test_pool(self):
+        pool = PacketPool(max_size=1)
+        packet_class = clientbound.play.KeepAlivePacket
+        packets = [pool.get(packet_class) for _ in range(3)]
+        for packet in packets + packets:
+            pool.release(packet)
+        self.assertIs(pool.get(packet_class), packets[0])
+        self.assertNotIn(pool.get(packet_class), packets)
+
+
+class DecompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.set_up_reactor()
+
+    def set_up_reactor(self, **kwds):
+        self.connection = Connection('localhost', **kwds)
+        self.connection.context = ConnectionContext(
+            protocol_version=latest_proto)
+        self.connection.options.compression_enabled = True
+        self.reactor = PlayingReactor(self.connection)
+
+    def make_frame(self, declared_size, payload):
+        buffer = PacketBuffer()
+        VarInt.send(declared_size, buffer)
+        buffer.send(zlib.compress(payload))
+        return buffer.get_writable()
+
+    def test_decompress(self):
+        packet = clientbound.play.KeepAlivePacket(
+            self.connection.context, keep_alive_id=12345)
+        buffer = PacketBuffer()
+        packet.write(buffer, compression_threshold=0)
+        buffer.reset_cursor()
+        VarInt.read(buffer)
+        packet = self.reactor.parse_packet(buffer.read())
+        self.assertEqual(packet.keep_alive_id, 12345)
+
+    def test_wrong_size(self):
+        payload = bytes(1000)
+        for declared_size in (999, 1001):
+            with self.assertRaises(ValueError):
+                self.reactor.parse_packet(
+                    self.make_frame(declared_size, payload))
+
+    def test_maximum_size(self):
+        self.set_up_reactor(max_decompressed_size=100)
+        with self.assertRaises(ValueError):
+            self.reactor.parse_packet(self.make_frame(1000, bytes(1000)))
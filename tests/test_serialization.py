@@ -1,17 +1,28 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import array
+import io
 import unittest
+import uuid
+
+import pynbt
+
 from minecraft.networking.types import (
     Type, Boolean, UnsignedByte, Byte, Short, UnsignedShort,
     Integer, FixedPointInteger, Angle, VarInt, Long, Float, Double,
     ShortPrefixedByteArray, VarIntPrefixedByteArray, UUID,
     String as StringType, Position, TrailingByteArray, UnsignedLong,
+    VarLong, PrefixedArray, NBT, LazyNBT, nbt_end,
 )
 from minecraft.networking.packets.clientbound.play import (
     MultiBlockChangePacket
 )
+from minecraft.networking.packets.clientbound.play.\
+    join_game_and_respawn_packets import nbt_to_snbt
 from minecraft.networking.packets import PacketBuffer
+from minecraft.networking.framing import FrameBuffer
 from minecraft.networking.connection import ConnectionContext
+from minecraft.utility import LRUCache
 from minecraft import SUPPORTED_PROTOCOL_VERSIONS, RELEASE_PROTOCOL_VERSIONS
 
 
@@ -119,3 +130,283 @@ class SerializationTest(unittest.TestCase):
         packet_buffer.reset_cursor()
 
         self.assertEqual(VarInt.read(packet_buffer), 50000)
+
+    def test_varint_codec(self):
+        values = [0, 1, 127, 128, 255, 16383, 16384, 2 ** 31 - 1, 2 ** 35 - 1]
+        for value in values:
+            buffer = bytearray(b'xy')
+            VarInt.encode_into(buffer, value)
+            self.assertEqual(len(buffer) - 2, VarInt.size(value))
+
+            packet_buffer = PacketBuffer()
+            VarInt.send(value, packet_buffer)
+            self.assertEqual(packet_buffer.get_writable(), buffer[2:])
+
+            for data in buffer, bytes(buffer), memoryview(buffer):
+                self.assertEqual(VarInt.read_from(data, 2),
+                                 (value, len(buffer)))
+
+        buffer = bytearray()
+        VarInt.encode_many(buffer, values)
+        self.assertEqual(VarInt.decode_many(buffer, len(values)),
+                         (values, len(buffer)))
+        self.assertEqual(VarInt.decode_many(buffer, 2, 2), ([127, 128], 5))
+
+        with self.assertRaises(EOFError):
+            VarInt.read_from(buffer[:-1], len(buffer) - 5)
+        with self.assertRaises(EOFError):
+            VarInt.decode_many(buffer, len(values) + 1)
+        with self.assertRaises(ValueError):
+            VarInt.read_from(b'\xff' * 7)
+        self.assertEqual(VarLong.read_from(b'\xff' * 9 + b'\x01'),
+                         (2 ** 64 - 1, 10))
+
+    def test_varint_file_objects(self):
+        values = [1, 300, 2 ** 28, 5]
+        packet_buffer = PacketBuffer()
+        VarInt.send_many(values, packet_buffer)
+        data = packet_buffer.get_writable()
+
+        for file_object in packet_buffer, FrameBuffer(data):
+            file_object.reset_cursor()
+            self.assertEqual(VarInt.read(file_object), 1)
+            self.assertEqual(VarInt.read_many(file_object, 2), [300, 2 ** 28])
+            self.assertEqual(file_object.read(), b'\x05')
+            with self.assertRaises(EOFError):
+                VarInt.read(file_object)
+
+    def test_numeric_prefixed_array(self):
+        context = ConnectionContext(protocol_version=TEST_VERSIONS[-1])
+        cases = [
+            (Integer, [-1, 0, 2 ** 31 - 1]),
+            (Long, [-2 ** 63, 7]),
+            (Short, [-2, 300]),
+            (UnsignedByte, [0, 255]),
+            (Double, [0.5, -1e100]),
+            (Float, [1.5, -2.25]),
+            (Boolean, [True, False]),
+            (VarInt, [0, 300, 2 ** 31]),
+        ]
+        for element_type, values in cases:
+            expected = PacketBuffer()
+            VarInt.send(len(values), expected)
+            for value in values:
+                element_type.send(value, expected)
+            expected = expected.get_writable()
+
+            for as_array in False, True:
+                if as_array and element_type is Boolean:
+                    with self.assertRaises(ValueError):
+                        PrefixedArray(VarInt, element_type, as_array=True)
+                    continue
+                array_type = PrefixedArray(VarInt, element_type, as_array)
+                for value in values, array_type.read(FrameBuffer(expected)):
+                    packet_buffer = PacketBuffer()
+                    array_type.send_with_context(value, packet_buffer, context)
+                    self.assertEqual(packet_buffer.get_writable(), expected)
+
+                packet_buffer.reset_cursor()
+                result = array_type.read_with_context(packet_buffer, context)
+                self.assertIsInstance(
+                    result, array.array if as_array else list)
+                self.assertEqual(list(result), values)
+
+        with self.assertRaises(ValueError):
+            PrefixedArray(VarInt, StringType, as_array=True)
+        with self.assertRaises(EOFError):
+            PrefixedArray(VarInt, Integer).read(FrameBuffer(b'\x02abcdefg'))
+        self.assertEqual(PrefixedArray(Integer, Integer, as_array=True).read(
+            FrameBuffer(b'\xff\xff\xff\xff')), array.array('i'))
+
+    def test_varint_prefixed_array(self):
+        context = ConnectionContext(protocol_version=TEST_VERSIONS[-1])
+        for element_type in VarInt, VarLong:
+            array_type = PrefixedArray(VarInt, element_type)
+            values = [0, 1, 2 ** 20, 2 ** 31]
+            packet_buffer = PacketBuffer()
+            array_type.send_with_context(values, packet_buffer, context)
+
+            expected = bytearray()
+            VarInt.encode_many(expected, [len(values)] + values)
+            data = packet_buffer.get_writable()
+            self.assertEqual(data, expected)
+
+            packet_buffer.reset_cursor()
+            self.assertEqual(
+                array_type.read_with_context(packet_buffer, context), values)
+            self.assertEqual(array_type.read(FrameBuffer(data)), values)
+
+    def test_varlong_array(self):
+        # The encoding of -1 as a VarLong decodes to 2 ** 64 - 1 when read
+        # into a list, and to -1 when read into a signed 64-bit array.
+        data = b'\x03' + b'\xff' * 9 + b'\x01' + b'\x05' + b'\x80\x01'
+        self.assertEqual(PrefixedArray(VarInt, VarLong).read(
+            FrameBuffer(data)), [2 ** 64 - 1, 5, 128])
+        array_type = PrefixedArray(VarInt, VarLong, as_array=True)
+        values = array_type.read(FrameBuffer(data))
+        self.assertEqual(values, array.array('q', [-1, 5, 128]))
+
+        packet_buffer = PacketBuffer()
+        array_type.send(values, packet_buffer)
+        self.assertEqual(packet_buffer.get_writable(), data)
+
+
+class NBTTest(unittest.TestCase):
+    def setUp(self):
+        self.value = pynbt.NBTFile(value={
+            'byte': pynbt.TAG_Byte(-3),
+            'long': pynbt.TAG_Long(2 ** 40),
+            'double': pynbt.TAG_Double(0.5),
+            'string': pynbt.TAG_String('caf\xe9'),
+            'null\0name': pynbt.TAG_Int(7),
+            'bytes': pynbt.TAG_Byte_Array(bytearray(b'abc')),
+            'ints': pynbt.TAG_Int_Array([1, -2, 3]),
+            'longs': pynbt.TAG_Long_Array([2 ** 50]),
+            'empty': pynbt.TAG_List(pynbt.TAG_End, []),
+            'shorts': pynbt.TAG_List(pynbt.TAG_Short, [pynbt.TAG_Short(1)]),
+            'compounds': pynbt.TAG_List(pynbt.TAG_Compound, [
+                pynbt.TAG_Compound({'a': pynbt.TAG_String('b')}),
+                pynbt.TAG_Compound({}),
+            ]),
+            'nested': pynbt.TAG_Compound({
+                'inner': pynbt.TAG_Compound({'x': pynbt.TAG_Float(1.5)}),
+            }),
+        })
+        data = io.BytesIO()
+        self.value.save(data)
+        self.data = data.getvalue()
+        NBT.cache.clear()
+
+    def tearDown(self):
+        NBT.lazy = False
+        NBT.cache.clear()
+
+    def test_send(self):
+        packet_buffer = PacketBuffer()
+        NBT.send(self.value, packet_buffer)
+        self.assertEqual(packet_buffer.get_writable(), self.data)
+
+    def test_nbt_end(self):
+        self.assertEqual(nbt_end(self.data), len(self.data))
+        self.assertEqual(nbt_end(b'xy' + self.data + b'z', 2),
+                         len(self.data) + 2)
+        for size in 0, 1, 10, len(self.data) - 1:
+            with self.assertRaises(EOFError):
+                nbt_end(self.data[:size])
+        with self.assertRaises(IOError):
+            nbt_end(b'\x08' + self.data[1:])
+
+    def test_lazy(self):
+        NBT.lazy = True
+        packet_buffer = PacketBuffer()
+        packet_buffer.send(self.data + b'tail')
+
+        for file_object in packet_buffer, FrameBuffer(self.data + b'tail'):
+            file_object.reset_cursor()
+            value = NBT.read(file_object)
+            self.assertIsInstance(value, LazyNBT)
+            self.assertEqual(file_object.read(), b'tail')
+
+            self.assertEqual(value.name, '')
+            self.assertEqual(list(value), list(self.value))
+            self.assertEqual(value['long'].value, 2 ** 40)
+            self.assertEqual(value['string'].value, 'caf\xe9')
+            self.assertEqual(value['null\0name'].value, 7)
+            self.assertEqual(value['ints'].value, (1, -2, 3))
+            self.assertEqual(value['compounds'][0]['a'].value, 'b')
+            self.assertNotIn('missing', value)
+            with self.assertRaises(KeyError):
+                value['missing']
+
+            inner = value['nested']['inner']
+            self.assertIsInstance(inner, LazyNBT)
+            self.assertEqual(inner.name, 'inner')
+            self.assertEqual(inner['x'].value, 1.5)
+            self.assertEqual(inner.to_nbt()['x'].value, 1.5)
+
+            self.assertEqual(nbt_to_snbt(value), nbt_to_snbt(self.value))
+            self.assertEqual(nbt_to_snbt(value.to_nbt()),
+                             nbt_to_snbt(self.value))
+
+            output = PacketBuffer()
+            NBT.send(value, output)
+            self.assertEqual(output.get_writable(), self.data)
+
+        # The second value read was the one cached from the first.
+        packet_buffer.reset_cursor()
+        self.assertIs(NBT.read(packet_buffer), value)
+
+        # Values are read eagerly from file objects other than buffers.
+        self.assertIsInstance(NBT.read(io.BytesIO(self.data)), pynbt.NBTFile)
+
+    def test_cache(self):
+        NBT.lazy = True
+        cache, NBT.cache = NBT.cache, LRUCache(2)
+        try:
+            values = []
+            for byte in 1, 2, 1, 3, 1, 2:
+                data = bytearray(self.data)
+                data[10] = byte  # The value of the 'byte' entry.
+                values.append(NBT.read(FrameBuffer(data)))
+                self.assertEqual(values[-1]['byte'].value, byte)
+        finally:
+            NBT.cache = cache
+
+        self.assertIs(values[0], values[2])
+        self.assertIs(values[0], values[4])
+        self.assertIsNot(values[1], values[5])
+
+
+class StringCacheTest(unittest.TestCase):
+    def tearDown(self):
+        StringType.cache = UUID.cache = None
+        UUID.raw = False
+
+    def read_twice(self, data_type, value):
+        values = []
+        for _ in range(2):
+            packet_buffer = PacketBuffer()
+            data_type.send(value, packet_buffer)
+            packet_buffer.reset_cursor()
+            values.append(data_type.read(packet_buffer))
+        self.assertEqual(values[0], values[1])
+        return values
+
+    def test_string(self):
+        first, second = self.read_twice(StringType, 'minecraft:overworld')
+        self.assertIsNot(first, second)
+
+        StringType.cache = LRUCache(10)
+        first, second = self.read_twice(StringType, 'minecraft:overworld')
+        self.assertIs(first, second)
+        self.assertEqual(first, 'minecraft:overworld')
+
+        long_string = 'x' * (StringType.max_cached_length + 1)
+        first, second = self.read_twice(StringType, long_string)
+        self.assertIsNot(first, second)
+        self.assertEqual(len(StringType.cache), 1)
+
+    def test_uuid(self):
+        value = '12345678-1234-5678-1234-56781234abcd'
+        first, second = self.read_twice(UUID, value)
+        self.assertEqual(first, value)
+        self.assertIsNot(first, second)
+        for _ in range(10):
+            data = uuid.uuid4().bytes
+            self.assertEqual(UUID.from_struct(data),
+                             str(uuid.UUID(bytes=data)))
+
+        UUID.cache = LRUCache(10)
+        first, second = self.read_twice(UUID, value)
+        self.assertIs(first, second)
+
+        UUID.raw = True
+        first, second = self.read_twice(UUID, value)
+        self.assertEqual(first, uuid.UUID(value).bytes)
+        self.assertEqual(self.read_twice(UUID, first)[0], first)
+
+        with self.assertRaises(EOFError):
+            packet_buffer = PacketBuffer()
+            packet_buffer.send(first[:15])
+            packet_buffer.reset_cursor()
+            UUID.read(packet_buffer)
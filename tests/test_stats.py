@@ -0,0 +1,95 @@
+import functools
+import json
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import Connection, ConnectionContext
+from minecraft.networking.packets import clientbound, serverbound
+from minecraft.networking.stats import ConnectionStats
+
+from . import fake_server
+
+
+latest_proto = SUPPORTED_PROTOCOL_VERSIONS[-1]
+
+
+class ConnectionStatsTest(unittest.TestCase):
+    def test_record(self):
+        stats = ConnectionStats()
+        stats.record_in(clientbound.play.KeepAlivePacket, 10, 10, 0.5)
+        stats.record_in(clientbound.play.KeepAlivePacket.compact_class(
+            ConnectionContext(protocol_version=latest_proto)), 10, 20, 0.25)
+        frame = bytearray(b'\xff\x05\x90\x01\x03')
+        stats.record_out(serverbound.play.ChatPacket, frame, 1, True, 1.0)
+        stats.record_out(serverbound.play.ChatPacket, None, 0, True, 1.0)
+        stats.record_queue_length(3)
+        stats.record_queue_length(2)
+
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['packets_in'], {'KeepAlivePacket': {
+            'count': 2, 'bytes': 20, 'raw_bytes': 30}})
+        self.assertEqual(snapshot['packets_out'], {'ChatPacket': {
+            'count': 2, 'bytes': 5, 'raw_bytes': 144}})
+        self.assertEqual((snapshot['bytes_in'], snapshot['raw_bytes_in']),
+                         (20, 30))
+        self.assertEqual(snapshot['decode_time'], 0.75)
+        self.assertEqual(snapshot['encode_time'], 2.0)
+        self.assertEqual(snapshot['queue_high_water'], 3)
+
+        text = stats.to_prometheus(labels={'server': 'a "b"'})
+        self.assertIn('# TYPE pycraft_packets_total counter\n', text)
+        self.assertIn('pycraft_packets_total{direction="in",'
+                      'packet="KeepAlivePacket",server="a \\"b\\""} 2\n', text)
+        self.assertIn(
+            'pycraft_decode_seconds_total{server="a \\"b\\""} 0.75\n', text)
+        self.assertIn('pycraft_outgoing_queue_high_water', text)
+
+        stats.reset()
+        self.assertEqual(stats.snapshot()['packets_in'], {})
+        self.assertEqual(stats.queue_high_water, 0)
+
+
+class StatsConnectTest(fake_server._FakeServerTest):
+    compression_threshold = 256
+    client_versions = {latest_proto}
+    connection_type = functools.partial(Connection, collect_stats=True)
+    message = json.dumps({'text': 'x' * 1000})
+
+    def test_connect(self):
+        self._test_connect()
+
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_start(self):
+            super(StatsConnectTest.client_handler_type, self) \
+                .handle_play_start()
+            self.write_packet(clientbound.play.ChatMessagePacket(
+                json_data=StatsConnectTest.message, position=0,
+                sender='12345678-1234-5678-1234-567812345678'))
+            self.write_packet(clientbound.play.KeepAlivePacket(
+                keep_alive_id=1223334444))
+
+        def handle_play_packet(self, packet):
+            if isinstance(packet, serverbound.play.KeepAlivePacket):
+                raise fake_server.FakeServerDisconnect
+
+    def _start_client(self, client):
+        @client.listener(clientbound.play.DisconnectPacket)
+        def handle_disconnect(_packet):
+            stats = client.stats.snapshot()
+            chat = stats['packets_in']['ChatMessagePacket']
+            self.assertEqual(chat['count'], 1)
+            self.assertGreater(chat['raw_bytes'], len(self.message))
+            self.assertLess(chat['bytes'], len(self.message))
+            self.assertEqual(stats['packets_in']['KeepAlivePacket']['count'],
+                             1)
+            for name in 'HandShakePacket', 'LoginStartPacket', \
+                        'KeepAlivePacket':
+                self.assertEqual(stats['packets_out'][name]['count'], 1)
+            self.assertEqual(stats['bytes_out'], stats['raw_bytes_out'] + 1)
+            self.assertGreaterEqual(stats['queue_high_water'], 1)
+            for key in 'decode_time', 'encode_time', 'reactor_time', \
+                       'listener_time', 'wait_time':
+                self.assertGreater(stats[key], 0)
+            raise fake_server.FakeServerTestSuccess
+
+        client.connect()
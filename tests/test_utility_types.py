@@ -3,6 +3,7 @@ import unittest
 from minecraft.networking.types import (
     Enum, BitFieldEnum, Vector, Position, PositionAndLook
 )
+from minecraft.utility import LRUCache
 
 
 class EnumTest(unittest.TestCase):
@@ -73,3 +74,22 @@ class PositionAndLookTest(unittest.TestCase):
         self.assertFalse(pos_look_1 != pos_look_2)
         pos_look_1.position += Vector(1, 1, 1)
         self.assertTrue(pos_look_1 != pos_look_2)
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_lru_cache(self):
+        computed = []
+
+        def compute(key):
+            computed.append(key)
+            return key * 2
+
+        cache = LRUCache(2)
+        for key in 1, 2, 1, 3, 1, 2:
+            self.assertEqual(cache.get(key, compute), key * 2)
+        self.assertEqual(computed, [1, 2, 3, 2])
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn(3, cache)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,78 @@
+import unittest
+from unittest import mock
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.version_cache import ProtocolVersionCache
+
+from . import fake_server
+
+
+class ProtocolVersionCacheTest(unittest.TestCase):
+    def test_cache(self):
+        now = [1000.0]
+        with mock.patch.object(ProtocolVersionCache, 'clock',
+                               staticmethod(lambda: now[0])):
+            cache = ProtocolVersionCache(ttl=10)
+            self.assertIsNone(cache.get('localhost', 25565))
+            cache.set('localhost', 25565, 340)
+            cache.set('localhost', 25566, 47)
+            self.assertEqual(cache.get('localhost', 25565), 340)
+            self.assertIsNone(cache.get('127.0.0.1', 25565))
+
+            now[0] += 9
+            self.assertEqual(cache.get('localhost', 25566), 47)
+            now[0] += 1
+            self.assertIsNone(cache.get('localhost', 25566))
+            self.assertEqual(len(cache), 1)
+
+            cache.set('localhost', 25566, 47)
+            cache.invalidate('localhost', 25565)
+            cache.invalidate('localhost', 25565)
+            self.assertIsNone(cache.get('localhost', 25565))
+            self.assertEqual(cache.get('localhost', 25566), 47)
+            cache.clear()
+            self.assertEqual(len(cache), 0)
+
+
+class VersionCacheConnectTest(fake_server._FakeServerTest):
+    # The version to be in the cache before connecting, if any.
+    cached_version = None
+    status_queries = []
+
+    def test_uncached(self):
+        self._test_cache(status_queries=1)
+
+    def test_cached(self):
+        self.cached_version = SUPPORTED_PROTOCOL_VERSIONS[-1]
+        self._test_cache(status_queries=0)
+
+    def test_outdated(self):
+        # The login fails, so the version is determined again.
+        self.cached_version = SUPPORTED_PROTOCOL_VERSIONS[0]
+        self._test_cache(status_queries=1)
+
+    def _test_cache(self, status_queries):
+        self.cache = ProtocolVersionCache()
+        del self.status_queries[:]
+        self._test_connect()
+        self.assertEqual(len(self.status_queries), status_queries)
+        self.assertEqual(self.cache.get('localhost', self.port),
+                         SUPPORTED_PROTOCOL_VERSIONS[-1])
+
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_start(self):
+            super(VersionCacheConnectTest.client_handler_type, self) \
+                .handle_play_start()
+            raise fake_server.FakeServerDisconnect
+
+        def handle_status(self, request_packet):
+            VersionCacheConnectTest.status_queries.append(request_packet)
+            super(VersionCacheConnectTest.client_handler_type, self) \
+                .handle_status(request_packet)
+
+    def _start_client(self, client):
+        client.version_cache = self.cache
+        self.port = client.options.port
+        if self.cached_version is not None:
+            self.cache.set('localhost', self.port, self.cached_version)
+        super(VersionCacheConnectTest, self)._start_client(client)